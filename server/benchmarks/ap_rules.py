@@ -0,0 +1,557 @@
+"""Benchmark AP ranking, genre and index rules.
+
+Usage::
+
+    $ python -m benchmarks.ap_rules --items 20000
+
+Runs rules on variants of AP fixtures from ``tests/ingest/parser/fixtures/ap``
+and compares urgency, genre, ``anpa_category`` and ednote with the previous
+implementation using inline ``re.search`` calls, which is kept here
+as a reference. Exits with error if any output differs.
+"""
+
+import os
+import re
+import sys
+import copy
+import glob
+import json
+import time
+import random
+import argparse
+
+from typing import List
+
+import cp
+
+from unittest.mock import patch
+
+from cp.ingest import CP_APMediaFeedParser
+from cp.ingest.parser.ap import PRIORITY_MAP, FR_CATEGORY_MAPPING, EN_CATEGORY_MAPPING
+
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+FIXTURES = os.path.join(ROOT, "tests", "ingest", "parser", "fixtures", "ap")
+
+SLUGLINES = [
+    "",
+    "Insolite-Chat",
+    "BKN-Celtics-Lakers",
+    "bkn-celtics-lakers-scores",
+    "OLY-SKI-Downhill-Results",
+    "TEN-Wimbledon",
+    "Tennis-TEN",
+    "SOC-Premier-League-Glance",
+    "HKC-Boston-College",
+    "BBO-Standings",
+    "FBN--Patriots-Leaders",
+    "CAR-NASCAR-Calendar",
+    "Today-in-History-Oct18",
+    "Odd-Giant-Pumpkin",
+    "People-Royal-Wedding",
+    "US-Film-Review-Dune",
+    "Health-MED-Vaccine",
+    "Washington-Digest",
+    "AP-Newsfeatures-Digest",
+    "NewsAlert",
+    "Virus-Outbreak-NewsAlert",
+    "Virus-Outbreak",
+    "ſKI-Slalom",
+]
+
+PROFILES = [
+    None,
+    "Spot Development",
+    "Game Story",
+    "Obituary",
+    "TopStory",
+    "HeadlinePackage",
+    "Enterprise",
+    "InvestigativeEnterprise",
+    "Review",
+    "Column",
+    "Profile",
+    "AP Impact",
+    "Alaska-Digest-News",
+    "Advisory",
+    "Daybook",
+    "Agate",
+    "Feature",
+]
+
+PRODUCTS = [32607, 30599, 31385, 30598, 33619]
+SUBJECTS = ["5b4319707dd310048b23df092526b43e", "54df6c687df7100483dedf092526b43e"]
+CATEGORIES = sorted(
+    {
+        cat
+        for mapping in FR_CATEGORY_MAPPING + EN_CATEGORY_MAPPING
+        for cat in mapping[1:]
+    }
+) + ["x"]
+
+HEADLINES = ["Correction: Virus story", "Virus spreads", "CORRECTION: vote"]
+EDNOTES = [
+    "Eds: APNewsNow. Moving on general news and financial services.",
+    "EDS: UPDATES: With AP Photos.",
+    "Eds: apnewsnow; NDLR: Moving on sports.",
+    "",
+]
+
+
+class LegacyParser(CP_APMediaFeedParser):
+    """Rules implementation before precompiled rule tables."""
+
+    def _parse_ranking(self, data, item):
+        slugline = item.get("slugline") or ""
+        content_type = (
+            data["item"]["profile"].lower()
+            if data["item"].get("profile")
+            else "unknown"
+        )
+
+        priority = PRIORITY_MAP.get(data["item"].get("urgency")) or ""
+
+        if "fr" in item["language"]:
+            if re.search(r"^(insolite)", slugline, re.IGNORECASE):
+                return cp.NEWS_BUZZ
+            elif priority in ["f", "b"]:
+                return cp.NEWS_URGENT
+            elif priority == "u":
+                return cp.NEWS_NEED_TO_KNOW
+            elif priority == "r":
+                return cp.NEWS_GOOD_TO_KNOW
+            else:
+                return cp.NEWS_OPTIONAL
+
+        products = self.get_products(data)
+        categories = self.get_anpa_categories(data)
+        ap_subject = self.get_ap_subjects(data)
+
+        if (
+            32607 in products
+            and "s" in categories
+            and re.search(
+                r"(CYC|FIG|OLY|SKI|TEN)-",
+                slugline,
+                re.IGNORECASE,
+            )
+        ):
+            return cp.NEWS_GOOD_TO_KNOW
+
+        if (
+            30599 in products
+            and "s" in categories
+            and re.search(
+                r"(CAR|BBA|BBN|BKN|FBN|GLF|HKN|LAC|OLY|RAC|MMA)-",
+                slugline,
+                re.IGNORECASE,
+            )
+        ):
+            return cp.NEWS_GOOD_TO_KNOW
+
+        if (
+            32607 in products
+            and "s" in categories
+            and re.search(
+                r"(ARC|ATH|BAD|BIA|BOB|CAN|CRI|XXC|CUR|DIV|EQU|FEN|FHK|FRE|GYM|HNB|JUD|LUG|PEN|MOT|NOR|ROW|RGL|RGU|SAI|SHO|SKE|JUM|SBD|SOC|SOF|SPD|SQA|SUM|SWM|TTN|TAE|TRI|VOL|WPO|WEI|WRE)-",  # noqa
+                slugline,
+                re.IGNORECASE,
+            )
+        ):
+            return cp.NEWS_OPTIONAL
+
+        if (
+            30599 in products
+            and "s" in categories
+            and re.search(
+                r"(BBC|BBH|BBI|BBM|BBW|BBY|BKC|BKH|BKO|BKW|BKL|BOX|FBC|FBH|FBO|HKC|HKO|HKW)-",
+                slugline,
+                re.IGNORECASE,
+            )
+        ):
+            return cp.NEWS_OPTIONAL
+
+        if re.search(
+            r"today-in-history",
+            slugline,
+            re.IGNORECASE,
+        ):
+            return cp.NEWS_ROUTINE
+
+        if (
+            re.search(r"(odd|people)", slugline, re.IGNORECASE)
+            and "spot" in content_type
+        ) or re.search(
+            r"ap\s+impact",
+            content_type,
+            re.IGNORECASE,
+        ):
+            return cp.NEWS_BUZZ
+
+        if (
+            "spot" in content_type
+            and "r" == priority
+            and "5b4319707dd310048b23df092526b43e" in ap_subject
+        ):
+            return cp.NEWS_BUZZ
+
+        if "game" in content_type and "5b4319707dd310048b23df092526b43e" in ap_subject:
+            return cp.NEWS_GOOD_TO_KNOW
+
+        if "obituary" in content_type and priority == "u":
+            return cp.NEWS_URGENT
+
+        if (
+            re.search(r"(spot|game|topstory|headlinepackage)", content_type)
+            and "u" == priority
+        ):
+            return cp.NEWS_NEED_TO_KNOW
+
+        if (
+            re.search(r"(spot|obituary|game|topstory|headlinepackage)", content_type)
+            and "r" == priority
+        ):
+            return cp.NEWS_GOOD_TO_KNOW
+
+        if (
+            "enterprise" in content_type
+            and "54df6c687df7100483dedf092526b43e" in ap_subject
+        ):
+            return cp.NEWS_FEATURE_PREMIUM
+
+        if "enterprise" in content_type:
+            return cp.NEWS_FEATURE_REGULAR
+
+        if "review" in content_type and re.search(
+            r"us-film-review", slugline, re.IGNORECASE
+        ):
+            return cp.NEWS_FEATURE_REGULAR
+
+        if re.search(r"(column|profile|review)", content_type):
+            return cp.NEWS_FEATURE_PREMIUM
+
+        if re.search(
+            r"(Alaska-Digest-News|Washington-Digest|AP-Newsfeatures-Digest)",
+            content_type,
+            re.IGNORECASE,
+        ):
+            return cp.NEWS_ROUTINE
+
+        if re.search(r"(advisory|daybook)", content_type, re.IGNORECASE):
+            return cp.NEWS_ROUTINE
+
+        return cp.NEWS_OPTIONAL
+
+    def _parse_ednote(self, ednote):
+        return re.sub(
+            r"eds:\s*",
+            "",
+            ednote,
+            flags=re.IGNORECASE,
+        )
+
+    def _format_ednote(self, ednote):
+        matches = [
+            re.search(r"APNewsNow[;.]?", ednote, re.IGNORECASE),
+            re.search(r"Moving on.*\.", ednote),
+        ]
+        return " ".join([m.group() for m in matches if m])
+
+    def _format_update(self, ednote):
+        return re.sub(
+            r"NDLR\:",
+            "",
+            re.sub(r"\s*Moving on.*\.", "", ednote),
+        )
+
+    def _parse_index_code(self, data, item) -> List[str]:
+        if not item.get("language") or not item.get("slugline"):
+            return []
+
+        categories = self.get_anpa_categories(data)
+
+        def get_index(mapping):
+            return [
+                index
+                for index, *cats in mapping
+                if any([c in categories for c in cats])
+            ]
+
+        if "fr" in item["language"]:
+            index = get_index(FR_CATEGORY_MAPPING)
+            if index:
+                return index
+            return ["Spare News"]
+
+        slugline = item["slugline"]
+        products = self.get_products(data)
+        textformat = data["item"].get("textformat", "")
+
+        if re.search(r"-MED-", slugline):
+            return ["Lifestyle"]
+
+        if "t" in textformat or 31385 in products:
+            return ["Agate"]
+
+        if re.search(
+            r"""
+            (ARC	(?# Match for Archery)
+            |ATH	(?# Match for Athletics)
+            |BAD	(?# Match for Badminton)
+            |BBA	(?# Match for Baseball American League)
+            |BBC	(?# Match for Baseball U.S. College)
+            |BBH	(?# Match for Baseball High School)
+            |BBI	(?# Match for Baseball International)
+            |BBM	(?# Match for Baseball Minor Leagues)
+            |BBN	(?# Match for Baseball National League)
+            |BBO	(?# Match for Baseball Other)
+            |BBW	(?# Match for Baseball Women)
+            |BBY	(?# Match for Baseball Youth)
+            |BIA	(?# Match for Biathalon)
+            |BKC	(?# Match for Basketball U.S. College)
+            |BKH	(?# Match for Basketball High School)
+            |BKL	(?# Match for Basketball Womens Pro)
+            |BKN	(?# Match for Basketball NBA)
+            |BKO	(?# Match for Basketball Other)
+            |BKW	(?# Match for Basketball Womens College)
+            |BOB	(?# Match for Bobsled)
+            |BOX	(?# Match for Boxing)
+            |CAN	(?# Match for Canoeing)
+            |CAR	(?# Match for Auto Racing)
+            |COM	(?# Match for Commonwealth Games)
+            |CRI	(?# Match for Cricket)
+            |CUR	(?# Match for Curling)
+            |CYC	(?# Match for Cycling)
+            |DIV	(?# Match for Diving)
+            |EQU	(?# Match for Equestrian)
+            |FBC	(?# Match for Football U.S. College)
+            |FBH	(?# Match for Football High School)
+            |FBN	(?# Match for Football NFL)
+            |FBO	(?# Match for Football Other)
+            |FEN	(?# Match for Fencing)
+            |FHK	(?# Match for Field Hockey)
+            |FIG	(?# Match for Figure Skating)
+            |FRE	(?# Match for Freestyle skiing)
+            |GLF	(?# Match for Golf)
+            |GYM	(?# Match for Gymnastics)
+            |HKC	(?# Match for Hockey U.S. College)
+            |HKN	(?# Match for Hockey NHL)
+            |HKO	(?# Match for Hockey Other)
+            |HKW	(?# Match for Hockey Women)
+            |HNB	(?# Match for Handball)
+            |JUD	(?# Match for Judo)
+            |JUM	(?# Match for Ski jumping)
+            |LUG	(?# Match for Luge)
+            |MMA	(?# Match for Mixed martial arts)
+            |MOT	(?# Match for Motorcycling)
+            |NOR	(?# Match for Nordic Combined)
+            |OLY	(?# Match for Olympics)
+            |PEN	(?# Match for Modern Pentathlon)
+            |RAC	(?# Match for Horseracing)
+            |RGL	(?# Match for RugbyLeague)
+            |RGU	(?# Match for RugbyUnion)
+            |ROW	(?# Match for Rowing)
+            |SAI	(?# Match for Sailing)
+            |SBD	(?# Match for Snowboarding)
+            |SHO	(?# Match for Short track)
+            |SKE	(?# Match for Skeleton)
+            |SKI	(?# Match for Skiing - Alpine)
+            |SOC	(?# Match for Soccer)
+            |SOF	(?# Match for Softball)
+            |SPD	(?# Match for Speedskating long track)
+            |SQA	(?# Match for Squash)
+            |SUM	(?# Match for Sumo Wrestling)
+            |SWM	(?# Match for Swimming)
+            |TAE	(?# Match for Taekwondo)
+            |TEN	(?# Match for Tennis)
+            |TRI	(?# Match for Triathlon)
+            |TTN	(?# Match for Table tennis)
+            |VOL	(?# Match for Volleyball)
+            |WEI	(?# Match for Weightlifting)
+            |WPO	(?# Match for WaterPolo)
+            |WRE	(?# Match for Wrestling)
+            |XXC	(?# Match for Cross-country skiing)
+            )
+            .*
+            (Box		(?# Match for Box)
+            |Calendar	(?# Match for Calendar)
+            |Comparison	(?# Match for Comparison)
+            |Date		(?# Match for Date)
+            |Digest		(?# Match for Digest)
+            |Fared		(?# Match for Fared)
+            |Glance		(?# Match for Glance)
+            |Leaders	(?# Match for Leaders)
+            |Poll		(?# Match for Poll)
+            |Results?	(?# Match for Results)
+            |Linescores	(?# Match for Linescores)
+            |Schedule	(?# Match for Schedule)
+            |Scores?	(?# Match for Score)
+            |Scorers	(?# Match for Scorers)
+            |Scoreboard	(?# Match for Scoreboard)
+            |Standings	(?# Match for Standings)
+            |Stax		(?# Match for Stax)
+            |Streaks?    (?# Match for baseball streak files)
+            |Sums?		(?# Match for Sum)
+            |Summaries	(?# Match for Summaries)
+            |Glantz-Culver-Line	(?# Match for Glantz-Culver-Line)
+            )
+        """,
+            slugline,
+            re.IGNORECASE | re.VERBOSE,
+        ):
+            return ["Agate"]
+
+        index = get_index(EN_CATEGORY_MAPPING)
+        if index:
+            return index
+
+        if re.search(r"Washington-Digest|AP-Newsfeatures-Digest", slugline):
+            return ["Prairies/BC"]
+
+        if re.search(r"AP-Newsfeatures-Digest", slugline):
+            return ["International"]
+
+        return ["Spare News"]
+
+    def _parse_genre(self, data, item):
+        """Versiontype in JIMI"""
+        slugline = item.get("slugline") or ""
+        if re.search(r"NewsAlert", slugline, re.IGNORECASE):
+            genre = "NewsAlert"
+        elif re.search(r"Correction:", item["headline"], re.IGNORECASE):
+            genre = "Corrective"
+        elif "canceled" == data["item"]["pubstatus"]:
+            genre = "Kill"
+        elif "withheld" == data["item"]["pubstatus"]:
+            genre = "Withhold"
+        elif "embargoed" == data["item"]["pubstatus"]:
+            genre = "Advance"
+        else:
+            genre = data["item"].get("profile")
+
+        if genre:
+            item["genre"] = [
+                {
+                    "name": genre,
+                    "qcode": genre,
+                }
+            ]
+
+
+def load_fixtures():
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES, "*.json"))):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("data", {}).get("item", {}).get("type") == "text":
+            fixtures.append(data["data"])
+    return fixtures
+
+
+def get_categories():
+    with open(os.path.join(ROOT, "data", "vocabularies.json")) as f:
+        for cv in json.load(f):
+            if cv["_id"] == "categories":
+                return cv["items"]
+    return []
+
+
+def get_variants(fixtures, count, seed):
+    """Generate ``(data, item)`` pairs mixing fixtures with rule inputs."""
+    rand = random.Random(seed)
+    for i in range(count):
+        data = copy.deepcopy(fixtures[i % len(fixtures)])
+        ap_item = data["item"]
+        item = {
+            "type": "text",
+            "language": rand.choice(["en", "en-CA", "fr", "fr-CA"]),
+            "slugline": rand.choice(SLUGLINES + [ap_item.get("slugline") or ""]),
+            "headline": rand.choice(HEADLINES + [ap_item.get("headline") or ""]),
+        }
+        ap_item["profile"] = rand.choice(PROFILES + [ap_item.get("profile")])
+        ap_item["urgency"] = rand.choice(list(PRIORITY_MAP) + [None])
+        ap_item["pubstatus"] = rand.choice(
+            ["usable", "canceled", "withheld", "embargoed"]
+        )
+        ap_item["textformat"] = rand.choice(["bx", "at", ""])
+        ap_item["ednote"] = rand.choice(EDNOTES + [ap_item.get("ednote") or ""])
+        data["meta"]["products"] = [
+            {"id": product}
+            for product in rand.sample(PRODUCTS, rand.randint(0, len(PRODUCTS)))
+        ]
+        subject = [subj for subj in ap_item.get("subject", []) if rand.random() < 0.5]
+        subject.extend(
+            {"code": code, "rels": ["category"]}
+            for code in rand.sample(CATEGORIES, rand.randint(0, 3))
+        )
+        subject.extend(
+            {"code": code, "scheme": "http://cv.ap.org/id/"}
+            for code in rand.sample(SUBJECTS, rand.randint(0, 2))
+        )
+        ap_item["subject"] = subject
+        yield data, item
+
+
+def apply_rules(parser, data, item):
+    item = dict(item)
+    ednote = parser._parse_ednote(data["item"]["ednote"])
+    item["ednote"] = parser._format_ednote(ednote)
+    item["update"] = parser._format_update(ednote)
+    item["urgency"] = parser._parse_ranking(data, item)
+    parser._parse_genre(data, item)
+    parser._parse_category(data, item)
+    return item
+
+
+def run(parser, variants):
+    started = time.perf_counter()
+    results = [apply_rules(parser, data, item) for data, item in variants]
+    return results, time.perf_counter() - started
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    argparser.add_argument("--items", type=int, default=20000)
+    argparser.add_argument("--seed", type=int, default=1)
+    args = argparser.parse_args()
+
+    variants = list(get_variants(load_fixtures(), args.items, args.seed))
+    categories = get_categories()
+    with patch("cp.ingest.parser.ap._get_cv_items", return_value=categories):
+        expected, legacy_time = run(LegacyParser(), variants)
+        results, time_ = run(CP_APMediaFeedParser(), variants)
+
+    fields = ("urgency", "genre", "anpa_category", "ednote", "update")
+    mismatches = 0
+    for (data, item), old, new in zip(variants, expected, results):
+        for field in fields:
+            if old.get(field) != new.get(field):
+                mismatches += 1
+                print(
+                    "{} differs for {}: {!r} != {!r}".format(
+                        field, item, old.get(field), new.get(field)
+                    )
+                )
+    print(
+        "{} items, {} distinct urgencies, {} distinct indexes".format(
+            len(variants),
+            len({item["urgency"] for item in results}),
+            len(
+                {
+                    tuple(cat["name"] for cat in item["anpa_category"])
+                    for item in results
+                }
+            ),
+        )
+    )
+    print(
+        "legacy: {:.1f}us/item, rules: {:.1f}us/item, mismatches: {}".format(
+            legacy_time / len(variants) * 1e6, time_ / len(variants) * 1e6, mismatches
+        )
+    )
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Benchmark Semaphore Media Topic parents assignment.
+
+Usage::
+
+    $ python -m benchmarks.assign_parents
+
+Cost per tag path should stay flat as the number of paths grows.
+"""
+
+import timeit
+
+from cp.ai.semaphore import assign_parents
+
+
+def get_data(count, depth=4):
+    subjects = []
+    labels = {}
+    guids = {}
+    for i in range(count):
+        guid_parts = ["root-{}".format(i % 17)]
+        label_parts = ["root label {}".format(i % 17)]
+        for level in range(1, depth):
+            guid_parts.append("topic-{}-{}".format(i, level))
+            label_parts.append("topic label {} {}".format(i, level))
+        subjects.append(
+            {
+                "name": label_parts[-1],
+                "qcode": guid_parts[-1],
+                "parent": "",
+                "relevance": 50,
+            }
+        )
+        labels["/".join(label_parts)] = "0.{}".format(i % 100)
+        guids["/".join(guid_parts)] = "0.{}".format(i % 100)
+    return subjects, labels, guids
+
+
+def run(count, number=5):
+    subjects, labels, guids = get_data(count)
+
+    def assign():
+        response_dict = {"subject": [dict(subject) for subject in subjects]}
+        assign_parents(response_dict, labels, guids)
+
+    return min(timeit.repeat(assign, number=number, repeat=3)) / number
+
+
+def main():
+    print("{:>8} {:>12} {:>14}".format("paths", "total (ms)", "per path (us)"))
+    for count in (10, 50, 100, 500, 1000, 5000):
+        elapsed = run(count)
+        print(
+            "{:>8} {:>12.2f} {:>14.2f}".format(
+                count, elapsed * 1000, elapsed / count * 1000000
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
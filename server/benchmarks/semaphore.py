@@ -0,0 +1,187 @@
+"""Benchmark Semaphore client against a local fake server.
+
+Usage::
+
+    $ python -m benchmarks.semaphore --calls 200 --concurrency 8 --latency 0.05
+
+Drives ``analyze``, ``search`` and ``create_tag_in_semaphore`` at given
+concurrency and reports latency percentiles and outbound request counts.
+Use ``--distinct`` to control how many calls have unique content,
+others repeat it so caching can be measured.
+"""
+
+import io
+import json
+import time
+import flask
+import argparse
+import contextlib
+
+from unittest.mock import patch
+from concurrent.futures import ThreadPoolExecutor
+from superdesk.text_checkers.ai.base import registered_ai_services
+
+from cp.ai.semaphore import Semaphore
+from benchmarks.semaphore_server import FakeSemaphore, read_fixture
+
+
+OPERATIONS = ("analyze", "search", "create")
+
+
+class VocabulariesService:
+    def __init__(self):
+        self.cv = json.loads(read_fixture("subject_custom.json"))
+
+    def find_one(self, req, **lookup):
+        if lookup.get("_id") == self.cv["_id"]:
+            return self.cv
+        return None
+
+
+def get_item(i):
+    return {
+        "guid": "item-{}".format(i),
+        "headline": "Health Canada approves new medication {}".format(i),
+        "abstract": "<p>Approval comes before election</p>",
+        "body_html": "<p>OTTAWA - Health Canada approved a new medication.</p>" * 20,
+        "slugline": "health-medication",
+        "language": "en-CA",
+    }
+
+
+def get_call(service, operation):
+    if operation == "analyze":
+        return lambda i: service.analyze(get_item(i))
+    if operation == "search":
+        return lambda i: service.search(
+            {"searchString": "term{}".format(i), "language": "en-CA"}
+        )
+    return lambda i: service.create_tag_in_semaphore(
+        {
+            "item": get_item(i),
+            "tags": {
+                "subject": [
+                    {
+                        "name": "Concept {}".format(i),
+                        "scheme": "subject",
+                        "source": "manual",
+                    }
+                ],
+                "organisation": [
+                    {
+                        "name": "Organisation {}".format(i),
+                        "scheme": "organisation",
+                        "source": "manual",
+                    }
+                ],
+            },
+        }
+    )
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of sorted values."""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, int(round(p / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def run(app, fake, operation, calls, concurrency, distinct):
+    registered_ai_services.pop(Semaphore.name, None)
+    service = Semaphore(app)
+    call = get_call(service, operation)
+    fake.reset()
+
+    def timed(i):
+        with app.app_context():
+            started = time.perf_counter()
+            try:
+                result = call(i % distinct)
+            except Exception:
+                result = None
+            return time.perf_counter() - started, bool(result)
+
+    started = time.perf_counter()
+    # client prints messages and tracebacks, keep them out of the report
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(timed, range(calls)))
+    elapsed = time.perf_counter() - started
+
+    durations = sorted(duration for duration, _ in results)
+    return {
+        "operation": operation,
+        "calls": calls,
+        "errors": len([ok for _, ok in results if not ok]),
+        "p50": percentile(durations, 50),
+        "p95": percentile(durations, 95),
+        "p99": percentile(durations, 99),
+        "throughput": calls / elapsed,
+        "requests": fake.get_counts(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--calls", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--distinct", type=int, help="unique calls, all by default")
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--operation", choices=OPERATIONS, action="append")
+    args = parser.parse_args()
+
+    fake = FakeSemaphore(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, seed=1
+    )
+    app = flask.Flask(__name__)
+    app.cache = None
+    app.config["CACHE_URL"] = ""
+    app.config.update(fake.get_config())
+
+    print(
+        "{:>8} {:>6} {:>6} {:>9} {:>9} {:>9} {:>9}  {}".format(
+            "",
+            "calls",
+            "errors",
+            "p50 (ms)",
+            "p95 (ms)",
+            "p99 (ms)",
+            "calls/s",
+            "requests",
+        )
+    )
+    with fake, patch(
+        "superdesk.get_resource_service", return_value=VocabulariesService()
+    ):
+        for operation in args.operation or OPERATIONS:
+            stats = run(
+                app,
+                fake,
+                operation,
+                args.calls,
+                args.concurrency,
+                args.distinct or args.calls,
+            )
+            print(
+                "{:>8} {:>6} {:>6} {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f}  {}".format(
+                    stats["operation"],
+                    stats["calls"],
+                    stats["errors"],
+                    stats["p50"] * 1000,
+                    stats["p95"] * 1000,
+                    stats["p99"] * 1000,
+                    stats["throughput"],
+                    " ".join(
+                        "{}={}".format(key, value)
+                        for key, value in sorted(stats["requests"].items())
+                    ),
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
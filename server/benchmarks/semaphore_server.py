@@ -0,0 +1,201 @@
+"""Local stand-in for Semaphore used for load testing.
+
+Serves token, CLASSIFY, search, has broader and concept create endpoints
+using fixtures from ``tests/ai/fixtures``, with configurable latency
+and error injection.
+
+Usage::
+
+    $ python -m benchmarks.semaphore_server --port 8999 --latency 0.1 --error-rate 0.05
+
+Then point ``SEMAPHORE_*`` settings to it, see :meth:`FakeSemaphore.get_config`.
+"""
+
+import os
+import json
+import time
+import random
+import argparse
+import threading
+
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+
+FIXTURES = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "tests", "ai", "fixtures"
+)
+
+
+def read_fixture(filename):
+    with open(os.path.join(FIXTURES, filename), "rb") as f:
+        return f.read()
+
+
+class FakeSemaphore:
+    """Fake Semaphore server running in a background thread.
+
+    :param latency: response delay (seconds)
+    :param jitter: max random delay added to latency (seconds)
+    :param error_rate: ratio of requests failing with 500 error
+    :param seed: random seed for jitter and errors
+    """
+
+    def __init__(
+        self, host="127.0.0.1", port=0, latency=0, jitter=0, error_rate=0, seed=None
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.counts: Counter = Counter()
+        self.concepts = set()
+        self.fixtures = {
+            "classify": read_fixture("classify.xml"),
+            "search": read_fixture("search.json"),
+            "parent": read_fixture("parent.xml"),
+        }
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self.get_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    def get_config(self):
+        """Get app config for using this server."""
+        return {
+            "SEMAPHORE_BASE_URL": self.url + "/token",
+            "SEMAPHORE_API_KEY": "fake-key",
+            "SEMAPHORE_ANALYZE_URL": self.url + "/classify",
+            "SEMAPHORE_SEARCH_URL": self.url + "/en/search/",
+            "SEMAPHORE_GET_PARENT_URL": self.url + "/en/parent/",
+            "SEMAPHORE_CREATE_TAG_URL": self.url + "/kmm/",
+            "SEMAPHORE_CREATE_TAG_TASK": "create",
+            "SEMAPHORE_CREATE_TAG_QUERY": "",
+        }
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, name="fake-semaphore", daemon=True
+        )
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def reset(self):
+        with self._lock:
+            self.counts.clear()
+
+    def get_counts(self):
+        with self._lock:
+            return dict(self.counts)
+
+    def handle(self, method, path, body):
+        """Get response status, content type and body for request."""
+        parts = urlparse(path).path.strip("/").split("/")
+        if method == "POST" and parts == ["token"]:
+            endpoint = "token"
+        elif method == "POST" and parts == ["classify"]:
+            endpoint = "classify"
+        elif method == "GET" and len(parts) == 3 and parts[1] == "search":
+            endpoint = "search"
+        elif method == "GET" and len(parts) == 3 and parts[1] == "parent":
+            endpoint = "parent"
+        elif method == "POST" and parts == ["kmm", "create"]:
+            endpoint = "create"
+        else:
+            return 404, "text/plain", b"not found"
+
+        with self._lock:
+            self.counts[endpoint] += 1
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            failed = self.random.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        if failed:
+            return 500, "text/plain", b"injected error"
+
+        if endpoint == "token":
+            data = {"access_token": "fake-token", "expires_in": 3600}
+            return 200, "application/json", json.dumps(data).encode()
+        if endpoint == "classify":
+            return 200, "text/xml", self.fixtures["classify"]
+        if endpoint == "search":
+            return 200, "application/json", self.fixtures["search"]
+        if endpoint == "parent":
+            return 200, "text/xml", self.fixtures["parent"]
+        concept = json.loads(body)
+        name = concept["skosxl:prefLabel"][0]["skosxl:literalForm"][0]["@value"]
+        with self._lock:
+            if name in self.concepts:
+                return 409, "text/plain", b"concept exists"
+            self.concepts.add(name)
+        return 201, "application/ld+json", b"{}"
+
+    def get_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # send headers and body together, avoids delayed ack stalls
+            disable_nagle_algorithm = True
+            wbufsize = -1
+
+            def do_GET(self):
+                self.respond(b"")
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                self.respond(self.rfile.read(length))
+
+            def respond(self, body):
+                status, content_type, data = fake.handle(self.command, self.path, body)
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8999)
+    parser.add_argument("--latency", type=float, default=0)
+    parser.add_argument("--jitter", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    args = parser.parse_args()
+    fake = FakeSemaphore(
+        args.host, args.port, args.latency, args.jitter, args.error_rate
+    )
+    for key, value in fake.get_config().items():
+        print("{}={}".format(key, value))
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import time
+import logging
+import threading
+
+from typing import Any, Dict
+
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitOpenError(Exception):
+    """Raised when calls are not allowed."""
+
+
+class CircuitBreaker:
+    """Stop calling a service after repeated failures.
+
+    After ``failure_threshold`` consecutive failures (errors or responses
+    slower than their latency budget) the circuit opens and calls are
+    rejected for ``reset_timeout`` seconds. Then a single probe call
+    is allowed, if it succeeds the circuit is closed again, otherwise
+    it opens for another ``reset_timeout``.
+    """
+
+    def __init__(self, name: str, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def is_open(self) -> bool:
+        """Test if calls are rejected now."""
+        with self._lock:
+            if self.state == OPEN:
+                return time.monotonic() - self.opened_at < self.reset_timeout
+            return self.state == HALF_OPEN and self._probing
+
+    def before_call(self) -> None:
+        """Check if call is allowed, raises :class:`CircuitOpenError` if not."""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    raise CircuitOpenError(f"{self.name} circuit is open")
+                self.state = HALF_OPEN
+                self._probing = False
+            if self._probing:
+                raise CircuitOpenError(f"{self.name} circuit is half-open")
+            self._probing = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info("%s circuit closed", self.name)
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (
+                self.state == CLOSED and self.failures >= self.failure_threshold
+            ):
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.trips += 1
+                self._probing = False
+                logger.warning(
+                    "%s circuit opened after %d failures", self.name, self.failures
+                )
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "trips": self.trips,
+            }
@@ -0,0 +1,35 @@
+import threading
+
+from typing import Iterable, Set, Tuple
+
+
+class KnownConcepts:
+    """Concepts known to exist in Semaphore.
+
+    Used to skip create requests for concepts which would be rejected
+    as duplicates. Concepts are identified by scheme and name.
+    """
+
+    def __init__(self):
+        self.concepts: Set[Tuple[str, str]] = set()
+        self.version = None
+        self._lock = threading.Lock()
+
+    def key(self, scheme: str, name: str) -> Tuple[str, str]:
+        return (scheme, " ".join(name.lower().split()))
+
+    def seed(self, scheme: str, names: Iterable[str], version) -> None:
+        """Add names from vocabulary if it was updated."""
+        if version is not None and version == self.version:
+            return
+        keys = {self.key(scheme, name) for name in names if name}
+        with self._lock:
+            self.concepts.update(keys)
+            self.version = version
+
+    def add(self, scheme: str, name: str) -> None:
+        with self._lock:
+            self.concepts.add(self.key(scheme, name))
+
+    def contains(self, scheme: str, name: str) -> bool:
+        return self.key(scheme, name) in self.concepts
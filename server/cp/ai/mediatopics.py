@@ -0,0 +1,117 @@
+import threading
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from cachetools import TTLCache
+
+from cp.ai.vocabulary import SubjectIndex, subjects
+
+
+Parent = Dict[str, Any]
+FetchParents = Callable[[str, str], Optional[List[Parent]]]
+
+
+class MediaTopicIndex:
+    """Media Topic hierarchy used to resolve broader terms.
+
+    The hierarchy is built from ``subject_custom`` vocabulary using
+    ``semaphore_id`` and ``parent`` fields of its items, so ancestors
+    of known topics are resolved in memory. Topics missing in the vocabulary
+    are fetched from Semaphore and kept in LRU cache with TTL.
+
+    :param fetch: callable returning ancestors from Semaphore, top first,
+                  or ``None`` on error
+    :param maxsize: number of remote results to keep
+    :param ttl: how long to keep remote results (seconds)
+    :param index: vocabulary index, process-wide one by default
+    """
+
+    def __init__(
+        self,
+        fetch: FetchParents,
+        maxsize=1000,
+        ttl=6 * 3600,
+        index: SubjectIndex = subjects,
+    ):
+        self.fetch = fetch
+        self.index = index
+        self.chains: Dict[Tuple[str, str], List[Parent]] = {}
+        self.remote: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._chains_source: Optional[Dict] = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        return self.index.version
+
+    @property
+    def by_qcode(self) -> Dict[str, Dict]:
+        return self.index.by_qcode
+
+    @property
+    def by_semaphore_id(self) -> Dict[str, Dict]:
+        return self.index.by_semaphore_id
+
+    def refresh(self) -> None:
+        """Rebuild the index if vocabulary was updated."""
+        self.index.refresh()
+
+    def get_parents(self, semaphore_id: str, language: str) -> List[Parent]:
+        """Get ancestors of given topic, top level first."""
+        key = (semaphore_id, language)
+        by_qcode = self.index.by_qcode
+        if self._chains_source is not by_qcode:
+            with self._lock:
+                # vocabulary was rebuilt
+                self.chains = {}
+                self._chains_source = by_qcode
+        if key in self.chains:
+            return self.chains[key]
+        item = self.by_semaphore_id.get(semaphore_id)
+        parents = self._get_local_parents(item, language) if item else None
+        if parents is not None:
+            with self._lock:
+                self.chains[key] = parents
+            return parents
+        with self._lock:
+            remote = self.remote.get(key)
+        if remote is None:
+            remote = self.fetch(semaphore_id, language)
+            if remote is None:  # don't cache errors
+                return []
+            with self._lock:
+                self.remote[key] = remote
+        return remote
+
+    def _get_local_parents(self, item: Dict, language: str) -> Optional[List[Parent]]:
+        """Get ancestors from vocabulary.
+
+        Returns ``None`` when some ancestor has no ``semaphore_id``,
+        those have to be fetched from Semaphore.
+        """
+        parents: List[Parent] = []
+        seen = {item["qcode"]}
+        parent = self.by_qcode.get(item.get("parent") or "")
+        while parent is not None and parent["qcode"] not in seen:
+            if not parent.get("semaphore_id"):
+                return None
+            seen.add(parent["qcode"])
+            parents.append(
+                {
+                    "name": get_name(parent, language),
+                    "qcode": parent["semaphore_id"],
+                    "relevance": 47,
+                    "creator": "Human",
+                    "parent": None,
+                }
+            )
+            parent = self.by_qcode.get(parent.get("parent") or "")
+        return parents[::-1]
+
+
+def get_name(item: Dict, language: str) -> str:
+    if language and language.startswith("fr"):
+        try:
+            return item["translations"]["name"]["fr-CA"]
+        except (KeyError, TypeError):
+            pass
+    return item["name"]
@@ -0,0 +1,208 @@
+"""Semaphore client instrumentation.
+
+Each stage of a call (token, http request, transform, parents lookup,
+``replace_qcodes``) is timed using :func:`stage` and recorded as
+Prometheus-style counters and histograms, available in text exposition
+format at ``/api/semaphore/metrics``. The endpoint requires superdesk
+authentication or ``SEMAPHORE_METRICS_TOKEN`` sent as bearer token.
+
+Metrics are kept per process.
+"""
+
+import hmac
+import time
+import bisect
+import logging
+import threading
+import superdesk
+
+from typing import Dict, List, Tuple
+from contextlib import contextmanager
+from flask import Blueprint, Response, current_app as app, request
+
+
+logger = logging.getLogger(__name__)
+bp = Blueprint("semaphore_metrics", __name__)
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self.values.get(tuple(sorted(labels.items())), 0)
+
+    def render(self) -> List[str]:
+        lines = [
+            "# HELP {} {}".format(self.name, self.help),
+            "# TYPE {} counter".format(self.name),
+        ]
+        with self._lock:
+            for key, value in sorted(self.values.items()):
+                lines.append("{}{} {}".format(self.name, format_labels(key), value))
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.values: Dict[Labels, Dict] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            data = self.values.get(key)
+            if data is None:
+                data = self.values[key] = {
+                    "buckets": [0] * (len(self.buckets) + 1),
+                    "sum": 0.0,
+                    "count": 0,
+                }
+            data["buckets"][index] += 1
+            data["sum"] += value
+            data["count"] += 1
+
+    def get(self, **labels) -> Dict:
+        return self.values.get(tuple(sorted(labels.items())), {})
+
+    def render(self) -> List[str]:
+        lines = [
+            "# HELP {} {}".format(self.name, self.help),
+            "# TYPE {} histogram".format(self.name),
+        ]
+        with self._lock:
+            for key, data in sorted(self.values.items()):
+                total = 0
+                bounds = [str(bound) for bound in self.buckets] + ["+Inf"]
+                for bound, count in zip(bounds, data["buckets"]):
+                    total += count
+                    lines.append(
+                        "{}_bucket{} {}".format(
+                            self.name, format_labels(key + (("le", bound),)), total
+                        )
+                    )
+                lines.append(
+                    "{}_sum{} {}".format(self.name, format_labels(key), data["sum"])
+                )
+                lines.append(
+                    "{}_count{} {}".format(self.name, format_labels(key), data["count"])
+                )
+        return lines
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{{{}}}".format(
+        ",".join(
+            '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+            for name, value in labels
+        )
+    )
+
+
+stage_seconds = Histogram(
+    "semaphore_stage_seconds", "Time spent in Semaphore client stage."
+)
+stage_total = Counter("semaphore_stage_total", "Semaphore client stage calls.")
+request_bytes = Counter(
+    "semaphore_request_bytes_total", "Bytes sent to Semaphore by stage."
+)
+response_bytes = Counter(
+    "semaphore_response_bytes_total", "Bytes received from Semaphore by stage."
+)
+
+METRICS = (stage_seconds, stage_total, request_bytes, response_bytes)
+
+
+class Stage:
+    """Stage being timed, set byte counts on it if there are any."""
+
+    def __init__(self, operation: str, name: str):
+        self.operation = operation
+        self.name = name
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.status = "ok"
+
+
+@contextmanager
+def stage(operation: str, name: str):
+    """Time a stage of Semaphore call.
+
+    Usage::
+
+        with stage("analyze", "http") as s:
+            response = session.post(url, data=payload)
+            s.response_bytes = len(response.content)
+    """
+    current = Stage(operation, name)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException:
+        current.status = "error"
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        labels = dict(operation=operation, stage=name)
+        stage_seconds.observe(duration, **labels)
+        stage_total.inc(status=current.status, **labels)
+        if current.request_bytes:
+            request_bytes.inc(current.request_bytes, **labels)
+        if current.response_bytes:
+            response_bytes.inc(current.response_bytes, **labels)
+        logger.debug(
+            "semaphore.%s.%s: %.3fms status=%s request_bytes=%d response_bytes=%d",
+            operation,
+            name,
+            duration * 1000,
+            current.status,
+            current.request_bytes,
+            current.response_bytes,
+        )
+
+
+def render() -> str:
+    """Get all metrics in Prometheus text format."""
+    lines: List[str] = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def is_authorized() -> bool:
+    token = app.config.get("SEMAPHORE_METRICS_TOKEN")
+    if token and hmac.compare_digest(
+        request.headers.get("Authorization", ""), "Bearer {}".format(token)
+    ):
+        return True
+    auth = getattr(app, "auth", None)
+    return bool(auth and auth.authorized([], "_blueprint", request.method))
+
+
+@bp.route("/semaphore/metrics", methods=["GET"])
+def metrics():
+    if not is_authorized():
+        return Response("Unauthorized", status=401)
+    return Response(render(), mimetype="text/plain; version=0.0.4")
+
+
+def init_app(app) -> None:
+    superdesk.blueprint(bp, app)
@@ -0,0 +1,136 @@
+import gzip
+import datetime
+import lxml.etree as etree
+import lxml.html
+
+from typing import List, Tuple
+from urllib.parse import urlencode
+from xml.sax.saxutils import escape
+
+
+# max number of body words sent for classification
+TOKEN_BUDGET = 3000
+
+BLOCK_TAGS = {
+    "p",
+    "div",
+    "br",
+    "li",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "h6",
+    "blockquote",
+    "pre",
+    "tr",
+    "table",
+    "ul",
+    "ol",
+}
+
+# content of these is not part of the text
+SKIP_TAGS = {"script", "style", "template", "noscript", "iframe", "object"}
+
+ENTITIES = {'"': "&quot;"}
+
+
+def extract_text(html: str, token_budget=0) -> Tuple[str, bool]:
+    """Get plain text from html in a single pass.
+
+    Text of block elements is put on separate lines, whitespace
+    is normalized and markup is dropped. When ``token_budget`` is set
+    only that many words are extracted.
+
+    Returns text and flag if it was truncated.
+    """
+    if not html or not html.strip():
+        return "", False
+    root = lxml.html.fragment_fromstring(html, create_parent="div")
+    lines: List[str] = []
+    words: List[str] = []
+    count = 0
+    truncated = False
+
+    def add(text):
+        nonlocal count, truncated
+        if not text or truncated:
+            return
+        parts = text.split()
+        if token_budget and count + len(parts) > token_budget:
+            parts = parts[: token_budget - count]
+            truncated = True
+        words.extend(parts)
+        count += len(parts)
+
+    def new_line():
+        if words:
+            lines.append(" ".join(words))
+            words.clear()
+
+    skipping = 0
+    for event, elem in etree.iterwalk(root, events=("start", "end")):
+        if truncated:
+            break
+        tag = elem.tag if isinstance(elem.tag, str) else None
+        if event == "start":
+            if skipping or tag in SKIP_TAGS:
+                skipping += 1
+            elif tag is not None:  # comments and processing instructions
+                if tag in BLOCK_TAGS:
+                    new_line()
+                add(elem.text)
+            continue
+        if skipping:
+            skipping -= 1
+            if skipping:
+                continue
+        elif tag in BLOCK_TAGS:
+            new_line()
+        if elem is not root:
+            add(elem.tail)
+    new_line()
+    return "\n".join(lines), truncated
+
+
+def build_classify_xml(item, env: str, token_budget=TOKEN_BUDGET) -> str:
+    """Build CLASSIFY request payload for item.
+
+    Story fields are sent as plain text, body is limited
+    to ``token_budget`` words.
+    """
+    body, _ = extract_text(item.get("body_html") or "", token_budget)
+    abstract, _ = extract_text(item.get("abstract") or "")
+    fields = (
+        ("headline", item.get("headline") or ""),
+        ("headline_extended", abstract),
+        ("body_html", body),
+        ("slugline", item.get("slugline") or ""),
+        ("guid", item.get("guid") or ""),
+        ("env", env),
+        ("dateTime", datetime.datetime.now().isoformat()),
+    )
+    story = '<?xml version="1.0" encoding="UTF-8"?><story>{}</story>'.format(
+        "".join(
+            "<{name}>{value}</{name}>".format(name=name, value=escape(value))
+            for name, value in fields
+        )
+    )
+    return (
+        '<?xml version="1.0" ?><request op="CLASSIFY"><document>'
+        "<body>{}</body></document></request>".format(escape(story, ENTITIES))
+    )
+
+
+def encode_form(data, compress=False) -> Tuple[bytes, dict]:
+    """Encode form data, optionally gzipped.
+
+    Returns request body and headers.
+    """
+    body = urlencode(data).encode("utf-8")
+    headers = {"Content-Type": "application/x-www-form-urlencoded"}
+    if compress:
+        body = gzip.compress(body)
+        headers["Content-Encoding"] = "gzip"
+    return body, headers
@@ -0,0 +1,215 @@
+"""Semaphore pre-classification of ingested items.
+
+When ``SEMAPHORE_PRECLASSIFY`` is enabled text items are queued
+for classification in background once stored in ingest, results are stored in ``semaphore_tags``
+collection keyed by item guid and content hash. When an editor asks
+for tags later and the content wasn't changed these are used instead
+of calling Semaphore again.
+
+The stage has its own rate limit (``SEMAPHORE_PRECLASSIFY_RATE`` requests
+per second shared by all workers) and max queue depth
+(``SEMAPHORE_PRECLASSIFY_MAX_DEPTH``), items over it are dropped
+and will be classified on request, so ingest bursts won't flood Semaphore.
+Items throttled for longer than ``MAX_RETRIES`` seconds are dropped too.
+"""
+
+import time
+import logging
+import superdesk
+
+from typing import Dict, Optional
+from flask import current_app as app
+from superdesk.celery_app import celery
+from superdesk.text_checkers.ai.base import registered_ai_services
+from apps.archive.ingest import AppIngestService, IngestResource
+
+from cp.ai.result_cache import HASH_FIELDS, get_content_hash
+
+
+logger = logging.getLogger(__name__)
+
+RESOURCE = "semaphore_tags"
+
+STATS_KEY = "cp:ai:preclassify:stats"
+DEPTH_KEY = "cp:ai:preclassify:depth"
+RATE_KEY = "cp:ai:preclassify:rate:{}"
+
+# reset depth if there was no item queued for given time,
+# so it won't get stuck if some tasks were lost
+DEPTH_TTL = 3600
+
+# how long to keep stored tags (seconds)
+EXPIRY = 3 * 24 * 3600
+
+# max retries of throttled item, retried every second
+MAX_RETRIES = 300
+
+STATS_FIELDS = ("queued", "dropped", "throttled", "done", "failed")
+
+
+class SemaphoreTagsResource(superdesk.Resource):
+    schema = {
+        "guid": {"type": "string", "required": True},
+        "content_hash": {"type": "string", "required": True},
+        "tags": {"type": "dict"},
+    }
+    internal_resource = True
+    mongo_indexes = {
+        "guid_1": ([("guid", 1)], {"unique": True}),
+        "content_hash_1": ([("content_hash", 1)], {"background": True}),
+        "_created_1": ([("_created", 1)], {"expireAfterSeconds": EXPIRY}),
+    }
+
+
+class SemaphoreTagsService(superdesk.Service):
+    pass
+
+
+class PreclassifyIngestService(AppIngestService):
+    """Queue items for pre-classification once stored in ingest.
+
+    Items rejected or skipped by ingest are not queued.
+    """
+
+    def on_created(self, docs):
+        super().on_created(docs)
+        for doc in docs:
+            queue_item(doc)
+
+    def patch_in_mongo(self, id, document, original):
+        res = super().patch_in_mongo(id, document, original)
+        queue_item(dict(original, **document))
+        return res
+
+
+def is_enabled() -> bool:
+    return bool(app.config.get("SEMAPHORE_PRECLASSIFY"))
+
+
+def queue_item(item) -> bool:
+    """Queue ingested item for classification.
+
+    Only text items with some content are queued,
+    returns ``True`` if item was queued.
+    """
+    if not is_enabled() or item.get("type") != "text":
+        return False
+    if not item.get("guid") or not (item.get("body_html") or item.get("headline")):
+        return False
+    with app.redis.pipeline() as pipe:
+        pipe.incr(DEPTH_KEY)
+        pipe.expire(DEPTH_KEY, DEPTH_TTL)
+        depth = pipe.execute()[0]
+    if depth > app.config["SEMAPHORE_PRECLASSIFY_MAX_DEPTH"]:
+        app.redis.decr(DEPTH_KEY)
+        incr_stats("dropped")
+        logger.warning(
+            "Semaphore pre-classification queue is full, skipping item guid=%s",
+            item["guid"],
+        )
+        return False
+    data = {field: item.get(field) for field in HASH_FIELDS}
+    data["guid"] = item["guid"]
+    try:
+        preclassify_item.apply_async(args=[data])
+    except Exception as e:
+        app.redis.decr(DEPTH_KEY)
+        logger.error("Could not queue item for pre-classification: %s", e)
+        return False
+    incr_stats("queued")
+    return True
+
+
+@celery.task(bind=True, max_retries=MAX_RETRIES, soft_time_limit=120)
+def preclassify_item(self, item):
+    if not acquire_rate_slot():
+        if self.request.retries >= self.max_retries:
+            app.redis.decr(DEPTH_KEY)
+            incr_stats("dropped")
+            logger.warning(
+                "Semaphore pre-classification throttled too long, skipping item guid=%s",
+                item["guid"],
+            )
+            return
+        incr_stats("throttled")
+        raise self.retry(countdown=1)
+    try:
+        if classify(item):
+            incr_stats("done")
+        else:
+            incr_stats("failed")
+    except Exception:
+        logger.exception("Pre-classification failed for item guid=%s", item["guid"])
+        incr_stats("failed")
+    finally:
+        app.redis.decr(DEPTH_KEY)
+
+
+def classify(item) -> bool:
+    if get_stored_tags(item) is not None:
+        return True
+    tags = registered_ai_services["semaphore"].analyze(item)
+    if not tags:
+        return False
+    store_tags(item["guid"], get_content_hash(item), tags)
+    return True
+
+
+def acquire_rate_slot() -> bool:
+    """Test if request is allowed within the shared rate limit.
+
+    Using fixed window of 1 second shared via redis.
+    """
+    key = RATE_KEY.format(int(time.time()))
+    with app.redis.pipeline() as pipe:
+        pipe.incr(key)
+        pipe.expire(key, 2)
+        count = pipe.execute()[0]
+    return count <= app.config["SEMAPHORE_PRECLASSIFY_RATE"]
+
+
+def store_tags(guid: str, content_hash: str, tags: Dict) -> None:
+    service = superdesk.get_resource_service(RESOURCE)
+    updates = {"content_hash": content_hash, "tags": tags}
+    stored = service.find_one(req=None, guid=guid)
+    if stored:
+        service.system_update(stored["_id"], updates, stored)
+    else:
+        service.post([dict(guid=guid, **updates)])
+
+
+def get_stored_tags(item) -> Optional[Dict]:
+    """Get tags stored for item content.
+
+    The editor's copy of an ingested item has a different guid,
+    so it's matched by content hash.
+    """
+    stored = superdesk.get_resource_service(RESOURCE).find_one(
+        req=None, content_hash=get_content_hash(item)
+    )
+    if stored:
+        return stored.get("tags")
+    return None
+
+
+def incr_stats(field: str) -> None:
+    app.redis.hincrby(STATS_KEY, field, 1)
+
+
+def get_stats() -> Dict[str, int]:
+    """Get pre-classification counters and current queue depth."""
+    stats = app.redis.hgetall(STATS_KEY) or {}
+    data = {field: int(stats.get(field.encode(), 0)) for field in STATS_FIELDS}
+    data["depth"] = max(0, int(app.redis.get(DEPTH_KEY) or 0))
+    return data
+
+
+def init_app(_app) -> None:
+    superdesk.register_resource(
+        RESOURCE, SemaphoreTagsResource, SemaphoreTagsService, _app=_app
+    )
+
+    # override ingest service registered by apps.archive
+    endpoint_name = "ingest"
+    service = PreclassifyIngestService(endpoint_name, backend=superdesk.get_backend())
+    IngestResource(endpoint_name, app=_app, service=service)
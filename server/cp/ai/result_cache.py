@@ -0,0 +1,61 @@
+import copy
+import hashlib
+import threading
+
+from typing import Dict, Optional
+from cachetools import TTLCache
+
+
+# item fields which are sent to Semaphore for classification
+HASH_FIELDS = ("headline", "abstract", "body_html", "slugline", "language")
+
+
+def get_content_hash(item) -> str:
+    """Hash item content, ignoring whitespace differences."""
+    content = "\x00".join(
+        " ".join((item.get(field) or "").split()) for field in HASH_FIELDS
+    )
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Cache of analyze results keyed by item content hash.
+
+    Results are kept in process memory for ``ttl`` seconds,
+    least recently used are evicted when there are ``maxsize`` of them.
+    """
+
+    def __init__(self, maxsize=500, ttl=600):
+        self.cache: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, item) -> Optional[Dict]:
+        key = get_content_hash(item)
+        with self._lock:
+            result = self.cache.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return copy.deepcopy(result)
+
+    def set(self, item, result: Dict) -> None:
+        key = get_content_hash(item)
+        result = copy.deepcopy(result)
+        with self._lock:
+            self.cache[key] = result
+
+    def clear(self) -> None:
+        with self._lock:
+            self.cache.clear()
+
+    def info(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self.cache),
+                "maxsize": int(self.cache.maxsize),
+            }
@@ -1,21 +1,42 @@
 import logging
 import requests
 import xml.etree.ElementTree as ET
+import lxml.etree as etree
 from superdesk.text_checkers.ai.base import AIServiceBase
 import traceback
-import superdesk
 import json
 from typing import (
+    Any,
     Dict,
+    Iterable,
+    Iterator,
     List,
     Literal,
     Mapping,
     Optional,
+    Tuple,
     TypedDict,
     Union,
     overload,
 )
+import io
+import time
 import datetime
+import hashlib
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from flask import current_app as app
+from requests.adapters import HTTPAdapter
+
+from cp.ai.token_cache import TokenCache
+from cp.ai.mediatopics import MediaTopicIndex
+from cp.ai.vocabulary import subjects
+from cp.ai.result_cache import ResultCache
+from cp.ai.concepts import KnownConcepts
+from cp.ai.circuit_breaker import CircuitBreaker
+from cp.ai import preclassify
+from cp.ai.metrics import stage
+from cp.ai.payload import TOKEN_BUDGET, build_classify_xml, encode_form
 
 
 logger = logging.getLogger(__name__)
@@ -23,6 +44,15 @@ session = requests.Session()
 
 TIMEOUT = (5, 30)
 
+# latency budget per operation (seconds), slower requests count as failures
+LATENCY_BUDGETS = {
+    "token": 10,
+    "analyze": 30,
+    "search": 10,
+    "parent": 5,
+    "create": 10,
+}
+
 
 def format_relevance(value: str) -> int:
     float_value = float(value)
@@ -32,6 +62,15 @@ def format_relevance(value: str) -> int:
 
 ResponseType = Mapping[str, Union[str, List[str]]]
 
+# top concepts for new tags by scheme
+CONCEPT_SCHEMES = {
+    "subject": "http://cv.cp.org/4916d989-2227-4f2d-8632-525cd462ab9f",
+    "organisation": "http://cv.cp.org/e2c332d3-05e0-4dcc-b358-9e4855e80e88",
+    "places": "http://cv.cp.org/c3b17bf6-7969-424d-92ae-966f4f707a95",
+    "person": "http://cv.cp.org/1630a532-329f-43fe-9606-b381330c35cf",
+    "event": "http://cv.cp.org/3c493189-023f-4d14-a2f4-fc7b79735ffc",
+}
+
 
 class SearchData(TypedDict):
     searchString: str
@@ -100,6 +139,76 @@ class Semaphore(AIServiceBase):
         #  SEMAPHORE_CREATE_TAG_QUERY Goes Here
         self.create_tag_query = app.config.get("SEMAPHORE_CREATE_TAG_QUERY")
 
+        # stop calling semaphore when it's failing or too slow
+        self.latency_budgets = LATENCY_BUDGETS.copy()
+        self.latency_budgets.update(app.config.get("SEMAPHORE_LATENCY_BUDGETS") or {})
+        self.breaker = CircuitBreaker(
+            self.name,
+            failure_threshold=app.config.get("SEMAPHORE_BREAKER_FAILURES", 5),
+            reset_timeout=app.config.get("SEMAPHORE_BREAKER_RESET_TIMEOUT", 30),
+        )
+
+        # token is shared by all workers using same credentials
+        credentials = "{}{}".format(self.base_url, self.api_key).encode("utf-8")
+        self.token_cache = TokenCache(
+            self.fetch_access_token,
+            hashlib.sha1(credentials).hexdigest(),
+            refresh_margin=app.config.get("SEMAPHORE_TOKEN_REFRESH_MARGIN", 60),
+        )
+
+        self.mediatopics = MediaTopicIndex(
+            self.fetch_parents,
+            maxsize=app.config.get("SEMAPHORE_PARENT_CACHE_SIZE", 1000),
+            ttl=app.config.get("SEMAPHORE_PARENT_CACHE_TTL", 6 * 3600),
+        )
+
+        # broader terms lookups for a search response run concurrently
+        self.parent_concurrency = app.config.get("SEMAPHORE_PARENT_CONCURRENCY", 8)
+        self.parent_timeout = app.config.get(
+            "SEMAPHORE_PARENT_TIMEOUT", self.latency_budgets["parent"]
+        )
+        self.latency_budgets["parent"] = self.parent_timeout
+        self.parent_executor = ThreadPoolExecutor(
+            max_workers=self.parent_concurrency,
+            thread_name_prefix="semaphore-parents",
+        )
+
+        # analyze results for unchanged content
+        self.result_cache = ResultCache(
+            maxsize=app.config.get("SEMAPHORE_RESULT_CACHE_SIZE", 500),
+            ttl=app.config.get("SEMAPHORE_RESULT_CACHE_TTL", 600),
+        )
+
+        # concepts which don't need to be created
+        self.known_concepts = KnownConcepts()
+        self.create_tag_concurrency = app.config.get(
+            "SEMAPHORE_CREATE_TAG_CONCURRENCY", 4
+        )
+        self.create_tag_executor = ThreadPoolExecutor(
+            max_workers=self.create_tag_concurrency,
+            thread_name_prefix="semaphore-create",
+        )
+
+        # classify payload size
+        self.body_token_budget = app.config.get(
+            "SEMAPHORE_BODY_TOKEN_BUDGET", TOKEN_BUDGET
+        )
+        self.gzip_requests = app.config.get("SEMAPHORE_GZIP_REQUESTS", False)
+
+        # batch classification concurrency
+        self.batch_concurrency = app.config.get("SEMAPHORE_BATCH_CONCURRENCY", 4)
+
+        adapter = HTTPAdapter(
+            pool_maxsize=max(
+                10,
+                self.parent_concurrency,
+                self.create_tag_concurrency,
+                self.batch_concurrency,
+            )
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
     def convert_to_desired_format(input_data):
         result = {
             "result": {
@@ -117,30 +226,85 @@ class Semaphore(AIServiceBase):
 
         return result
 
+    def request(self, operation, method, url, **kwargs):
+        """Send request to Semaphore within operation latency budget.
+
+        When access token is rejected it's dropped from cache and the request
+        is sent once more with a new token.
+
+        Raises :class:`CircuitOpenError` when Semaphore is not available.
+        """
+        response = self._request(operation, method, url, **kwargs)
+        headers = kwargs.get("headers") or {}
+        if response.status_code in (401, 403) and headers.get("Authorization"):
+            logger.warning(f"Semaphore {operation} rejected access token")
+            self.token_cache.invalidate()
+            scheme = headers["Authorization"].split(" ", 1)[0]
+            kwargs["headers"] = {
+                **headers,
+                "Authorization": f"{scheme} {self.get_access_token()}",
+            }
+            response = self._request(operation, method, url, **kwargs)
+        return response
+
+    def _request(self, operation, method, url, **kwargs):
+        budget = self.latency_budgets[operation]
+        kwargs.setdefault("timeout", (TIMEOUT[0], budget))
+        self.breaker.before_call()
+        started = time.monotonic()
+        with stage(operation, "http") as http:
+            try:
+                response = session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException:
+                self.breaker.record_failure()
+                raise
+            http.request_bytes = len(response.request.body or "")
+            http.response_bytes = len(response.content)
+            if response.status_code >= 400:
+                http.status = "error"
+        duration = time.monotonic() - started
+        if response.status_code >= 500 or duration > budget:
+            if duration > budget:
+                logger.warning(f"Semaphore {operation} took {duration:.2f}s")
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
     def get_access_token(self):
-        """Get access token for Semaphore."""
+        """Get access token for Semaphore.
+
+        Token is cached until it is about to expire.
+        """
+        return self.token_cache.get()
+
+    def fetch_access_token(self):
+        """Request new access token from Semaphore token endpoint."""
         url = self.base_url
 
         payload = f"grant_type=apikey&key={self.api_key}"
         headers = {"Content-Type": "application/x-www-form-urlencoded"}
-        response = session.post(url, headers=headers, data=payload, timeout=TIMEOUT)
+        response = self.request("token", "POST", url, headers=headers, data=payload)
         response.raise_for_status()
-        return response.json().get("access_token")
+        data = response.json()
+        return data.get("access_token"), int(data.get("expires_in") or 0)
 
     def fetch_parent_info(self, qcode, article_language):
         headers = {"Authorization": f"Bearer {self.get_access_token()}"}
         try:
             frank = "?relationshipType=has%20broader"
             # Change language based on article language
+            # without changing the instance, it's used by concurrent requests
+            get_parent_url = self.get_parent_url
             if article_language == "fr-CA":
-                self.get_parent_url = self.get_parent_url.replace("/en/", "/fr/")
+                get_parent_url = get_parent_url.replace("/en/", "/fr/")
             elif article_language == "en-CA":
-                self.get_parent_url = self.get_parent_url.replace("/fr/", "/en/")
+                get_parent_url = get_parent_url.replace("/fr/", "/en/")
 
             query = qcode
-            parent_url = self.get_parent_url + query + frank
+            parent_url = get_parent_url + query + frank
 
-            response = session.get(parent_url, headers=headers)
+            response = self.request("parent", "GET", parent_url, headers=headers)
             if response.status_code != 200:
                 logging.error(
                     f"Error response: {response.status_code} - {response.text}"
@@ -168,6 +332,38 @@ class Semaphore(AIServiceBase):
             logger.error(f"Error fetching parent info: {str(e)}")
             return []
 
+    def fetch_parents(self, qcode, article_language):
+        """Fetch ancestors from Semaphore, returns ``None`` on error."""
+        result = self.fetch_parent_info(qcode, article_language)
+        if not result:
+            return None
+        return result[0]
+
+    def get_parents_many(self, qcodes, article_language):
+        """Get ancestors for multiple topics concurrently.
+
+        Lookups not finished within ``SEMAPHORE_PARENT_TIMEOUT`` are skipped.
+        """
+        flask_app = app._get_current_object()
+
+        def get_parents(qcode):
+            with flask_app.app_context():
+                return self.mediatopics.get_parents(qcode, article_language)
+
+        futures = {
+            qcode: self.parent_executor.submit(get_parents, qcode)
+            for qcode in dict.fromkeys(qcodes)
+        }
+        done, _ = wait(futures.values(), timeout=self.parent_timeout)
+        parents = {}
+        for qcode, future in futures.items():
+            if future in done and future.exception() is None:
+                parents[qcode] = future.result()
+            else:
+                future.cancel()
+                logger.warning(f"Could not get parent info for {qcode}")
+        return parents
+
     # Analyze2 changed name to analyze_parent_info
     def analyze_parent_info(self, data: SearchData) -> ResponseType:
         try:
@@ -178,32 +374,40 @@ class Semaphore(AIServiceBase):
                 )
                 return {}
 
+            if self.breaker.is_open():
+                logger.warning("Semaphore is not available, can't search")
+                return {}
+
             query = data["searchString"]
 
             article_language = data.get("language")
 
+            # without changing the instance, it's used by concurrent requests
+            search_url = self.search_url
             if article_language == "fr-CA":
-                self.search_url = self.search_url.replace("/en/", "/fr/")
+                search_url = search_url.replace("/en/", "/fr/")
             elif article_language == "en-CA":
-                self.search_url = self.search_url.replace("/fr/", "/en/")
+                search_url = search_url.replace("/fr/", "/en/")
 
-            new_url = self.search_url + query + ".json"
+            new_url = search_url + query + ".json"
 
             # Make a POST request using XML payload
-            headers = {"Authorization": f"bearer {self.get_access_token()}"}
+            with stage("search", "token"):
+                headers = {"Authorization": f"bearer {self.get_access_token()}"}
 
             try:
-                response = session.get(new_url, headers=headers)
+                response = self.request("search", "GET", new_url, headers=headers)
 
                 response.raise_for_status()
             except Exception as e:
                 traceback.print_exc()
                 logger.error(f"An error occurred while making the request: {str(e)}")
+                return {}
 
             root = response.text
 
             # def transform_xml_response(xml_data):
-            def transform_xml_response(api_response, article_language):
+            def transform_xml_response(api_response, parents):
                 result = {
                     "subject": [],
                     "organisation": [],
@@ -250,10 +454,9 @@ class Semaphore(AIServiceBase):
                     elif "Place" in item["classes"]:
                         result["place"].append(entry)
                     else:
-                        # Fetch parent info for each subject item
-                        parent_info, reversed_parent_info = self.fetch_parent_info(
-                            item["id"], article_language
-                        )
+                        # Get parent info for each subject item
+                        parent_info = parents.get(item["id"], [])
+                        reversed_parent_info = parent_info[::-1]
 
                         # Assign the immediate parent to the subject item
                         if parent_info:
@@ -318,10 +521,29 @@ class Semaphore(AIServiceBase):
                     },
                 }
 
-            root = json.loads(root)
-            json_response = transform_xml_response(root, article_language)
+            with stage("search", "parse"):
+                root = json.loads(root)
 
-            json_response = convert_to_desired_format(json_response)
+            # Resolve parents of all subjects at once
+            with stage("search", "parents"):
+                try:
+                    self.mediatopics.refresh()
+                except Exception as e:
+                    logger.error(f"Could not refresh media topics index: {str(e)}")
+                subject_ids = [
+                    item["id"]
+                    for item in root["termHints"]
+                    if not any(
+                        cls in item["classes"]
+                        for cls in ("Organization", "People", "Event", "Place")
+                    )
+                ]
+                parents = self.get_parents_many(subject_ids, article_language)
+
+            with stage("search", "transform"):
+                json_response = transform_xml_response(root, parents)
+
+                json_response = convert_to_desired_format(json_response)
 
             return json_response
 
@@ -334,10 +556,11 @@ class Semaphore(AIServiceBase):
             return {}
 
     def create_tag_in_semaphore(self, data: FeedbackData) -> ResponseType:
-        result_summary: Dict[str, List[str]] = {
+        result_summary: Dict[str, Any] = {
             "created_tags": [],
             "failed_tags": [],
             "existing_tags": [],
+            "timings": {},
         }
         try:
             if not self.create_tag_url or not self.api_key:
@@ -359,58 +582,48 @@ class Semaphore(AIServiceBase):
 
             manual_tags = extract_manual_tags(data)
 
+            try:
+                self.seed_known_concepts()
+            except Exception as e:
+                logger.error(f"Could not load known concepts: {str(e)}")
+
+            # duplicates of a tag get the status of its request without timing
+            statuses: List[Tuple[str, Optional[str], Optional[Future], bool]] = []
+            futures: Dict[Tuple[str, str], Future] = {}
             for item in manual_tags:
                 concept_name = item["name"]
                 scheme = item["scheme"]
 
-                id_value = None
-                if scheme == "subject":
-                    id_value = "http://cv.cp.org/4916d989-2227-4f2d-8632-525cd462ab9f"
-                elif scheme == "organisation":
-                    id_value = "http://cv.cp.org/e2c332d3-05e0-4dcc-b358-9e4855e80e88"
-                elif scheme == "places":
-                    id_value = "http://cv.cp.org/c3b17bf6-7969-424d-92ae-966f4f707a95"
-                elif scheme == "person":
-                    id_value = "http://cv.cp.org/1630a532-329f-43fe-9606-b381330c35cf"
-                elif scheme == "event":
-                    id_value = "http://cv.cp.org/3c493189-023f-4d14-a2f4-fc7b79735ffc"
+                id_value = CONCEPT_SCHEMES.get(scheme)
 
                 if id_value is None:
                     print(f"Unsupported scheme: {scheme}")
-                    result_summary["failed_tags"].append(concept_name)
+                    statuses.append((concept_name, "failed", None, False))
                     continue
 
-                payload = json.dumps(
-                    {
-                        "@type": ["skos:Concept"],
-                        "rdfs:label": "ConceptNameForUriGeneration",
-                        "skos:topConceptOf": {"@id": id_value},
-                        "skosxl:prefLabel": [
-                            {
-                                "@type": ["skosxl:Label"],
-                                "skosxl:literalForm": [
-                                    {"@value": concept_name, "@language": "en"}
-                                ],
-                            }
-                        ],
-                    }
-                )
+                key = self.known_concepts.key(id_value, concept_name)
+                if key in futures:
+                    statuses.append((concept_name, None, futures[key], True))
+                    continue
 
-                try:
-                    response = session.post(new_url, headers=headers, data=payload)
+                if self.known_concepts.contains(id_value, concept_name):
+                    print(f"Tag already exists in KMM. The Tag is: {concept_name}")
+                    statuses.append((concept_name, "existing", None, False))
+                    continue
 
-                    if response.status_code == 409:
-                        print(
-                            f"Tag already exists in KMM. Response is 409. The Tag is: {concept_name}"
-                        )
-                        result_summary["existing_tags"].append(concept_name)
-                    else:
-                        response.raise_for_status()
-                        print(f"Tag Got Created is: {concept_name}")
-                        result_summary["created_tags"].append(concept_name)
-                except Exception as e:
-                    print(f"Failed to create tag: {concept_name}, Error: {e}")
-                    result_summary["failed_tags"].append(concept_name)
+                futures[key] = self.create_tag_executor.submit(
+                    self.create_concept, new_url, headers, concept_name, id_value
+                )
+                statuses.append((concept_name, None, futures[key], False))
+
+            for concept_name, status, future, duplicate in statuses:
+                duration = 0.0
+                if future is not None:
+                    status, duration = future.result()
+                    if duplicate:
+                        duration = 0.0
+                result_summary["{}_tags".format(status)].append(concept_name)
+                result_summary["timings"][concept_name] = round(duration, 3)
 
         except Exception as e:
             print(f"Semaphore Create Tag operation failed: {e}")
@@ -418,6 +631,58 @@ class Semaphore(AIServiceBase):
 
         return result_summary
 
+    def create_concept(self, url, headers, concept_name, id_value):
+        """Create concept in Semaphore.
+
+        Returns status (``created``, ``existing`` or ``failed``)
+        and request duration.
+        """
+        payload = json.dumps(
+            {
+                "@type": ["skos:Concept"],
+                "rdfs:label": "ConceptNameForUriGeneration",
+                "skos:topConceptOf": {"@id": id_value},
+                "skosxl:prefLabel": [
+                    {
+                        "@type": ["skosxl:Label"],
+                        "skosxl:literalForm": [
+                            {"@value": concept_name, "@language": "en"}
+                        ],
+                    }
+                ],
+            }
+        )
+
+        started = time.monotonic()
+        try:
+            response = self.request(
+                "create", "POST", url, headers=headers, data=payload
+            )
+
+            if response.status_code == 409:
+                print(
+                    f"Tag already exists in KMM. Response is 409. The Tag is: {concept_name}"
+                )
+                status = "existing"
+            else:
+                response.raise_for_status()
+                print(f"Tag Got Created is: {concept_name}")
+                status = "created"
+            self.known_concepts.add(id_value, concept_name)
+        except Exception as e:
+            print(f"Failed to create tag: {concept_name}, Error: {e}")
+            status = "failed"
+        return status, time.monotonic() - started
+
+    def seed_known_concepts(self):
+        """Add subject_custom vocabulary names to known concepts."""
+        self.mediatopics.refresh()
+        self.known_concepts.seed(
+            CONCEPT_SCHEMES["subject"],
+            [item["name"] for item in self.mediatopics.by_qcode.values()],
+            self.mediatopics.version,
+        )
+
     @overload
     def data_operation(  # noqa: E704
         self,
@@ -453,7 +718,8 @@ class Semaphore(AIServiceBase):
         try:
             self.output = self.analyze_parent_info(data)
             try:
-                updated_output = replace_qcodes(self.output)
+                with stage("search", "replace_qcodes"):
+                    updated_output = replace_qcodes(self.output)
                 return updated_output
             except Exception as e:
                 print(
@@ -485,85 +751,6 @@ class Semaphore(AIServiceBase):
             media_topic_guids = {}
             processed_values = set()
 
-            # Function to assign parents to the subjects
-            def assign_parents(response_dict, media_topic_labels, media_topic_guids):
-                label_to_guid_map = {}
-
-                # Map each label path to its corresponding GUID path
-                for guid_path in media_topic_guids.keys():
-                    guid_parts = guid_path.split("/")
-                    for label_path in media_topic_labels.keys():
-                        label_parts = label_path.split("/")
-                        if len(guid_parts) == len(label_parts):
-                            last_guid_part = guid_parts[-1]
-                            last_label_part = label_parts[-1]
-                            if any(
-                                subject["qcode"] == last_guid_part
-                                and subject["name"] == last_label_part
-                                for subject in response_dict["subject"]
-                            ):
-                                label_to_guid_map[label_path] = guid_path
-                                break
-
-                # Track the maximum relevance score for each parent tag
-                max_relevance = {}
-
-                # Iterate over the mapped label and GUID paths
-                for label_path, guid_path in label_to_guid_map.items():
-                    label_parts = label_path.split("/")
-                    guid_parts = guid_path.split("/")
-                    for i in range(len(label_parts)):
-                        name = label_parts[i]
-                        qcode = guid_parts[i]
-                        parent_qcode = guid_parts[i - 1] if i > 0 else None
-                        relevance = format_relevance(media_topic_labels[label_path])
-
-                        if (
-                            qcode not in max_relevance
-                            or max_relevance[qcode] < relevance
-                        ):
-                            max_relevance[qcode] = relevance
-
-                        if not any(
-                            subject["qcode"] == qcode
-                            for subject in response_dict["subject"]
-                        ):
-                            subject_data = {
-                                "name": name,
-                                "qcode": qcode,
-                                "parent": parent_qcode if parent_qcode else None,
-                                "source": "Semaphore",
-                                "creator": "Machine",
-                                "relevance": relevance,
-                                "altids": {"source_name": "source_id"},
-                                "original_source": "original_source_value",
-                                "scheme": "http://cv.iptc.org/newscodes/mediatopic/",
-                            }
-                            add_to_dict("subject", subject_data)
-                        else:
-                            for subject in response_dict["subject"]:
-                                if subject["qcode"] == qcode:
-                                    subject["parent"] = parent_qcode
-                                    break
-
-                # Propagate the highest relevance score upwards
-                for label_path, guid_path in label_to_guid_map.items():
-                    guid_parts = guid_path.split("/")
-                    for i in range(len(guid_parts) - 1, 0, -1):
-                        child_qcode = guid_parts[i]
-                        parent_qcode = guid_parts[i - 1]
-                        child_relevance = max_relevance[child_qcode]
-                        if parent_qcode in max_relevance:
-                            if max_relevance[parent_qcode] < child_relevance:
-                                max_relevance[parent_qcode] = child_relevance
-                        else:
-                            max_relevance[parent_qcode] = child_relevance
-
-                # Update relevance scores in response_dict
-                for subject in response_dict["subject"]:
-                    if subject["qcode"] in max_relevance:
-                        subject["relevance"] = max_relevance[subject["qcode"]]
-
             # Helper function to add data to the dictionary
             def add_to_dict(group, tag_data):
                 if tag_data["qcode"] and tag_data not in response_dict[group]:
@@ -594,13 +781,7 @@ class Semaphore(AIServiceBase):
                             add_to_dict(tag.lower(), tag_data)
                         break
 
-            root = ET.fromstring(xml_data)
-            article_elements = root.find("STRUCTUREDDOCUMENT/ARTICLE")
-            system_elements = article_elements.findall("SYSTEM")
-            for system_element in system_elements:
-                article_elements.remove(system_element)
-
-            for elem in article_elements:
+            for elem in iter_article_elements(xml_data):
                 name = elem.get("name")
                 value = elem.get("value")
                 score = elem.get("score", 0)
@@ -650,25 +831,47 @@ class Semaphore(AIServiceBase):
                 )
                 return {}
 
-            xml_payload = self.html_to_xml(item)
+            cached = self.result_cache.get(item)
+            if cached is not None:
+                return cached
+
+            if preclassify.is_enabled():
+                stored = preclassify.get_stored_tags(item)
+                if stored is not None:
+                    self.result_cache.set(item, stored)
+                    return stored
+
+            if self.breaker.is_open():
+                logger.warning("Semaphore is not available, can't analyze content")
+                return {}
+
+            with stage("analyze", "payload"):
+                xml_payload = self.html_to_xml(item)
             payload = {"XML_INPUT": xml_payload}
 
-            headers = {"Authorization": f"bearer {self.get_access_token()}"}
+            with stage("analyze", "token"):
+                headers = {"Authorization": f"bearer {self.get_access_token()}"}
 
             try:
-                response = session.post(self.analyze_url, headers=headers, data=payload)
+                response = self.post_form("analyze", self.analyze_url, headers, payload)
                 response.raise_for_status()
             except Exception as e:
                 traceback.print_exc()
                 logger.error(f"An error occurred while making the request: {str(e)}")
+                return {}
 
-            root = response.text
-            json_response = transform_xml_response(root)
+            root = response.content
+            with stage("analyze", "transform"):
+                json_response = transform_xml_response(root)
 
-            json_response = capitalize_name_if_parent_none_for_analyze(json_response)
+                json_response = capitalize_name_if_parent_none_for_analyze(
+                    json_response
+                )
 
             try:
-                updated_output = replace_qcodes(json_response)
+                with stage("analyze", "replace_qcodes"):
+                    updated_output = replace_qcodes(json_response)
+                self.result_cache.set(item, updated_output)
 
                 return updated_output
 
@@ -689,59 +892,202 @@ class Semaphore(AIServiceBase):
             logger.error(f"An error occurred. We are in analyze exception: {str(e)}")
             return {}
 
+    def analyze_many(
+        self, items: Iterable[Item], concurrency: Optional[int] = None
+    ) -> Iterator[Tuple[str, ResponseType]]:
+        """Analyze multiple items concurrently.
+
+        Yields ``(guid, tags)`` pairs in order of completion, tags are
+        the same as returned by :meth:`analyze`, empty on item failure.
+
+        :param items: items to analyze
+        :param concurrency: max requests in progress,
+                            ``SEMAPHORE_BATCH_CONCURRENCY`` by default
+        """
+        concurrency = concurrency or self.batch_concurrency
+        flask_app = app._get_current_object()
+
+        def analyze(item):
+            with flask_app.app_context():
+                return self.analyze(item)
+
+        with ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="semaphore-batch"
+        ) as executor:
+            pending = {}
+            items_iter = iter(items)
+            while True:
+                # keep limited number of items in the queue
+                for item in items_iter:
+                    pending[executor.submit(analyze, item)] = item["guid"]
+                    if len(pending) >= concurrency * 2:
+                        break
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    guid = pending.pop(future)
+                    try:
+                        yield guid, future.result()
+                    except Exception as e:
+                        logger.error(f"Failed to analyze item {guid}: {str(e)}")
+                        yield guid, {}
+
     def html_to_xml(self, html_content: Item) -> str:
-        def clean_html_content(input_str):
-            # Remove full HTML tags using regular expressions
-            your_string = input_str.replace("<p>", "")
-            your_string = your_string.replace("</p>", "")
-            your_string = your_string.replace("<br>", "")
-            your_string = your_string.replace("&nbsp;", "")
-            your_string = your_string.replace("&amp;", "")
-            your_string = your_string.replace("&lt;&gt;", "")
-
-            return your_string
-
-        xml_template = """<?xml version="1.0" ?>
-                <request op="CLASSIFY">
-                <document>
-                    <body>&lt;?xml version=&quot;1.0&quot; encoding=&quot;UTF-8&quot;?&gt;
-                &lt;story&gt;
-                    &lt;headline&gt;{}&lt;/headline&gt;
-                    &lt;headline_extended&gt;{}&lt;/headline_extended&gt;
-                    &lt;body_html&gt;{}&lt;/body_html&gt;
-                    &lt;slugline&gt;{}&lt;/slugline&gt;
-                    &lt;guid&gt;{}&lt;/guid&gt;
-                    &lt;env&gt;{}&lt;/env&gt;
-                    &lt;dateTime&gt;{}&lt;/dateTime&gt;
-                &lt;/story&gt;
-                </body>
-                </document>
-                </request>
-                """
-
-        body_html = html_content["body_html"]
-        headline = html_content["headline"]
-        headline_extended = (
-            html_content["abstract"] if "abstract" in html_content else ""
+        return build_classify_xml(
+            html_content, self.api_key[-4:], self.body_token_budget
         )
-        slugline = html_content["slugline"]
-        guid = html_content["guid"]
-        env = self.api_key[-4:]
-        dateTime = datetime.datetime.now().isoformat()
-
-        # Embed the 'body_html' into the XML template
-        xml_output = xml_template.format(
-            headline,
-            headline_extended,
-            body_html,
-            slugline,
-            guid,
-            env,
-            dateTime,
+
+    def post_form(self, operation, url, headers, data):
+        """Post form data, gzipped if enabled.
+
+        When Semaphore rejects gzipped request it's sent again uncompressed.
+        """
+        if self.gzip_requests:
+            body, form_headers = encode_form(data, compress=True)
+            response = self.request(
+                operation, "POST", url, headers={**headers, **form_headers}, data=body
+            )
+            if not is_encoding_rejected(response):
+                return response
+            logger.warning("Semaphore didn't accept gzipped request, sending it again")
+        return self.request(operation, "POST", url, headers=headers, data=data)
+
+
+def is_encoding_rejected(response: requests.Response) -> bool:
+    if response.status_code == 415:
+        return True
+    if response.status_code == 400:
+        text = response.text.lower()
+        return "encoding" in text or "gzip" in text
+    return False
+
+
+def iter_article_elements(xml_data: bytes):
+    """Iterate over CLASSIFY response article elements while parsing.
+
+    ``SYSTEM`` elements are skipped and each element is cleared once
+    consumed, so memory use doesn't grow with the response size.
+    """
+    path: List[str] = []
+    article_found = False
+    context = etree.iterparse(
+        io.BytesIO(xml_data), events=("start", "end"), resolve_entities=False
+    )
+    for event, elem in context:
+        if event == "start":
+            path.append(elem.tag)
+            if len(path) == 3 and path[1:] == ["STRUCTUREDDOCUMENT", "ARTICLE"]:
+                if article_found:
+                    break  # only first article is used
+                article_found = True
+            continue
+        path.pop()
+        if len(path) == 3 and path[1:] == ["STRUCTUREDDOCUMENT", "ARTICLE"]:
+            if elem.tag != "SYSTEM":
+                yield elem
+            elem.clear()
+            # drop processed siblings
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+    if not article_found:
+        raise ValueError("Missing article in Semaphore response")
+
+
+def assign_parents(response_dict, media_topic_labels, media_topic_guids):
+    """Assign parents to the subjects using Media Topic paths.
+
+    Add missing ancestors to subjects and propagate the highest relevance
+    score upwards.
+
+    :param response_dict: tags by type
+    :param media_topic_labels: score by label path, eg. ``health/medication``
+    :param media_topic_guids: score by guid path, eg. ``id1/id2``
+    """
+    subjects = response_dict["subject"]
+
+    # Index label paths by depth and last label, keeping their order
+    labels_index: Dict[Tuple[int, str], List[Tuple[int, str]]] = {}
+    for index, label_path in enumerate(media_topic_labels):
+        label_parts = label_path.split("/")
+        labels_index.setdefault((len(label_parts), label_parts[-1]), []).append(
+            (index, label_path)
         )
-        xml_output = clean_html_content(xml_output)
 
-        return xml_output
+    subject_names: Dict[str, List[str]] = {}
+    for subject in subjects:
+        subject_names.setdefault(subject["qcode"], []).append(subject["name"])
+
+    # Map each label path to its corresponding GUID path,
+    # using first label path with same depth matching a subject
+    label_to_guid_map = {}
+    for guid_path in media_topic_guids:
+        guid_parts = guid_path.split("/")
+        candidates = [
+            labels_index[(len(guid_parts), name)][0]
+            for name in subject_names.get(guid_parts[-1], [])
+            if (len(guid_parts), name) in labels_index
+        ]
+        if candidates:
+            label_to_guid_map[min(candidates)[1]] = guid_path
+
+    # First subject for each qcode
+    subjects_by_qcode = {}
+    for subject in subjects:
+        subjects_by_qcode.setdefault(subject["qcode"], subject)
+
+    # Track the maximum relevance score for each parent tag
+    max_relevance: Dict[str, int] = {}
+
+    # Iterate over the mapped label and GUID paths
+    for label_path, guid_path in label_to_guid_map.items():
+        label_parts = label_path.split("/")
+        guid_parts = guid_path.split("/")
+        relevance = format_relevance(media_topic_labels[label_path])
+        for i in range(len(label_parts)):
+            name = label_parts[i]
+            qcode = guid_parts[i]
+            parent_qcode = guid_parts[i - 1] if i > 0 else None
+
+            if qcode not in max_relevance or max_relevance[qcode] < relevance:
+                max_relevance[qcode] = relevance
+
+            if qcode not in subjects_by_qcode:
+                if not qcode:
+                    continue
+                subject_data = {
+                    "name": name,
+                    "qcode": qcode,
+                    "parent": parent_qcode if parent_qcode else None,
+                    "source": "Semaphore",
+                    "creator": "Machine",
+                    "relevance": relevance,
+                    "altids": {"source_name": "source_id"},
+                    "original_source": "original_source_value",
+                    "scheme": "http://cv.iptc.org/newscodes/mediatopic/",
+                }
+                subjects.append(subject_data)
+                subjects_by_qcode[qcode] = subject_data
+            else:
+                subjects_by_qcode[qcode]["parent"] = parent_qcode
+
+    # Propagate the highest relevance score upwards
+    for guid_path in label_to_guid_map.values():
+        guid_parts = guid_path.split("/")
+        for i in range(len(guid_parts) - 1, 0, -1):
+            child_qcode = guid_parts[i]
+            parent_qcode = guid_parts[i - 1]
+            child_relevance = max_relevance[child_qcode]
+            if parent_qcode in max_relevance:
+                if max_relevance[parent_qcode] < child_relevance:
+                    max_relevance[parent_qcode] = child_relevance
+            else:
+                max_relevance[parent_qcode] = child_relevance
+
+    # Update relevance scores in response_dict
+    for subject in subjects:
+        if subject["qcode"] in max_relevance:
+            subject["relevance"] = max_relevance[subject["qcode"]]
 
 
 def extract_manual_tags(data):
@@ -775,12 +1121,9 @@ def capitalize_name_if_parent_none_for_analyze(response):
 
 
 def replace_qcodes(output_data):
-    cv = superdesk.get_resource_service("vocabularies").find_one(
-        req=None, _id="subject_custom"
-    )
-
-    # Create a mapping from semaphore_id to qcode
-    semaphore_to_qcode = {item["semaphore_id"]: item["qcode"] for item in cv["items"]}
+    # Mapping from semaphore_id to qcode, rebuilt only when vocabulary changes
+    subjects.refresh()
+    semaphore_to_qcode = subjects.semaphore_to_qcode
 
     # Define a function to replace qcodes in a given list
     def replace_in_list(data_list):
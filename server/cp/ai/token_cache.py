@@ -0,0 +1,147 @@
+import time
+import logging
+import threading
+
+from typing import Any, Callable, Dict, Optional, Tuple
+from flask import current_app as app
+from superdesk.cache import cache
+
+
+logger = logging.getLogger(__name__)
+
+# used when token endpoint doesn't send expires_in
+DEFAULT_EXPIRES_IN = 300
+
+# refresh token in background when it expires in less than this (seconds)
+REFRESH_MARGIN = 60
+
+CACHE_KEY = "cp:ai:token:{}"
+LOCK_KEY = "cp:ai:token-refresh:{}"
+
+Token = Dict[str, Any]
+FetchToken = Callable[[], Tuple[str, int]]
+
+
+class TokenCache:
+    """Expiry aware OAuth token cache.
+
+    Token is kept in process memory and in superdesk cache backend
+    which is using redis when configured, so all gunicorn and celery
+    workers share a single token.
+
+    When token is about to expire it gets refreshed in background thread
+    while the current token is still returned. Only when there is no valid
+    token the caller has to wait for the token endpoint.
+
+    :param fetch: callable returning ``(access_token, expires_in)`` tuple
+    :param name: unique cache name for the service credentials
+    :param refresh_margin: seconds before expiry when to start refresh
+    """
+
+    def __init__(self, fetch: FetchToken, name: str, refresh_margin=REFRESH_MARGIN):
+        self.fetch = fetch
+        self.key = CACHE_KEY.format(name)
+        self.lock_key = LOCK_KEY.format(name)
+        self.refresh_margin = refresh_margin
+        self._token: Optional[Token] = None
+        self._lock = threading.Lock()
+        self._refreshing = threading.Event()
+
+    def get(self) -> str:
+        now = time.time()
+        token = self._token
+        if not self._is_valid(token, now):
+            token = self._load()
+        if token is None or not self._is_valid(token, now):
+            token = self._refresh()
+        elif self._expires_soon(token, now):
+            # other worker might have refreshed it already
+            shared = self._load()
+            if (
+                shared is not None
+                and self._is_valid(shared, now)
+                and not self._expires_soon(shared, now)
+            ):
+                token = shared
+            else:
+                self._refresh_in_background()
+        return token["access_token"]
+
+    def invalidate(self) -> None:
+        """Drop token, ie. when it was rejected by the service."""
+        self._token = None
+        try:
+            cache.backend.remove(self.key)
+        except Exception as e:
+            logger.warning("Could not remove token from cache: %s", e)
+
+    def _is_valid(self, token: Optional[Token], now: float) -> bool:
+        return bool(token and token.get("access_token") and token["expires_at"] > now)
+
+    def _expires_soon(self, token: Token, now: float) -> bool:
+        return token["expires_at"] - self.refresh_margin <= now
+
+    def _load(self) -> Optional[Token]:
+        try:
+            token = cache.backend.load(self.key)
+        except Exception as e:
+            logger.warning("Could not load token from cache: %s", e)
+            return None
+        if token:
+            self._token = token
+        return token
+
+    def _save(self, token: Token) -> None:
+        self._token = token
+        ttl = int(token["expires_at"] - time.time())
+        if ttl <= 0:
+            return
+        try:
+            cache.backend.save({self.key: token}, ttl=ttl)
+        except Exception as e:
+            logger.warning("Could not save token to cache: %s", e)
+
+    def _fetch(self) -> Token:
+        started = time.time()
+        access_token, expires_in = self.fetch()
+        token = {
+            "access_token": access_token,
+            "expires_at": started + (expires_in or DEFAULT_EXPIRES_IN),
+        }
+        self._save(token)
+        return token
+
+    def _refresh(self) -> Token:
+        with self._lock:
+            # another thread could get new token meanwhile
+            token = self._token
+            if token is not None and self._is_valid(token, time.time()):
+                return token
+            return self._fetch()
+
+    def _refresh_in_background(self) -> None:
+        if self._refreshing.is_set():
+            return
+        self._refreshing.set()
+        thread = threading.Thread(
+            target=self._background_refresh,
+            args=(app._get_current_object(),),
+            daemon=True,
+        )
+        thread.start()
+
+    def _background_refresh(self, flask_app) -> None:
+        try:
+            with flask_app.app_context():
+                lock = cache.backend.lock(self.lock_key)
+                if not lock.acquire(wait=False):
+                    return  # other worker is refreshing, it will be loaded from cache
+                try:
+                    with self._lock:
+                        self._fetch()
+                finally:
+                    lock.release()
+        except Exception:
+            logger.exception("Background token refresh failed")
+        finally:
+            self._refreshing.clear()
@@ -0,0 +1,145 @@
+import time
+import threading
+import superdesk
+
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+
+SUBJECT_CV = "subject_custom"
+
+# how often to check if vocabulary was updated by other process (seconds)
+CHECK_INTERVAL = 60
+
+T = TypeVar("T")
+
+
+class CachedVocabulary:
+    """Process-wide copy of a vocabulary.
+
+    Loaded lazily and rebuilt only when its ``_etag`` changes. Updates done
+    in this process invalidate it via vocabularies hooks, updates done
+    elsewhere are noticed within ``check_interval``.
+
+    Indexes built from its items using :meth:`get_derived` are kept
+    until the vocabulary changes.
+    """
+
+    def __init__(self, cv_id: str, check_interval=CHECK_INTERVAL):
+        self.cv_id = cv_id
+        self.check_interval = check_interval
+        self.version = None
+        self.found = False
+        self.items: List[Dict] = []
+        self.checked_at: Optional[float] = None
+        self._derived: Dict[Any, Any] = {}
+        self._lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        """Force rebuild on next use."""
+        self.checked_at = None
+        self.version = None
+
+    def refresh(self) -> None:
+        """Rebuild the index if vocabulary was updated."""
+        now = time.monotonic()
+        if self.checked_at is not None and now - self.checked_at < self.check_interval:
+            return
+        cv = superdesk.get_resource_service("vocabularies").find_one(
+            req=None, _id=self.cv_id
+        )
+        self.checked_at = now
+        self.found = bool(cv)
+        if not cv:
+            return
+        version = cv.get("_etag")
+        if version is not None and version == self.version:
+            return
+        self.build(cv.get("items") or [], version)
+
+    def build(self, items: List[Dict], version=None) -> None:
+        with self._lock:
+            self.items = items
+            self.version = version
+            self._derived = {}
+
+    def get_derived(self, factory: Callable[[List[Dict]], T]) -> T:
+        """Get ``factory(items)`` for current vocabulary version."""
+        self.refresh()
+        with self._lock:
+            derived = self._derived
+            items = self.items
+        if factory not in derived:
+            derived[factory] = factory(items)
+        return derived[factory]
+
+
+class SubjectIndex(CachedVocabulary):
+    """Process-wide index of ``subject_custom`` vocabulary."""
+
+    def __init__(self, check_interval=CHECK_INTERVAL):
+        super().__init__(SUBJECT_CV, check_interval)
+        self.by_qcode: Dict[str, Dict] = {}
+        self.by_semaphore_id: Dict[str, Dict] = {}
+        self.semaphore_to_qcode: Dict[str, str] = {}
+
+    def build(self, items: List[Dict], version=None) -> None:
+        by_qcode = {item["qcode"]: item for item in items if item.get("qcode")}
+        by_semaphore_id = {
+            item["semaphore_id"]: item
+            for item in by_qcode.values()
+            if item.get("semaphore_id")
+        }
+        semaphore_to_qcode = {
+            semaphore_id: item["qcode"]
+            for semaphore_id, item in by_semaphore_id.items()
+        }
+        with self._lock:
+            self.by_qcode = by_qcode
+            self.by_semaphore_id = by_semaphore_id
+            self.semaphore_to_qcode = semaphore_to_qcode
+        super().build(items, version)
+
+    def get_qcode(self, semaphore_id: str) -> Optional[str]:
+        return self.semaphore_to_qcode.get(semaphore_id)
+
+    def get_item(self, qcode: str) -> Optional[Dict]:
+        return self.by_qcode.get(qcode)
+
+
+subjects = SubjectIndex()
+
+vocabularies: Dict[str, CachedVocabulary] = {SUBJECT_CV: subjects}
+vocabularies_lock = threading.Lock()
+
+
+def get_vocabulary(cv_id: str) -> CachedVocabulary:
+    """Get process-wide cached vocabulary."""
+    with vocabularies_lock:
+        if cv_id not in vocabularies:
+            vocabularies[cv_id] = CachedVocabulary(
+                cv_id, check_interval=subjects.check_interval
+            )
+        return vocabularies[cv_id]
+
+
+def invalidate_all() -> None:
+    with vocabularies_lock:
+        for cached in vocabularies.values():
+            cached.invalidate()
+
+
+def on_vocabulary_updated(updates, original) -> None:
+    cached = vocabularies.get(original.get("_id"))
+    if cached is not None:
+        cached.invalidate()
+
+
+def init_app(app) -> None:
+    check_interval = app.config.get(
+        "SEMAPHORE_VOCABULARY_CHECK_INTERVAL", CHECK_INTERVAL
+    )
+    with vocabularies_lock:
+        for cached in vocabularies.values():
+            cached.check_interval = check_interval
+    app.on_updated_vocabularies += on_vocabulary_updated
+    app.on_replaced_vocabularies += on_vocabulary_updated
@@ -2,8 +2,12 @@ import superdesk
 from .update_event_types import UpdateEventTypesCommand
 from .fix_events_moment_timezone_2023 import FixEventsCommand
 from .delete_events import DeleteEvents
+from .replay_ap_capture import ReplayAPCaptureCommand
+from .index_picture_containers import IndexPictureContainersCommand
 
 
 superdesk.command("cp:update_event_types", UpdateEventTypesCommand())
 superdesk.command("cp:fix_event_dates_2023", FixEventsCommand())
 superdesk.command("cp:delete_events", DeleteEvents())
+superdesk.command("cp:replay_ap_capture", ReplayAPCaptureCommand())
+superdesk.command("cp:index_picture_containers", IndexPictureContainersCommand())
@@ -0,0 +1,22 @@
+from superdesk import Command, Option
+
+from cp.picture_containers import index_stories
+
+
+class IndexPictureContainersCommand(Command):
+    """Index stories referencing pictures.
+
+    Stories are indexed when saved or published, use it to index
+    all existing stories again.
+
+    Usage:
+
+    honcho run python manage.py cp:index_picture_containers
+    """
+
+    option_list = [
+        Option("--page-size", "-p", dest="page_size", type=int, default=500),
+    ]
+
+    def run(self, page_size=500):
+        print("indexed", index_stories(page_size))
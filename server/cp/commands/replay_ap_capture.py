@@ -0,0 +1,115 @@
+import time
+import logging
+import itertools
+import superdesk
+
+from cp.ingest import capture, CP_APMediaFeedParser
+from cp.ingest.parser import ap
+from cp.output.formatter.jimi import JimiFormatter
+
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("prefetch", "parse", "format")
+
+
+class ReplayJimiFormatter(JimiFormatter):
+    """Use local sequence numbers, subscriber sequences are not touched."""
+
+    def __init__(self):
+        super().__init__()
+        self.sequence = itertools.count(1)
+
+    def get_sequence_numbers(self, subscriber, count):
+        return [next(self.sequence) for _ in range(count)]
+
+
+class ReplayAPCaptureCommand(superdesk.Command):
+    """Replay captured AP payloads through parser and JIMI formatter.
+
+    Payloads are processed in pages like when ingesting and throughput
+    is reported together with time spent in every stage. Parsed items get
+    ids like when stored in ingest, nothing is saved.
+
+    Command Examples:
+        $ python manage.py cp:replay_ap_capture --path /tmp/ap
+        $ python manage.py cp:replay_ap_capture --path /tmp/ap/segment.jsonl.gz --limit 1000
+    """
+
+    option_list = [
+        superdesk.Option(
+            "--path",
+            "-p",
+            dest="path",
+            required=True,
+            help="Capture directory or segment",
+        ),
+        superdesk.Option(
+            "--limit", "-l", dest="limit", type=int, default=0, help="Max items"
+        ),
+        superdesk.Option(
+            "--page-size", dest="page_size", type=int, default=10, help="Feed page size"
+        ),
+    ]
+
+    def run(self, path, limit=0, page_size=10):
+        stats = self.replay(path, limit, page_size)
+        items = stats["items"]
+        print(
+            "{} items, {} errors in {:.1f}s, {:.1f} items/s".format(
+                items,
+                stats["errors"],
+                stats["elapsed"],
+                items / stats["elapsed"] if stats["elapsed"] else 0,
+            )
+        )
+        for stage in STAGES:
+            timing = stats["timings"][stage]
+            print(
+                "{}: {:.1f}s, {:.2f}ms/item".format(
+                    stage, timing, timing / items * 1000 if items else 0
+                )
+            )
+
+    def replay(self, path, limit=0, page_size=10):
+        """Replay capture and get number of items, errors and timings."""
+        parser = CP_APMediaFeedParser()
+        formatter = ReplayJimiFormatter()
+        subscriber = {"_id": "ap-replay"}
+        provider = {"_id": "ap-replay", "name": "AP replay"}
+        timings = {stage: 0.0 for stage in STAGES}
+        items = errors = 0
+        payloads = capture.read_capture(path)
+        if limit:
+            payloads = itertools.islice(payloads, limit)
+        started = time.perf_counter()
+        with capture.recorder.paused():
+            while True:
+                page = list(itertools.islice(payloads, page_size))
+                if not page:
+                    break
+                stage_started = time.perf_counter()
+                with ap.prefetch(payload["data"]["item"] for payload in page):
+                    timings["prefetch"] += time.perf_counter() - stage_started
+                    for payload in page:
+                        items += 1
+                        try:
+                            stage_started = time.perf_counter()
+                            item = parser.parse(payload, provider)
+                            timings["parse"] += time.perf_counter() - stage_started
+                            # set by ingest when storing item
+                            item.setdefault("_id", item["guid"])
+                            item.setdefault("family_id", item["_id"])
+                            item.setdefault("unique_id", items)
+                            stage_started = time.perf_counter()
+                            formatter.format(item, subscriber)
+                            timings["format"] += time.perf_counter() - stage_started
+                        except Exception:
+                            errors += 1
+                            logger.exception("Could not replay AP item")
+        return {
+            "items": items,
+            "errors": errors,
+            "elapsed": time.perf_counter() - started,
+            "timings": timings,
+        }
@@ -1,10 +1,16 @@
-from superdesk.io.registry import registered_feed_parsers, register_feed_parser
+from superdesk.io.registry import (
+    registered_feed_parsers,
+    register_feed_parser,
+    registered_feeding_services,
+)
 
 from .parser.ap import CP_APMediaFeedParser
 from .parser.businesswire import BusinessWireParser
 from .parser.globenewswire import GlobeNewswireParser
 from .parser.cp_onclusive import CPOnclusiveFeedParser
 from .parser.cp_transcripts import CPTranscriptsFeedParser
+from .feeding_services.ap_media import CP_APMediaFeedingService
+from . import capture
 
 
 def init_app(app):
@@ -15,6 +21,11 @@ def init_app(app):
 
     # override core parsers
     registered_feed_parsers[CP_APMediaFeedParser.NAME] = CP_APMediaFeedParser()
+    registered_feeding_services[CP_APMediaFeedingService.NAME] = (
+        CP_APMediaFeedingService
+    )
 
     # override planning parser
     registered_feed_parsers[CPOnclusiveFeedParser.NAME] = CPOnclusiveFeedParser()
+
+    capture.init_app(app)
@@ -0,0 +1,198 @@
+"""Capture AP ingest payloads for replay.
+
+Payloads are queued and written by a background thread to gzipped JSON
+lines segments in ``AP_INGEST_CAPTURE_PATH``. A new segment is started
+when the current one reaches ``AP_INGEST_CAPTURE_SEGMENT_SIZE`` bytes.
+Ingest is never blocked by capture, payloads are dropped when the queue
+is full and capture is disabled when the path can't be created.
+
+Captured payloads can be replayed using ``cp:replay_ap_capture`` command.
+"""
+
+import os
+import glob
+import gzip
+import json
+import queue
+import atexit
+import logging
+import threading
+
+from typing import Dict, IO, Iterator, Optional
+from contextlib import contextmanager
+from superdesk.utc import utcnow
+
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SIZE = 64 * 1024 * 1024
+QUEUE_SIZE = 1000
+SUFFIX = ".jsonl.gz"
+
+# flush segment when there is nothing to write for that long (seconds)
+FLUSH_INTERVAL = 5
+
+STOP = object()
+
+
+class Segment:
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "wb")
+        self.gzip = gzip.GzipFile(fileobj=self.file, mode="wb")
+
+    @property
+    def size(self) -> int:
+        return self.file.tell()
+
+    def write(self, line: str) -> None:
+        self.gzip.write(line.encode("utf-8"))
+
+    def flush(self) -> None:
+        self.gzip.flush()
+        self.file.flush()
+
+    def close(self) -> None:
+        self.gzip.close()
+        self.file.close()
+
+
+class Recorder:
+    """Write payloads to rotating segments in background thread.
+
+    Writer thread is started with first payload, so it's running
+    in the process which is ingesting.
+    """
+
+    def __init__(self, path="", segment_size=SEGMENT_SIZE, queue_size=QUEUE_SIZE):
+        self.path = path
+        self.segment_size = segment_size
+        self.dropped = 0
+        self.segments = 0
+        self.disabled = False
+        self._queue: queue.Queue = queue.Queue(queue_size)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def record(self, payload: Dict) -> None:
+        if not self.path or self.disabled or getattr(self._local, "paused", False):
+            return
+        # serialize now, payload is modified while parsing
+        try:
+            line = json.dumps(payload, default=str) + "\n"
+        except (TypeError, ValueError):
+            logger.exception("Could not serialize AP payload for capture")
+            return
+        self._start()
+        try:
+            self._queue.put_nowait(line)
+        except queue.Full:
+            self.dropped += 1
+            logger.warning("AP capture queue is full, payload dropped")
+
+    @contextmanager
+    def paused(self):
+        """Don't record payloads in current thread."""
+        previous = getattr(self._local, "paused", False)
+        self._local.paused = True
+        try:
+            yield
+        finally:
+            self._local.paused = previous
+
+    def close(self, timeout=FLUSH_INTERVAL) -> None:
+        """Write queued payloads and stop writer thread."""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is None:
+            return
+        self._queue.put(STOP)
+        thread.join(timeout)
+
+    def _start(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="ap-capture", daemon=True
+            )
+            self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self) -> None:
+        try:
+            os.makedirs(self.path, exist_ok=True)
+        except OSError:
+            logger.exception("Could not create AP capture path, capture disabled")
+            self.disabled = True
+            return
+        segment = None
+        while True:
+            try:
+                line = self._queue.get(timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                if segment is not None:
+                    segment.flush()
+                continue
+            if line is STOP:
+                break
+            try:
+                if segment is None or segment.size >= self.segment_size:
+                    if segment is not None:
+                        segment.close()
+                    segment = self._open_segment()
+                segment.write(line)
+            except OSError:
+                logger.exception("Could not write AP capture")
+                if segment is not None:
+                    try:
+                        segment.close()
+                    except OSError:
+                        pass
+                segment = None
+        if segment is not None:
+            segment.close()
+
+    def _open_segment(self) -> Segment:
+        self.segments += 1
+        filename = "ap-{}-{}-{}{}".format(
+            utcnow().strftime("%Y%m%d%H%M%S"), os.getpid(), self.segments, SUFFIX
+        )
+        return Segment(os.path.join(self.path, filename))
+
+
+recorder = Recorder()
+
+
+def get_segments(path: str):
+    """Get capture segments in path, oldest first."""
+    if not os.path.isdir(path):
+        return [path]
+    return sorted(glob.glob(os.path.join(path, "*" + SUFFIX)), key=os.path.getmtime)
+
+
+def read_segment(segment: IO) -> Iterator[Dict]:
+    try:
+        for line in segment:
+            if line.strip():
+                yield json.loads(line)
+    except (EOFError, ValueError):  # segment still being written
+        pass
+
+
+def read_capture(path: str) -> Iterator[Dict]:
+    """Read payloads from capture segment or directory."""
+    for filename in get_segments(path):
+        with gzip.open(filename, "rt", encoding="utf-8") as segment:
+            yield from read_segment(segment)
+
+
+def init_app(app) -> None:
+    recorder.path = app.config.get("AP_INGEST_CAPTURE_PATH") or ""
+    recorder.segment_size = app.config.get(
+        "AP_INGEST_CAPTURE_SEGMENT_SIZE", SEGMENT_SIZE
+    )
@@ -0,0 +1,40 @@
+from typing import Optional
+from contextlib import ExitStack
+from superdesk.io.feeding_services.ap_media import APMediaFeedingService
+
+from cp.ingest.parser import ap
+
+
+class CP_APMediaFeedingService(APMediaFeedingService):
+    """AP Media feeding service looking up prior items per feed page.
+
+    Items on a feed page are parsed one by one, each looking up previous
+    ingest and archive items. Those are fetched for the whole page
+    when it's loaded instead.
+    """
+
+    _prefetch: Optional[ExitStack] = None
+
+    def _update(self, provider, update):
+        self._prefetch = ExitStack()
+        with self._prefetch:
+            try:
+                return super()._update(provider, update)
+            finally:
+                self._prefetch = None
+
+    def get_url(self, url=None, **kwargs):
+        response = super().get_url(url, **kwargs)
+        if self._prefetch is not None and self.is_feed_url(url):
+            try:
+                entries = response.json()["data"]["items"]
+            except (ValueError, KeyError, TypeError):
+                return response  # handled in _update
+            self._prefetch.enter_context(
+                ap.prefetch([entry.get("item") or {} for entry in entries])
+            )
+        return response
+
+    def is_feed_url(self, url) -> bool:
+        """Test if url is a feed page, other urls are items and renditions."""
+        return not url or url == self.provider.get("config", {}).get("next_link")
@@ -1,8 +1,7 @@
-import io
 import re
+import threading
 
 import cp
-import json
 import pytz
 import requests
 import lxml.html
@@ -11,13 +10,17 @@ import lxml.html.clean
 import superdesk
 import superdesk.etree as sd_etree
 
-from typing import List
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from contextlib import contextmanager
 from flask import current_app as app
 from superdesk.utc import utc_to_local, get_date, utcnow
-from superdesk.media.image import get_meta_iptc
 from superdesk.io.feed_parsers import APMediaFeedParser
 from superdesk.metadata.item import SCHEDULE_SETTINGS, PUB_STATUS
 
+from cp.ai.vocabulary import get_vocabulary
+from cp.ingest import capture
+from cp.ingest.parser import ap_rules, image_metadata
+
 
 AP_SOURCE = "The Associated Press"
 AP_SUBJECT_SCHEME = "http://cv.ap.org/id/"
@@ -73,6 +76,10 @@ PRIORITY_MAP = {
 
 
 sess = requests.Session()
+sess.mount(
+    "https://",
+    requests.adapters.HTTPAdapter(pool_maxsize=image_metadata.MAX_WORKERS),
+)
 
 
 def _get_cv_items(_id: str) -> List:
@@ -80,6 +87,124 @@ def _get_cv_items(_id: str) -> List:
     return cv["items"]
 
 
+class APSubjectIndex:
+    """Index of AP subject codes mapped to ``subject_custom`` items.
+
+    Item matches AP subject if its ``ap_subject`` contains a prefix
+    of the AP code, so lookup costs only a dict access per distinct
+    code length for each AP subject.
+    """
+
+    def __init__(self, items: List[Dict]):
+        self.items = items
+        self.positions: Dict[str, List[int]] = {}
+        for position, subj in enumerate(items):
+            if subj.get("ap_subject"):
+                for code in subj["ap_subject"].split(","):
+                    code = code.strip()
+                    if code:
+                        self.positions.setdefault(code, []).append(position)
+        self.lengths = sorted({len(code) for code in self.positions})
+
+    def match(self, codes: List[str]) -> List[Dict]:
+        """Get items matching any of AP codes, in vocabulary order."""
+        found: Set[int] = set()
+        for code in codes:
+            for length in self.lengths:
+                if length > len(code):
+                    break
+                found.update(self.positions.get(code[:length], ()))
+        return [self.items[position] for position in sorted(found)]
+
+
+def _get_ap_subject_index() -> APSubjectIndex:
+    """Get index for current vocabulary version, rebuilt when it changes."""
+    return get_vocabulary(AP_SUBJECT_CV).get_derived(APSubjectIndex)
+
+
+def get_ap_guids(ap_items: Iterable[Dict]) -> Set[str]:
+    """Get guids of AP items and their associations."""
+    guids = set()
+    for ap_item in ap_items:
+        guids.add(ap_item.get("altids", {}).get("itemid"))
+        for assoc in (ap_item.get("associations") or {}).values():
+            guids.add(assoc.get("altids", {}).get("itemid"))
+    guids.discard(None)
+    return guids
+
+
+def get_preview_hrefs(ap_items: Iterable[Dict]) -> List[str]:
+    """Get preview rendition urls of AP pictures."""
+    return [
+        ap_item["renditions"]["preview"]["href"]
+        for ap_item in ap_items
+        if ap_item.get("type") == "picture"
+        and ap_item.get("renditions", {}).get("preview", {}).get("href")
+    ]
+
+
+class PriorItems:
+    """Ingest and archive items for a batch of AP items.
+
+    Items for all ``guids`` are fetched using a single ``$in`` query
+    per collection, first item found for a guid is used like with
+    ``find_one``. Other guids are looked up one by one.
+    """
+
+    def __init__(self, guids: Iterable[str] = ()):
+        self.guids = set(guids)
+        self.ingest = self._fetch("ingest", "guid")
+        self.archive = self._fetch("archive", "ingest_id")
+
+    def _fetch(self, resource: str, field: str) -> Dict[str, Dict]:
+        items: Dict[str, Dict] = {}
+        if self.guids:
+            service = superdesk.get_resource_service(resource)
+            for item in service.find({field: {"$in": sorted(self.guids)}}):
+                items.setdefault(item[field], item)
+        return items
+
+    def get_ingest(self, guid: str) -> Optional[Dict]:
+        if guid in self.guids:
+            return self.ingest.get(guid)
+        return superdesk.get_resource_service("ingest").find_one(req=None, guid=guid)
+
+    def get_archive(self, ingest_id: str) -> Optional[Dict]:
+        if ingest_id in self.guids:
+            return self.archive.get(ingest_id)
+        return superdesk.get_resource_service("archive").find_one(
+            req=None, ingest_id=ingest_id
+        )
+
+
+_prefetched = threading.local()
+
+
+def get_prior_items() -> PriorItems:
+    return getattr(_prefetched, "prior_items", None) or PriorItems()
+
+
+@contextmanager
+def prefetch(ap_items: Iterable[Dict]):
+    """Look up prior items for a batch of AP items before parsing it.
+
+    Metadata of pictures is fetched concurrently in background meanwhile.
+
+    Usage::
+
+        with prefetch([data["data"]["item"] for data in batch]):
+            items = [parser.parse(data, provider) for data in batch]
+    """
+    ap_items = list(ap_items)
+    image_metadata.prefetch(get_preview_hrefs(ap_items), sess)
+    previous = getattr(_prefetched, "prior_items", None)
+    _prefetched.prior_items = PriorItems(get_ap_guids(ap_items))
+    try:
+        yield _prefetched.prior_items
+    finally:
+        _prefetched.prior_items = previous
+
+
 class CP_APMediaFeedParser(APMediaFeedParser):
     """
     Metadata: https://developer.ap.org/ap-media-api/agent/AP_Classification_Metadata.htm
@@ -125,13 +250,7 @@ class CP_APMediaFeedParser(APMediaFeedParser):
                 if assoc.get("type") in provider["content_types"]
             }
 
-        if app.config.get("AP_INGEST_DEBUG"):
-            transref = ap_item["altids"]["itemid"]
-            try:
-                with open("/tmp/ap/{}.json".format(transref), "w") as out:
-                    json.dump(data["data"], out, indent=2)
-            except FileNotFoundError:
-                pass
+        capture.recorder.record(data)
 
         item["guid"] = ap_item["altids"]["itemid"]
         item["uri"] = ap_item["uri"].split("?")[0]
@@ -145,9 +264,8 @@ class CP_APMediaFeedParser(APMediaFeedParser):
         except KeyError:
             pass
 
-        prev = superdesk.get_resource_service("ingest").find_one(
-            req=None, guid=item["guid"]
-        )
+        prior_items = get_prior_items()
+        prev = prior_items.get_ingest(item["guid"])
         if prev and prev.get("slugline"):
             item["slugline"] = prev["slugline"]
         elif item.get("slugline"):
@@ -270,9 +388,7 @@ class CP_APMediaFeedParser(APMediaFeedParser):
             item["associations"] = {}
             for key, assoc in associations.items():
                 if assoc.get("guid"):
-                    existing = superdesk.get_resource_service("archive").find_one(
-                        req=None, ingest_id=assoc["guid"]
-                    )
+                    existing = prior_items.get_archive(assoc["guid"])
                     if existing:
                         item["associations"][key] = {
                             "residRef": existing["uri"],
@@ -293,9 +409,7 @@ class CP_APMediaFeedParser(APMediaFeedParser):
 
         if item["type"] == "text":
             try:
-                prev_item = superdesk.get_resource_service("archive").find_one(
-                    req=None, ingest_id=item["guid"]
-                )
+                prev_item = prior_items.get_archive(item["guid"])
                 if (
                     prev_item is not None
                     and prev_item["extra"]["ap_version"] != ap_item["version"]
@@ -312,6 +426,11 @@ class CP_APMediaFeedParser(APMediaFeedParser):
 
         return item
 
+    def _parse_associations(self, associations, item, provider=None):
+        # associations are captured with the item
+        with capture.recorder.paused():
+            super()._parse_associations(associations, item, provider)
+
     def _parse_stocks(self, organisations):
         return ",".join(
             [
@@ -355,157 +474,35 @@ class CP_APMediaFeedParser(APMediaFeedParser):
         priority = PRIORITY_MAP.get(data["item"].get("urgency")) or ""
 
         if "fr" in item["language"]:
-            if re.search(r"^(insolite)", slugline, re.IGNORECASE):
-                return cp.NEWS_BUZZ
-            elif priority in ["f", "b"]:
-                return cp.NEWS_URGENT
-            elif priority == "u":
-                return cp.NEWS_NEED_TO_KNOW
-            elif priority == "r":
-                return cp.NEWS_GOOD_TO_KNOW
-            else:
-                return cp.NEWS_OPTIONAL
-
-        products = self.get_products(data)
-        categories = self.get_anpa_categories(data)
-        ap_subject = self.get_ap_subjects(data)
-
-        if (
-            32607 in products
-            and "s" in categories
-            and re.search(
-                r"(CYC|FIG|OLY|SKI|TEN)-",
-                slugline,
-                re.IGNORECASE,
-            )
-        ):
-            return cp.NEWS_GOOD_TO_KNOW
-
-        if (
-            30599 in products
-            and "s" in categories
-            and re.search(
-                r"(CAR|BBA|BBN|BKN|FBN|GLF|HKN|LAC|OLY|RAC|MMA)-",
-                slugline,
-                re.IGNORECASE,
-            )
-        ):
-            return cp.NEWS_GOOD_TO_KNOW
-
-        if (
-            32607 in products
-            and "s" in categories
-            and re.search(
-                r"(ARC|ATH|BAD|BIA|BOB|CAN|CRI|XXC|CUR|DIV|EQU|FEN|FHK|FRE|GYM|HNB|JUD|LUG|PEN|MOT|NOR|ROW|RGL|RGU|SAI|SHO|SKE|JUM|SBD|SOC|SOF|SPD|SQA|SUM|SWM|TTN|TAE|TRI|VOL|WPO|WEI|WRE)-",  # noqa
-                slugline,
-                re.IGNORECASE,
-            )
-        ):
-            return cp.NEWS_OPTIONAL
-
-        if (
-            30599 in products
-            and "s" in categories
-            and re.search(
-                r"(BBC|BBH|BBI|BBM|BBW|BBY|BKC|BKH|BKO|BKW|BKL|BOX|FBC|FBH|FBO|HKC|HKO|HKW)-",
-                slugline,
-                re.IGNORECASE,
+            return ap_rules.first_match(
+                ap_rules.FR_RANKING_RULES,
+                ap_rules.Facts(slugline=slugline, priority=priority),
+                cp.NEWS_OPTIONAL,
             )
-        ):
-            return cp.NEWS_OPTIONAL
-
-        if re.search(
-            r"today-in-history",
-            slugline,
-            re.IGNORECASE,
-        ):
-            return cp.NEWS_ROUTINE
-
-        if (
-            re.search(r"(odd|people)", slugline, re.IGNORECASE)
-            and "spot" in content_type
-        ) or re.search(
-            r"ap\s+impact",
-            content_type,
-            re.IGNORECASE,
-        ):
-            return cp.NEWS_BUZZ
-
-        if (
-            "spot" in content_type
-            and "r" == priority
-            and "5b4319707dd310048b23df092526b43e" in ap_subject
-        ):
-            return cp.NEWS_BUZZ
-
-        if "game" in content_type and "5b4319707dd310048b23df092526b43e" in ap_subject:
-            return cp.NEWS_GOOD_TO_KNOW
-
-        if "obituary" in content_type and priority == "u":
-            return cp.NEWS_URGENT
-
-        if (
-            re.search(r"(spot|game|topstory|headlinepackage)", content_type)
-            and "u" == priority
-        ):
-            return cp.NEWS_NEED_TO_KNOW
-
-        if (
-            re.search(r"(spot|obituary|game|topstory|headlinepackage)", content_type)
-            and "r" == priority
-        ):
-            return cp.NEWS_GOOD_TO_KNOW
-
-        if (
-            "enterprise" in content_type
-            and "54df6c687df7100483dedf092526b43e" in ap_subject
-        ):
-            return cp.NEWS_FEATURE_PREMIUM
-
-        if "enterprise" in content_type:
-            return cp.NEWS_FEATURE_REGULAR
-
-        if "review" in content_type and re.search(
-            r"us-film-review", slugline, re.IGNORECASE
-        ):
-            return cp.NEWS_FEATURE_REGULAR
-
-        if re.search(r"(column|profile|review)", content_type):
-            return cp.NEWS_FEATURE_PREMIUM
-
-        if re.search(
-            r"(Alaska-Digest-News|Washington-Digest|AP-Newsfeatures-Digest)",
-            content_type,
-            re.IGNORECASE,
-        ):
-            return cp.NEWS_ROUTINE
-
-        if re.search(r"(advisory|daybook)", content_type, re.IGNORECASE):
-            return cp.NEWS_ROUTINE
-
-        return cp.NEWS_OPTIONAL
 
-    def _parse_ednote(self, ednote):
-        return re.sub(
-            r"eds:\s*",
-            "",
-            ednote,
-            flags=re.IGNORECASE,
+        facts = ap_rules.Facts(
+            slugline=slugline,
+            content_type=content_type,
+            priority=priority,
+            products=self.get_products(data),
+            categories=self.get_anpa_categories(data),
+            subjects=self.get_ap_subjects(data),
+            sports=ap_rules.get_sports(slugline),
         )
+        return ap_rules.first_match(ap_rules.RANKING_RULES, facts, cp.NEWS_OPTIONAL)
+
+    def _parse_ednote(self, ednote):
+        return ap_rules.EDNOTE_EDS.sub("", ednote)
 
     def _format_ednote(self, ednote):
         matches = [
-            re.search(r"APNewsNow[;.]?", ednote, re.IGNORECASE),
-            re.search(r"Moving on.*\.", ednote),
+            ap_rules.EDNOTE_APNEWSNOW.search(ednote),
+            ap_rules.EDNOTE_MOVING_ON.search(ednote),
         ]
         return " ".join([m.group() for m in matches if m])
 
     def _format_update(self, ednote):
-        return re.sub(
-            r"NDLR\:",
-            "",
-            re.sub(r"\s*Moving on.*\.", "", ednote),
-        )
+        return ap_rules.UPDATE_NDLR.sub("", ap_rules.UPDATE_MOVING_ON.sub("", ednote))
 
     def _map_sluglines_to_subjects(self, item):
         # We'll skip mapping slugline to subjects
@@ -517,28 +514,25 @@ class CP_APMediaFeedParser(APMediaFeedParser):
         is_agate = "Agate" in [c["name"] for c in item.get("anpa_category") or []]
         if is_agate:
             return
+        codes = [
+            ap_subj["code"]
+            for ap_subj in subject
+            if ap_subj.get("creator") == "Editorial"
+        ]
+        if not codes:
+            return
         added = set()
-        available = _get_cv_items(AP_SUBJECT_CV)
-        for subj in available:
-            if subj.get("ap_subject"):
-                codes = [code.strip() for code in subj["ap_subject"].split(",")]
-                for ap_subj in subject:
-                    if (
-                        ap_subj.get("creator") == "Editorial"
-                        and any(
-                            [code for code in codes if ap_subj["code"].startswith(code)]
-                        )
-                        and subj["qcode"] not in added
-                    ):
-                        added.add(subj["qcode"])
-                        item["subject"].append(
-                            {
-                                "name": subj["name"],
-                                "qcode": subj["qcode"],
-                                "scheme": AP_SUBJECT_CV,
-                                "translations": subj["translations"],
-                            }
-                        )
+        for subj in _get_ap_subject_index().match(codes):
+            if subj["qcode"] not in added:
+                added.add(subj["qcode"])
+                item["subject"].append(
+                    {
+                        "name": subj["name"],
+                        "qcode": subj["qcode"],
+                        "scheme": AP_SUBJECT_CV,
+                        "translations": subj["translations"],
+                    }
+                )
 
     def _map_category_codes(self, item):
         categories = _get_cv_items(CATEGORY_SCHEME)
@@ -572,151 +566,35 @@ class CP_APMediaFeedParser(APMediaFeedParser):
                 return index
             return ["Spare News"]
 
-        slugline = item["slugline"]
-        products = self.get_products(data)
-        textformat = data["item"].get("textformat", "")
-
-        if re.search(r"-MED-", slugline):
-            return ["Lifestyle"]
-
-        if "t" in textformat or 31385 in products:
-            return ["Agate"]
-
-        if re.search(
-            r"""
-            (ARC	(?# Match for Archery)
-            |ATH	(?# Match for Athletics)
-            |BAD	(?# Match for Badminton)
-            |BBA	(?# Match for Baseball American League)
-            |BBC	(?# Match for Baseball U.S. College)
-            |BBH	(?# Match for Baseball High School)
-            |BBI	(?# Match for Baseball International)
-            |BBM	(?# Match for Baseball Minor Leagues)
-            |BBN	(?# Match for Baseball National League)
-            |BBO	(?# Match for Baseball Other)
-            |BBW	(?# Match for Baseball Women)
-            |BBY	(?# Match for Baseball Youth)
-            |BIA	(?# Match for Biathalon)
-            |BKC	(?# Match for Basketball U.S. College)
-            |BKH	(?# Match for Basketball High School)
-            |BKL	(?# Match for Basketball Womens Pro)
-            |BKN	(?# Match for Basketball NBA)
-            |BKO	(?# Match for Basketball Other)
-            |BKW	(?# Match for Basketball Womens College)
-            |BOB	(?# Match for Bobsled)
-            |BOX	(?# Match for Boxing)
-            |CAN	(?# Match for Canoeing)
-            |CAR	(?# Match for Auto Racing)
-            |COM	(?# Match for Commonwealth Games)
-            |CRI	(?# Match for Cricket)
-            |CUR	(?# Match for Curling)
-            |CYC	(?# Match for Cycling)
-            |DIV	(?# Match for Diving)
-            |EQU	(?# Match for Equestrian)
-            |FBC	(?# Match for Football U.S. College)
-            |FBH	(?# Match for Football High School)
-            |FBN	(?# Match for Football NFL)
-            |FBO	(?# Match for Football Other)
-            |FEN	(?# Match for Fencing)
-            |FHK	(?# Match for Field Hockey)
-            |FIG	(?# Match for Figure Skating)
-            |FRE	(?# Match for Freestyle skiing)
-            |GLF	(?# Match for Golf)
-            |GYM	(?# Match for Gymnastics)
-            |HKC	(?# Match for Hockey U.S. College)
-            |HKN	(?# Match for Hockey NHL)
-            |HKO	(?# Match for Hockey Other)
-            |HKW	(?# Match for Hockey Women)
-            |HNB	(?# Match for Handball)
-            |JUD	(?# Match for Judo)
-            |JUM	(?# Match for Ski jumping)
-            |LUG	(?# Match for Luge)
-            |MMA	(?# Match for Mixed martial arts)
-            |MOT	(?# Match for Motorcycling)
-            |NOR	(?# Match for Nordic Combined)
-            |OLY	(?# Match for Olympics)
-            |PEN	(?# Match for Modern Pentathlon)
-            |RAC	(?# Match for Horseracing)
-            |RGL	(?# Match for RugbyLeague)
-            |RGU	(?# Match for RugbyUnion)
-            |ROW	(?# Match for Rowing)
-            |SAI	(?# Match for Sailing)
-            |SBD	(?# Match for Snowboarding)
-            |SHO	(?# Match for Short track)
-            |SKE	(?# Match for Skeleton)
-            |SKI	(?# Match for Skiing - Alpine)
-            |SOC	(?# Match for Soccer)
-            |SOF	(?# Match for Softball)
-            |SPD	(?# Match for Speedskating long track)
-            |SQA	(?# Match for Squash)
-            |SUM	(?# Match for Sumo Wrestling)
-            |SWM	(?# Match for Swimming)
-            |TAE	(?# Match for Taekwondo)
-            |TEN	(?# Match for Tennis)
-            |TRI	(?# Match for Triathlon)
-            |TTN	(?# Match for Table tennis)
-            |VOL	(?# Match for Volleyball)
-            |WEI	(?# Match for Weightlifting)
-            |WPO	(?# Match for WaterPolo)
-            |WRE	(?# Match for Wrestling)
-            |XXC	(?# Match for Cross-country skiing)
-            )
-            .*
-            (Box		(?# Match for Box)
-            |Calendar	(?# Match for Calendar)
-            |Comparison	(?# Match for Comparison)
-            |Date		(?# Match for Date)
-            |Digest		(?# Match for Digest)
-            |Fared		(?# Match for Fared)
-            |Glance		(?# Match for Glance)
-            |Leaders	(?# Match for Leaders)
-            |Poll		(?# Match for Poll)
-            |Results?	(?# Match for Results)
-            |Linescores	(?# Match for Linescores)
-            |Schedule	(?# Match for Schedule)
-            |Scores?	(?# Match for Score)
-            |Scorers	(?# Match for Scorers)
-            |Scoreboard	(?# Match for Scoreboard)
-            |Standings	(?# Match for Standings)
-            |Stax		(?# Match for Stax)
-            |Streaks?    (?# Match for baseball streak files)
-            |Sums?		(?# Match for Sum)
-            |Summaries	(?# Match for Summaries)
-            |Glantz-Culver-Line	(?# Match for Glantz-Culver-Line)
-            )
-        """,
-            slugline,
-            re.IGNORECASE | re.VERBOSE,
-        ):
-            return ["Agate"]
+        facts = ap_rules.Facts(
+            slugline=item["slugline"],
+            textformat=data["item"].get("textformat", ""),
+            products=self.get_products(data),
+        )
+
+        index = ap_rules.first_match(ap_rules.INDEX_RULES, facts)
+        if index:
+            return [index]
 
         index = get_index(EN_CATEGORY_MAPPING)
         if index:
             return index
 
-        if re.search(r"Washington-Digest|AP-Newsfeatures-Digest", slugline):
-            return ["Prairies/BC"]
-
-        if re.search(r"AP-Newsfeatures-Digest", slugline):
-            return ["International"]
-
-        return ["Spare News"]
+        return [
+            ap_rules.first_match(ap_rules.INDEX_FALLBACK_RULES, facts, "Spare News")
+        ]
 
     def _parse_genre(self, data, item):
         """Versiontype in JIMI"""
         slugline = item.get("slugline") or ""
-        if re.search(r"NewsAlert", slugline, re.IGNORECASE):
+        if ap_rules.GENRE_NEWSALERT.search(slugline):
             genre = "NewsAlert"
-        elif re.search(r"Correction:", item["headline"], re.IGNORECASE):
+        elif ap_rules.GENRE_CORRECTION.search(item["headline"]):
             genre = "Corrective"
-        elif "canceled" == data["item"]["pubstatus"]:
-            genre = "Kill"
-        elif "withheld" == data["item"]["pubstatus"]:
-            genre = "Withhold"
-        elif "embargoed" == data["item"]["pubstatus"]:
-            genre = "Advance"
         else:
-            genre = data["item"].get("profile")
+            genre = ap_rules.PUBSTATUS_GENRE.get(data["item"]["pubstatus"]) or data[
+                "item"
+            ].get("profile")
 
         if genre:
             item["genre"] = [
@@ -796,10 +674,10 @@ class CP_APMediaFeedParser(APMediaFeedParser):
 
     def _parse_exif(self, data, item):
         try:
-            res = sess.get(data["item"]["renditions"]["preview"]["href"], timeout=10)
+            href = data["item"]["renditions"]["preview"]["href"]
         except KeyError:
             return
-        metadata = get_meta_iptc(io.BytesIO(res.content))
+        metadata = image_metadata.get_iptc(href, sess)
         if metadata.get("Writer/Editor"):
             item.setdefault("extra", {})[cp.CAPTION_WRITER] = metadata["Writer/Editor"]
         if metadata.get("Headline"):
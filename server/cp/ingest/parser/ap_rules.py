@@ -0,0 +1,312 @@
+"""Rules for AP ranking, genre and index.
+
+Rules are compiled on import and evaluated in order, first matching
+rule wins. A rule matches when all of its conditions match the
+:class:`Facts` of an item.
+"""
+
+import re
+import cp
+
+from typing import Any, Collection, FrozenSet, NamedTuple, Optional, Pattern, Tuple
+
+
+class Facts(NamedTuple):
+    """Item values used by rules."""
+
+    slugline: str = ""
+    content_type: str = ""
+    textformat: str = ""
+    priority: str = ""
+    products: Collection[int] = ()
+    categories: Collection[str] = ()
+    subjects: Collection[str] = ()
+    sports: FrozenSet[str] = frozenset()
+
+
+class Rule(NamedTuple):
+    result: Any
+    slugline: Optional[Pattern] = None
+    content_type: Optional[Pattern] = None
+    textformat: Optional[Pattern] = None
+    priority: Tuple[str, ...] = ()
+    product: Optional[int] = None
+    category: Optional[str] = None
+    subject: Optional[str] = None
+    sports: FrozenSet[str] = frozenset()
+
+    def matches(self, facts: Facts) -> bool:
+        if self.product is not None and self.product not in facts.products:
+            return False
+        if self.category is not None and self.category not in facts.categories:
+            return False
+        if self.subject is not None and self.subject not in facts.subjects:
+            return False
+        if self.priority and facts.priority not in self.priority:
+            return False
+        if self.sports and self.sports.isdisjoint(facts.sports):
+            return False
+        if self.slugline is not None and not self.slugline.search(facts.slugline):
+            return False
+        if self.content_type is not None and not self.content_type.search(
+            facts.content_type
+        ):
+            return False
+        if self.textformat is not None and not self.textformat.search(facts.textformat):
+            return False
+        return True
+
+
+def first_match(rules: Tuple[Rule, ...], facts: Facts, default=None):
+    for rule in rules:
+        if rule.matches(facts):
+            return rule.result
+    return default
+
+
+def sports(codes: str) -> FrozenSet[str]:
+    return frozenset(code.casefold() for code in codes.split())
+
+
+def i(pattern: str) -> Pattern:
+    return re.compile(pattern, re.IGNORECASE)
+
+
+# all sport codes followed by a dash are found in a single scan,
+# overlapping ones included, rules then only check code sets
+SPORT_CODE = re.compile(r"(?=(\w{3})-)")
+
+# characters matched to ascii letters by re.IGNORECASE, but not by casefold
+IGNORECASE_FIX = str.maketrans({"\u0130": "i", "\u0131": "i"})
+
+
+def get_sports(slugline: str) -> FrozenSet[str]:
+    """Get casefolded three letter codes followed by dash in slugline."""
+    return frozenset(
+        code.translate(IGNORECASE_FIX).casefold()
+        for code in SPORT_CODE.findall(slugline)
+    )
+
+
+SPOT = re.compile("spot")
+GAME = re.compile("game")
+ENTERPRISE = re.compile("enterprise")
+
+SPORTS_SUBJECT = "5b4319707dd310048b23df092526b43e"
+LIFESTYLE_SUBJECT = "54df6c687df7100483dedf092526b43e"
+
+FR_RANKING_RULES = (
+    Rule(cp.NEWS_BUZZ, slugline=i(r"^(insolite)")),
+    Rule(cp.NEWS_URGENT, priority=("f", "b")),
+    Rule(cp.NEWS_NEED_TO_KNOW, priority=("u",)),
+    Rule(cp.NEWS_GOOD_TO_KNOW, priority=("r",)),
+)
+
+RANKING_RULES = (
+    Rule(
+        cp.NEWS_GOOD_TO_KNOW,
+        product=32607,
+        category="s",
+        sports=sports("CYC FIG OLY SKI TEN"),
+    ),
+    Rule(
+        cp.NEWS_GOOD_TO_KNOW,
+        product=30599,
+        category="s",
+        sports=sports("CAR BBA BBN BKN FBN GLF HKN LAC OLY RAC MMA"),
+    ),
+    Rule(
+        cp.NEWS_OPTIONAL,
+        product=32607,
+        category="s",
+        sports=sports(
+            """
+            ARC ATH BAD BIA BOB CAN CRI XXC CUR DIV EQU FEN FHK FRE GYM HNB
+            JUD LUG PEN MOT NOR ROW RGL RGU SAI SHO SKE JUM SBD SOC SOF SPD
+            SQA SUM SWM TTN TAE TRI VOL WPO WEI WRE
+            """
+        ),
+    ),
+    Rule(
+        cp.NEWS_OPTIONAL,
+        product=30599,
+        category="s",
+        sports=sports(
+            """
+            BBC BBH BBI BBM BBW BBY BKC BKH BKO BKW BKL BOX FBC FBH FBO HKC
+            HKO HKW
+            """
+        ),
+    ),
+    Rule(cp.NEWS_ROUTINE, slugline=i(r"today-in-history")),
+    Rule(cp.NEWS_BUZZ, slugline=i(r"(odd|people)"), content_type=SPOT),
+    Rule(cp.NEWS_BUZZ, content_type=i(r"ap\s+impact")),
+    Rule(cp.NEWS_BUZZ, content_type=SPOT, priority=("r",), subject=SPORTS_SUBJECT),
+    Rule(cp.NEWS_GOOD_TO_KNOW, content_type=GAME, subject=SPORTS_SUBJECT),
+    Rule(cp.NEWS_URGENT, content_type=re.compile("obituary"), priority=("u",)),
+    Rule(
+        cp.NEWS_NEED_TO_KNOW,
+        content_type=re.compile(r"(spot|game|topstory|headlinepackage)"),
+        priority=("u",),
+    ),
+    Rule(
+        cp.NEWS_GOOD_TO_KNOW,
+        content_type=re.compile(r"(spot|obituary|game|topstory|headlinepackage)"),
+        priority=("r",),
+    ),
+    Rule(
+        cp.NEWS_FEATURE_PREMIUM,
+        content_type=ENTERPRISE,
+        subject=LIFESTYLE_SUBJECT,
+    ),
+    Rule(cp.NEWS_FEATURE_REGULAR, content_type=ENTERPRISE),
+    Rule(
+        cp.NEWS_FEATURE_REGULAR,
+        content_type=re.compile("review"),
+        slugline=i(r"us-film-review"),
+    ),
+    Rule(cp.NEWS_FEATURE_PREMIUM, content_type=re.compile(r"(column|profile|review)")),
+    Rule(
+        cp.NEWS_ROUTINE,
+        content_type=i(
+            r"(Alaska-Digest-News|Washington-Digest|AP-Newsfeatures-Digest)"
+        ),
+    ),
+    Rule(cp.NEWS_ROUTINE, content_type=i(r"(advisory|daybook)")),
+)
+
+AGATE_SLUGLINE = re.compile(
+    r"""
+    (ARC	(?# Match for Archery)
+    |ATH	(?# Match for Athletics)
+    |BAD	(?# Match for Badminton)
+    |BBA	(?# Match for Baseball American League)
+    |BBC	(?# Match for Baseball U.S. College)
+    |BBH	(?# Match for Baseball High School)
+    |BBI	(?# Match for Baseball International)
+    |BBM	(?# Match for Baseball Minor Leagues)
+    |BBN	(?# Match for Baseball National League)
+    |BBO	(?# Match for Baseball Other)
+    |BBW	(?# Match for Baseball Women)
+    |BBY	(?# Match for Baseball Youth)
+    |BIA	(?# Match for Biathalon)
+    |BKC	(?# Match for Basketball U.S. College)
+    |BKH	(?# Match for Basketball High School)
+    |BKL	(?# Match for Basketball Womens Pro)
+    |BKN	(?# Match for Basketball NBA)
+    |BKO	(?# Match for Basketball Other)
+    |BKW	(?# Match for Basketball Womens College)
+    |BOB	(?# Match for Bobsled)
+    |BOX	(?# Match for Boxing)
+    |CAN	(?# Match for Canoeing)
+    |CAR	(?# Match for Auto Racing)
+    |COM	(?# Match for Commonwealth Games)
+    |CRI	(?# Match for Cricket)
+    |CUR	(?# Match for Curling)
+    |CYC	(?# Match for Cycling)
+    |DIV	(?# Match for Diving)
+    |EQU	(?# Match for Equestrian)
+    |FBC	(?# Match for Football U.S. College)
+    |FBH	(?# Match for Football High School)
+    |FBN	(?# Match for Football NFL)
+    |FBO	(?# Match for Football Other)
+    |FEN	(?# Match for Fencing)
+    |FHK	(?# Match for Field Hockey)
+    |FIG	(?# Match for Figure Skating)
+    |FRE	(?# Match for Freestyle skiing)
+    |GLF	(?# Match for Golf)
+    |GYM	(?# Match for Gymnastics)
+    |HKC	(?# Match for Hockey U.S. College)
+    |HKN	(?# Match for Hockey NHL)
+    |HKO	(?# Match for Hockey Other)
+    |HKW	(?# Match for Hockey Women)
+    |HNB	(?# Match for Handball)
+    |JUD	(?# Match for Judo)
+    |JUM	(?# Match for Ski jumping)
+    |LUG	(?# Match for Luge)
+    |MMA	(?# Match for Mixed martial arts)
+    |MOT	(?# Match for Motorcycling)
+    |NOR	(?# Match for Nordic Combined)
+    |OLY	(?# Match for Olympics)
+    |PEN	(?# Match for Modern Pentathlon)
+    |RAC	(?# Match for Horseracing)
+    |RGL	(?# Match for RugbyLeague)
+    |RGU	(?# Match for RugbyUnion)
+    |ROW	(?# Match for Rowing)
+    |SAI	(?# Match for Sailing)
+    |SBD	(?# Match for Snowboarding)
+    |SHO	(?# Match for Short track)
+    |SKE	(?# Match for Skeleton)
+    |SKI	(?# Match for Skiing - Alpine)
+    |SOC	(?# Match for Soccer)
+    |SOF	(?# Match for Softball)
+    |SPD	(?# Match for Speedskating long track)
+    |SQA	(?# Match for Squash)
+    |SUM	(?# Match for Sumo Wrestling)
+    |SWM	(?# Match for Swimming)
+    |TAE	(?# Match for Taekwondo)
+    |TEN	(?# Match for Tennis)
+    |TRI	(?# Match for Triathlon)
+    |TTN	(?# Match for Table tennis)
+    |VOL	(?# Match for Volleyball)
+    |WEI	(?# Match for Weightlifting)
+    |WPO	(?# Match for WaterPolo)
+    |WRE	(?# Match for Wrestling)
+    |XXC	(?# Match for Cross-country skiing)
+    )
+    .*
+    (Box		(?# Match for Box)
+    |Calendar	(?# Match for Calendar)
+    |Comparison	(?# Match for Comparison)
+    |Date		(?# Match for Date)
+    |Digest		(?# Match for Digest)
+    |Fared		(?# Match for Fared)
+    |Glance		(?# Match for Glance)
+    |Leaders	(?# Match for Leaders)
+    |Poll		(?# Match for Poll)
+    |Results?	(?# Match for Results)
+    |Linescores	(?# Match for Linescores)
+    |Schedule	(?# Match for Schedule)
+    |Scores?	(?# Match for Score)
+    |Scorers	(?# Match for Scorers)
+    |Scoreboard	(?# Match for Scoreboard)
+    |Standings	(?# Match for Standings)
+    |Stax		(?# Match for Stax)
+    |Streaks?    (?# Match for baseball streak files)
+    |Sums?		(?# Match for Sum)
+    |Summaries	(?# Match for Summaries)
+    |Glantz-Culver-Line	(?# Match for Glantz-Culver-Line)
+    )
+    """,
+    re.IGNORECASE | re.VERBOSE,
+)
+
+# rules applied before category mapping
+INDEX_RULES = (
+    Rule("Lifestyle", slugline=re.compile(r"-MED-")),
+    Rule("Agate", textformat=re.compile("t")),
+    Rule("Agate", product=31385),
+    Rule("Agate", slugline=AGATE_SLUGLINE),
+)
+
+# rules applied if there is no category mapping
+INDEX_FALLBACK_RULES = (
+    Rule(
+        "Prairies/BC", slugline=re.compile(r"Washington-Digest|AP-Newsfeatures-Digest")
+    ),
+    Rule("International", slugline=re.compile(r"AP-Newsfeatures-Digest")),
+)
+
+GENRE_NEWSALERT = i(r"NewsAlert")
+GENRE_CORRECTION = i(r"Correction:")
+PUBSTATUS_GENRE = {
+    "canceled": "Kill",
+    "withheld": "Withhold",
+    "embargoed": "Advance",
+}
+
+EDNOTE_EDS = i(r"eds:\s*")
+EDNOTE_APNEWSNOW = i(r"APNewsNow[;.]?")
+EDNOTE_MOVING_ON = re.compile(r"Moving on.*\.")
+UPDATE_MOVING_ON = re.compile(r"\s*Moving on.*\.")
+UPDATE_NDLR = re.compile(r"NDLR\:")
@@ -0,0 +1,151 @@
+"""Fetch image IPTC metadata without downloading the whole image.
+
+JPEG metadata segments (EXIF in APP1, IPTC in APP13) are stored before
+the image data, so only the leading bytes are requested using HTTP Range
+and the range is extended while the segments are incomplete. Servers
+ignoring Range get the response read only until the segments are there.
+
+Metadata for a batch of images can be fetched concurrently using
+:func:`prefetch` before it's needed.
+"""
+
+import io
+import struct
+import functools
+import threading
+import requests
+
+from typing import Dict, Iterable, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from cachetools import LRUCache
+from superdesk.media.image import get_meta_iptc
+
+
+TIMEOUT = 10
+RANGE_SIZE = 16 * 1024
+MAX_HEADER_SIZE = 1024 * 1024
+
+SOI = b"\xff\xd8"
+SOS = 0xDA
+EOI = 0xD9
+# markers without length
+STANDALONE_MARKERS = {0x01, 0xD8} | set(range(0xD0, 0xD8))
+
+# concurrent fetches, size connection pool of session accordingly
+MAX_WORKERS = 8
+
+cache: LRUCache = LRUCache(maxsize=1000)
+cache_lock = threading.Lock()
+pending: Dict[str, Future] = {}
+executor = ThreadPoolExecutor(MAX_WORKERS, thread_name_prefix="image-metadata")
+
+
+def scan_header(data: bytes) -> Tuple[bool, int]:
+    """Scan JPEG segments before image data.
+
+    Returns if all segments up to and including start of scan are in data
+    and length of data needed to get next segment, or all of them when
+    complete.
+    """
+    pos = len(SOI)
+    while True:
+        if pos + 4 > len(data):
+            return False, pos + 4
+        if data[pos] != 0xFF:  # corrupted, leave it to image parser
+            return True, pos
+        marker = data[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker in STANDALONE_MARKERS:
+            pos += 2
+            continue
+        if marker == EOI:
+            return True, pos + 2
+        end = pos + 2 + struct.unpack_from(">H", data, pos + 2)[0]
+        if marker == SOS:
+            return end <= len(data), end
+        pos = end
+
+
+def fetch_header(url: str, session=requests, timeout=TIMEOUT) -> bytes:
+    """Get image data with all JPEG segments before image data.
+
+    Whole image is returned if it's not a JPEG.
+    """
+    data = b""
+    needed = RANGE_SIZE
+    while len(data) < MAX_HEADER_SIZE:
+        end = max(needed, len(data) + RANGE_SIZE)
+        with session.get(
+            url,
+            headers={"Range": "bytes={}-{}".format(len(data), end - 1)},
+            timeout=timeout,
+            stream=True,
+        ) as response:
+            if response.status_code == 416:  # end of file
+                break
+            if response.status_code != 206:  # range not supported
+                return read_header(response)
+            data += response.content
+        if not data.startswith(SOI):
+            return session.get(url, timeout=timeout).content
+        complete, needed = scan_header(data)
+        if complete or len(data) < end:  # end of file
+            break
+    return data
+
+
+def read_header(response) -> bytes:
+    """Read response until all JPEG segments before image data are there."""
+    data = b""
+    for chunk in response.iter_content(RANGE_SIZE):
+        data += chunk
+        if data.startswith(SOI) and (
+            scan_header(data)[0] or len(data) >= MAX_HEADER_SIZE
+        ):
+            break
+    return data
+
+
+def fetch_iptc(url: str, session=requests, timeout=TIMEOUT) -> Dict:
+    return get_meta_iptc(io.BytesIO(fetch_header(url, session, timeout)))
+
+
+def prefetch(urls: Iterable[str], session=requests, timeout=TIMEOUT) -> None:
+    """Start fetching metadata for images in background.
+
+    :func:`get_iptc` then waits for the result instead of fetching it.
+    """
+    futures = []
+    with cache_lock:
+        for url in urls:
+            if url in cache or url in pending:
+                continue
+            pending[url] = executor.submit(fetch_iptc, url, session, timeout)
+            futures.append((url, pending[url]))
+    for url, future in futures:
+        future.add_done_callback(functools.partial(on_fetched, url))
+
+
+def on_fetched(url: str, future: Future) -> None:
+    with cache_lock:
+        if pending.get(url) is future:
+            del pending[url]
+        if not future.cancelled() and future.exception() is None:
+            cache[url] = future.result()
+
+
+def get_iptc(url: str, session=requests, timeout=TIMEOUT) -> Dict:
+    """Get IPTC metadata of image, cached by url."""
+    with cache_lock:
+        metadata = cache.get(url)
+        future = pending.get(url)
+    if metadata is not None:
+        return metadata
+    if future is not None:
+        return future.result()
+    metadata = fetch_iptc(url, session, timeout)
+    with cache_lock:
+        cache[url] = metadata
+    return metadata
@@ -19,6 +19,9 @@ from superdesk.metadata.item import SCHEDULE_SETTINGS
 from apps.publish.enqueue import get_enqueue_service
 
 from cp.utils import format_maxlength
+from cp.output.formatter.vocabulary_index import get_vocabulary_index
+from cp.output.formatter.original_item import get_original_item
+from cp.output.formatter.sequences import get_sequence_numbers
 
 
 DEFAULT_DATETIME = "0001-01-01T00:00:00"
@@ -102,6 +105,10 @@ def filename(item) -> str:
     return guid(item)
 
 
+def content_item_id(pub_seq_num) -> str:
+    return "{:08d}".format(pub_seq_num % 100000000)
+
+
 def is_french(item) -> bool:
     return "fr" in item.get("language", "en")
 
@@ -130,18 +137,30 @@ class JimiFormatter(Formatter):
         ]
         if not services:
             services.append(None)
-        for service in services:
-            pub_seq_num = superdesk.get_resource_service(
-                "subscribers"
-            ).generate_sequence_number(subscriber)
-            root = etree.Element("Publish")
-            self._format_item(root, article, pub_seq_num, service, services)
+        root = None
+        sequence_numbers = self.get_sequence_numbers(subscriber, len(services))
+        for service, pub_seq_num in zip(services, sequence_numbers):
+            if root is None:
+                root = etree.Element("Publish")
+                self._format_item(root, article, pub_seq_num, service, services)
+            else:
+                self._format_service(root, article, pub_seq_num, service)
             xml = etree.tostring(
                 root, pretty_print=True, encoding=self.ENCODING, xml_declaration=True
             )
             output.append((pub_seq_num, xml.decode(self.ENCODING)))
         return output
 
+    def get_sequence_numbers(self, subscriber, count: int) -> List[int]:
+        return get_sequence_numbers(subscriber, count)
+
+    def _format_service(self, root, item, pub_seq_num, service) -> None:
+        """Update fields which differ per service in already formatted item."""
+        root.find("PublishID").text = str(pub_seq_num)
+        root.find("ContentItem/ContentItemID").text = content_item_id(pub_seq_num)
+        if service and not is_picture(item):
+            root.find("PscCodes").text = service
+
     def _format_subject_code(self, root, item, elem, scheme) -> None:
         subject = item.get("subject") or []
         for subj in subject:
@@ -199,7 +218,7 @@ class JimiFormatter(Formatter):
 
         # content system fields
         orig = self._get_original_item(item)
-        seq_id = "{:08d}".format(pub_seq_num % 100000000)
+        seq_id = content_item_id(pub_seq_num)
         item_id = "{:08d}".format(self.get_item_id(orig) % 100000000)
         etree.SubElement(content, "Name")
         etree.SubElement(content, "Cachable").text = "false"
@@ -413,14 +432,13 @@ class JimiFormatter(Formatter):
             etree.SubElement(content, "IndexCode")
 
     def _resolve_names(self, selected_items, language, cv_id, jimi_only=True):
-        cv = superdesk.get_resource_service("vocabularies").find_one(
-            req=None, _id=cv_id
-        )
+        index = get_vocabulary_index(cv_id)
         names = []
-        if not cv:
+        if not index:
             return names
+        lookup = index.jimi_by_qcode if jimi_only else index.by_qcode
         for selected_item in selected_items:
-            item = _find_qcode_item(selected_item["qcode"], cv["items"], jimi_only)
+            item = lookup.get(selected_item["qcode"])
             name = (
                 _get_name(item, language)
                 if item
@@ -575,19 +593,11 @@ class JimiFormatter(Formatter):
         """ContainerIDs shoud link to SystemSlug of story."""
         refs = set(
             [
-                slug(self._get_original_item(ref))
-                for ref in superdesk.get_resource_service("news").search(
-                    {
-                        "query": {
-                            "bool": {
-                                "must": [
-                                    {"term": {"refs.guid": item["guid"]}},
-                                    {"term": {"pubstatus": "usable"}},
-                                    {"terms": {"state": ["published", "scheduled"]}},
-                                ],
-                            },
-                        },
-                    }
+                container["slug"]
+                for container in superdesk.get_resource_service(
+                    "picture_containers"
+                ).find(
+                    {"guid": item["guid"], "state": {"$in": ["published", "scheduled"]}}
                 )
             ]
         )
@@ -651,18 +661,7 @@ class JimiFormatter(Formatter):
             )
 
     def _get_original_item(self, item):
-        orig = item
-        for i in range(100):
-            if not orig.get("rewrite_of"):
-                return orig
-            next_orig = superdesk.get_resource_service("archive").find_one(
-                req=None, _id=orig["rewrite_of"]
-            )
-            if next_orig is not None:
-                orig = next_orig
-                continue
-            break
-        return orig
+        return get_original_item(item)
 
     def _format_filename(self, item):
         """Get filename for item.
@@ -719,18 +718,6 @@ def to_datetime(value):
     return value
 
 
-def _find_qcode_item(code, items, jimi_only=True):
-    for item in items:
-        if item.get("qcode") == code:
-            if not jimi_only:
-                return item
-            if item.get("in_jimi"):
-                return item
-            elif item.get("parent"):
-                return _find_qcode_item(item["parent"], items, jimi_only)
-            break
-
-
 def _get_name(item, language):
     lang = language.replace("_", "-")
     if "-CA" not in lang:
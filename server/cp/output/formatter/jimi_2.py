@@ -18,6 +18,9 @@ from superdesk.metadata.item import SCHEDULE_SETTINGS
 from apps.publish.enqueue import get_enqueue_service
 
 from cp.utils import format_maxlength
+from cp.output.formatter.vocabulary_index import get_vocabulary_index
+from cp.output.formatter.original_item import get_original_item
+from cp.output.formatter.sequences import get_sequence_numbers
 
 
 DEFAULT_DATETIME = "0001-01-01T00:00:00"
@@ -101,6 +104,10 @@ def filename(item) -> str:
     return guid(item)
 
 
+def content_item_id(pub_seq_num) -> str:
+    return "{:08d}".format(pub_seq_num % 100000000)
+
+
 def is_french(item) -> bool:
     return "fr" in item.get("language", "en")
 
@@ -123,18 +130,27 @@ class Jimi2Formatter(Formatter):
         ]
         if not services:
             services.append(None)
-        for service in services:
-            pub_seq_num = superdesk.get_resource_service(
-                "subscribers"
-            ).generate_sequence_number(subscriber)
-            root = etree.Element("Publish")
-            self._format_item(root, article, pub_seq_num, service, services)
+        root = None
+        sequence_numbers = get_sequence_numbers(subscriber, len(services))
+        for service, pub_seq_num in zip(services, sequence_numbers):
+            if root is None:
+                root = etree.Element("Publish")
+                self._format_item(root, article, pub_seq_num, service, services)
+            else:
+                self._format_service(root, article, pub_seq_num, service)
             xml = etree.tostring(
                 root, pretty_print=True, encoding=self.ENCODING, xml_declaration=True
             )
             output.append((pub_seq_num, xml.decode(self.ENCODING)))
         return output
 
+    def _format_service(self, root, item, pub_seq_num, service) -> None:
+        """Update fields which differ per service in already formatted item."""
+        root.find("PublishID").text = str(pub_seq_num)
+        root.find("ContentItem/ContentItemID").text = content_item_id(pub_seq_num)
+        if service and not is_picture(item):
+            root.find("PscCodes").text = service
+
     def _format_subject_code(self, root, item, elem, scheme) -> None:
         subject = item.get("subject") or []
         for subj in subject:
@@ -196,7 +212,7 @@ class Jimi2Formatter(Formatter):
 
         # content system fields
         orig = self._get_original_item(item)
-        seq_id = "{:08d}".format(pub_seq_num % 100000000)
+        seq_id = content_item_id(pub_seq_num)
         item_id = "{:08d}".format(self.get_item_id(orig) % 100000000)
         etree.SubElement(content, "Name")
         etree.SubElement(content, "Cachable").text = "false"
@@ -452,17 +468,13 @@ class Jimi2Formatter(Formatter):
             etree.SubElement(content, "IndexCode")
 
     def _resolve_names(self, selected_items, language, cv_id, jimi_only=True):
-        cv = superdesk.get_resource_service("vocabularies").find_one(
-            req=None, _id=cv_id
-        )
+        index = get_vocabulary_index(cv_id)
         names = []
 
-        filtered_items = filter_items_by_jimi(cv["items"], jimi_only=True)
-
-        if not cv:
+        if not index:
             return names
         for selected_item in selected_items:
-            item = _find_qcode_item(selected_item["qcode"], filtered_items, jimi_only)
+            item = index.in_jimi_by_code.get(selected_item["qcode"])
 
             if item:
                 name = _get_name(item, language)
@@ -478,14 +490,12 @@ class Jimi2Formatter(Formatter):
     def _resolve_names_categories(
         self, selected_items, language, cv_id, jimi_only=True
     ):
-        cv = superdesk.get_resource_service("vocabularies").find_one(
-            req=None, _id=cv_id
-        )
+        index = get_vocabulary_index(cv_id)
         names = []
-        if not cv:
+        if not index:
             return names
         for selected_item in selected_items:
-            item = _find_qcode_item(selected_item["qcode"], cv["items"], jimi_only)
+            item = index.jimi_by_code.get(selected_item["qcode"])
             name = (
                 _get_name(item, language)
                 if item
@@ -640,11 +650,10 @@ class Jimi2Formatter(Formatter):
         """ContainerIDs shoud link to SystemSlug of story."""
         refs = set(
             [
-                slug(self._get_original_item(ref))
-                for ref in superdesk.get_resource_service("news").get(
-                    req=None, lookup={"refs.guid": item["guid"]}
-                )
-                if ref.get("pubstatus") == "usable"
+                container["slug"]
+                for container in superdesk.get_resource_service(
+                    "picture_containers"
+                ).find({"guid": item["guid"]})
             ]
         )
 
@@ -707,18 +716,7 @@ class Jimi2Formatter(Formatter):
             )
 
     def _get_original_item(self, item):
-        orig = item
-        for i in range(100):
-            if not orig.get("rewrite_of"):
-                return orig
-            next_orig = superdesk.get_resource_service("archive").find_one(
-                req=None, _id=orig["rewrite_of"]
-            )
-            if next_orig is not None:
-                orig = next_orig
-                continue
-            break
-        return orig
+        return get_original_item(item)
 
     def _format_filename(self, item):
         """Get filename for item.
@@ -775,34 +773,6 @@ def to_datetime(value):
     return value
 
 
-def filter_items_by_jimi(items, jimi_only=True):
-    """Filter items where 'in_jimi' is true."""
-    if jimi_only:
-        return [item for item in items if item.get("in_jimi", False)]
-    return items
-
-
-def _find_qcode_item(code, items, jimi_only=True):
-    for item in items:
-        if item.get("qcode") == code:
-            if not jimi_only:
-                pass
-            if item.get("in_jimi"):
-                return item
-            elif item.get("parent"):
-                return _find_qcode_item(item["parent"], items, jimi_only)
-            break
-
-        elif item.get("semaphore_id") == code:
-            if not jimi_only:
-                pass
-            if item.get("in_jimi"):
-                return item
-            elif item.get("parent"):
-                return _find_qcode_item(item["parent"], items, jimi_only)
-            break
-
-
 def _get_name(item, language):
     lang = language.replace("_", "-")
     if "-CA" not in lang:
@@ -57,6 +57,8 @@ from superdesk.attachments import get_attachment_public_url
 import superdesk
 from collections import OrderedDict
 
+from cp.output.formatter.sequences import get_sequence_numbers
+
 logger = logging.getLogger(__name__)
 # this regex match the way custom media fields are put in associations (i.e. how the key
 # is generated). This is legacy, and can hardly be changed without risking to break
@@ -169,9 +171,7 @@ class NINJSFormatter_2(Formatter):
 
     def format(self, article, subscriber, codes=None):
         try:
-            pub_seq_num = superdesk.get_resource_service(
-                "subscribers"
-            ).generate_sequence_number(subscriber)
+            pub_seq_num = get_sequence_numbers(subscriber)[0]
 
             ninjs = self._transform_to_ninjs(article, subscriber)
             return [
@@ -0,0 +1,75 @@
+"""Resolve the original story of an update.
+
+Updates link to the previous version via ``rewrite_of``, so finding
+the original means fetching every item in the chain. Resolved originals
+are cached for every item on the path, so formatting the same story
+for other subscribers or as a reference doesn't walk the chain again
+and a new update only fetches its previous version.
+
+Chains containing an item are dropped from cache when it's updated
+or published in this process, other processes notice it on expiry.
+Callers get a copy so cached items can't be modified.
+"""
+
+import copy
+import threading
+import superdesk
+
+from typing import Dict, List
+from cachetools import TTLCache
+from superdesk.signals import item_publish, item_updated
+
+
+MAX_HOPS = 100
+
+cache: TTLCache = TTLCache(maxsize=1000, ttl=600)
+cache_lock = threading.Lock()
+
+
+def get_original_item(item: Dict) -> Dict:
+    """Get the first item of ``rewrite_of`` chain."""
+    orig = item
+    path: List[str] = []
+    for _ in range(MAX_HOPS):
+        if not orig.get("rewrite_of"):
+            break
+        with cache_lock:
+            cached = cache.get(orig["rewrite_of"])
+        if cached is not None:
+            orig = cached
+            break
+        next_orig = superdesk.get_resource_service("archive").find_one(
+            req=None, _id=orig["rewrite_of"]
+        )
+        if next_orig is None:
+            return orig  # chain is broken, don't cache
+        path.append(orig["rewrite_of"])
+        orig = next_orig
+    if orig is item:
+        return item
+    with cache_lock:
+        for _id in path:
+            cache[_id] = orig
+    return copy.deepcopy(orig)
+
+
+def invalidate(item_id) -> None:
+    """Drop cached chains containing given item."""
+    with cache_lock:
+        ids = {item_id}
+        if item_id in cache:
+            ids.add(cache[item_id].get("_id"))
+        ids.discard(None)
+        for key, orig in list(cache.items()):
+            if key in ids or orig.get("_id") in ids:
+                cache.pop(key, None)
+
+
+def on_item_changed(sender, item, **kwargs) -> None:
+    if item.get("_id"):
+        invalidate(item["_id"])
+
+
+def init_app(app) -> None:
+    item_updated.connect(on_item_changed)
+    item_publish.connect(on_item_changed)
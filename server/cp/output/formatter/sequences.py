@@ -0,0 +1,78 @@
+"""Publish sequence numbers reserved in blocks.
+
+Subscribers service generates every sequence number with an atomic
+update of the subscriber sequence. Formatters producing more outputs
+reserve all numbers they need with a single update instead, continuing
+the same sequence.
+
+With ``PUBLISH_SEQUENCE_BLOCK_SIZE`` set every process reserves that many
+numbers at once and hands them out locally, so numbers are not strictly
+increasing across processes and unused ones are skipped on restart.
+"""
+
+import threading
+import superdesk
+
+from typing import Deque, Dict, List, Optional, Tuple
+from collections import deque
+from flask import current_app as app
+
+
+blocks: Dict[str, Deque[int]] = {}
+blocks_lock = threading.Lock()
+
+
+def get_sequence_key(subscriber) -> str:
+    # same as in subscribers service
+    return "subscribers_{_id})".format(_id=subscriber.get("_id"))
+
+
+def get_sequence_range(subscriber) -> Tuple[int, Optional[int]]:
+    settings = subscriber.get("sequence_num_settings")
+    if settings:
+        return settings["min"], settings["max"]
+    return 1, app.config.get("MAX_VALUE_OF_PUBLISH_SEQUENCE")
+
+
+def reserve_sequence_numbers(subscriber, count: int) -> List[int]:
+    """Reserve ``count`` consecutive sequence numbers for subscriber.
+
+    Numbers over maximum continue from minimum like when generated
+    one by one.
+    """
+    if count < 1:
+        return []
+    min_seq_number, max_seq_number = get_sequence_range(subscriber)
+    key = get_sequence_key(subscriber)
+    service = superdesk.get_resource_service("sequences")
+    last = service.find_and_modify(
+        query={"key": key},
+        update={"$inc": {"sequence_number": count}},
+        upsert=True,
+        new=True,
+    ).get("sequence_number")
+    numbers = list(range(last - count + 1, last + 1))
+    if max_seq_number and last > max_seq_number:
+        numbers = [number for number in numbers if number <= max_seq_number]
+        numbers.extend(range(min_seq_number, min_seq_number + count - len(numbers)))
+        service.find_and_modify(
+            query={"key": key}, update={"$set": {"sequence_number": numbers[-1]}}
+        )
+    return numbers
+
+
+def get_sequence_numbers(subscriber, count: int = 1) -> List[int]:
+    """Get ``count`` sequence numbers for subscriber."""
+    block_size = app.config.get("PUBLISH_SEQUENCE_BLOCK_SIZE") or 0
+    if block_size <= 1:
+        return reserve_sequence_numbers(subscriber, count)
+    key = get_sequence_key(subscriber)
+    with blocks_lock:
+        block = blocks.setdefault(key, deque())
+        if len(block) < count:
+            block.extend(
+                reserve_sequence_numbers(
+                    subscriber, max(block_size, count - len(block))
+                )
+            )
+        return [block.popleft() for _ in range(count)]
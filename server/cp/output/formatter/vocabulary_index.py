@@ -0,0 +1,71 @@
+"""Vocabulary lookups for JIMI formatters.
+
+Index of vocabulary items is built once per vocabulary version using
+the process-wide vocabulary cache, so resolving codes and their nearest
+``in_jimi`` ancestors is a dict lookup instead of loading the vocabulary
+and scanning its items for every code.
+"""
+
+from typing import Dict, List, Optional
+
+from cp.ai.vocabulary import get_vocabulary
+
+
+class VocabularyIndex:
+    """Lookup tables for vocabulary items.
+
+    When there are more items with the same code the first one is used.
+    """
+
+    def __init__(self, items: List[Dict]):
+        self.items = items
+        self.by_qcode: Dict[str, Dict] = {}
+        # qcode or semaphore_id
+        self.by_code: Dict[str, Dict] = {}
+        self.in_jimi_by_code: Dict[str, Dict] = {}
+        for item in items:
+            codes = [item.get("qcode"), item.get("semaphore_id")]
+            if codes[0] is not None:
+                self.by_qcode.setdefault(codes[0], item)
+            for code in codes:
+                if code is None:
+                    continue
+                self.by_code.setdefault(code, item)
+                if item.get("in_jimi"):
+                    self.in_jimi_by_code.setdefault(code, item)
+        self.jimi_by_qcode = get_nearest_jimi(self.by_qcode)
+        self.jimi_by_code = get_nearest_jimi(self.by_code)
+
+
+def get_nearest_jimi(lookup: Dict[str, Dict]) -> Dict[str, Dict]:
+    """Map codes to the nearest ``in_jimi`` item following parents."""
+    nearest: Dict[str, Optional[Dict]] = {}
+    for start in lookup:
+        path = []
+        item: Optional[Dict] = None
+        code = start
+        while code not in nearest:
+            nearest[code] = None  # breaks cycles
+            path.append(code)
+            candidate = lookup.get(code)
+            if candidate is None:
+                break
+            if candidate.get("in_jimi"):
+                item = candidate
+                break
+            if not candidate.get("parent"):
+                break
+            code = candidate["parent"]
+        else:
+            item = nearest[code]
+        for code in path:
+            nearest[code] = item
+    return {code: item for code, item in nearest.items() if item is not None}
+
+
+def get_vocabulary_index(cv_id: str) -> Optional[VocabularyIndex]:
+    cv = get_vocabulary(cv_id)
+    cv.refresh()
+    if not cv.found:
+        return None
+    return cv.get_derived(VocabularyIndex)
@@ -0,0 +1,133 @@
+"""Reverse index of stories referencing pictures.
+
+JIMI output of a picture contains ``ContainerIDs`` with slugs
+of usable stories using it. Those are stored with story state when
+a story is created, saved or published, so formatting a picture
+is a single lookup by picture guid instead of searching for stories
+and resolving their original items. Saves which don't change
+referenced pictures, state or anything the slug is based on
+are skipped.
+
+Existing stories are indexed by a data update, ``cp:index_picture_containers``
+command does the same.
+"""
+
+import logging
+import superdesk
+
+import cp
+
+from typing import Dict, Optional, Set, Tuple
+from superdesk.signals import item_publish, item_updated
+
+from cp.output.formatter.jimi import slug
+from cp.output.formatter.original_item import get_original_item
+
+
+logger = logging.getLogger(__name__)
+
+RESOURCE = "picture_containers"
+
+
+class PictureContainersResource(superdesk.Resource):
+    schema = {
+        "guid": {"type": "string", "required": True},
+        "story": {"type": "string", "required": True},
+        "slug": {"type": "string"},
+        "state": {"type": "string"},
+    }
+    internal_resource = True
+    mongo_indexes = {
+        "guid_1_story_1": ([("guid", 1), ("story", 1)], {"unique": True}),
+        "story_1": ([("story", 1)], {"background": True}),
+    }
+
+
+class PictureContainersService(superdesk.Service):
+    pass
+
+
+def get_picture_guids(item: Dict) -> Set[str]:
+    """Get guids of pictures referenced by item if it's usable."""
+    if item.get("pubstatus") != "usable":
+        return set()
+    return {ref["guid"] for ref in item.get("refs") or [] if ref.get("guid")}
+
+
+def get_index_key(item: Dict) -> Tuple:
+    """Get values which stored containers depend on."""
+    return (
+        get_picture_guids(item),
+        item.get("state"),
+        item.get("type"),
+        item.get("language"),
+        item.get("rewrite_of"),
+        (item.get("extra") or {}).get(cp.ORIG_ID),
+    )
+
+
+def update_picture_containers(item: Dict) -> None:
+    service = superdesk.get_resource_service(RESOURCE)
+    story = str(item["_id"])
+    guids = get_picture_guids(item)
+    if guids:
+        story_slug = slug(get_original_item(item))
+        for guid in guids:
+            service.find_and_modify(
+                query={"guid": guid, "story": story},
+                update={"$set": {"slug": story_slug, "state": item.get("state")}},
+                upsert=True,
+            )
+    service.delete({"story": story, "guid": {"$nin": list(guids)}})
+
+
+def index_stories(page_size=500) -> int:
+    """Index all usable stories referencing pictures.
+
+    Returns number of indexed stories.
+    """
+    lookup = {"pubstatus": "usable", "refs.guid": {"$exists": True}}
+    service = superdesk.get_resource_service("archive")
+    count = 0
+    last_id = None
+    while True:
+        if last_id is not None:
+            lookup["_id"] = {"$gt": last_id}
+        items = list(service.find(lookup).sort("_id", 1).limit(page_size))
+        if not items:
+            break
+        for item in items:
+            on_item_changed(None, item)
+        count += len(items)
+        last_id = items[-1]["_id"]
+        logger.info("Indexed %d stories referencing pictures", count)
+    return count
+
+
+def on_item_changed(sender, item, original: Optional[Dict] = None, **kwargs) -> None:
+    """Update index for item, never failing the save or publish."""
+    if item.get("type") == "picture":
+        return
+    if original is not None and get_index_key(item) == get_index_key(original):
+        return
+    try:
+        update_picture_containers(item)
+    except Exception:
+        logger.exception(
+            "Could not update picture containers for item %s", item.get("_id")
+        )
+
+
+def on_archive_inserted(docs) -> None:
+    for doc in docs:
+        on_item_changed(None, doc)
+
+
+def init_app(app) -> None:
+    superdesk.register_resource(
+        RESOURCE, PictureContainersResource, PictureContainersService, _app=app
+    )
+    # item_create is sent before insert when there might be no _id yet
+    app.on_inserted_archive += on_archive_inserted
+    item_updated.connect(on_item_changed)
+    item_publish.connect(on_item_changed)
@@ -0,0 +1,24 @@
+# -*- coding: utf-8; -*-
+# This file is part of Superdesk.
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+#
+# Author  : superdesk
+# Creation: 2026-10-18 12:00
+
+from superdesk.commands.data_updates import BaseDataUpdate
+
+from cp.picture_containers import index_stories
+
+
+class DataUpdate(BaseDataUpdate):
+    """Index existing stories referencing pictures for JIMI ContainerIDs."""
+
+    resource = "archive"
+
+    def forwards(self, mongodb_collection, mongodb_database):
+        index_stories()
+
+    def backwards(self, mongodb_collection, mongodb_database):
+        mongodb_database["picture_containers"].delete_many({})
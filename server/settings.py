@@ -43,7 +43,12 @@ INSTALLED_APPS = [
     "cp.planning_exports",
     "cp.set_province_on_publish",
     "cp.set_byline_on_publish",
+    "cp.picture_containers",
     "cp.ai.semaphore",
+    "cp.ai.preclassify",
+    "cp.ai.metrics",
+    "cp.ai.vocabulary",
+    "cp.output.formatter.original_item",
 ]
 
 MACROS_MODULE = "cp.macros"
@@ -257,6 +262,14 @@ HIGHCHARTS_LICENSE_EXPIRY = "Perpetual"
 
 AP_INGEST_DEBUG = strtobool(env("AP_INGEST_DEBUG", "false"))
 
+# capture AP ingest payloads for replay, see cp.ingest.capture
+AP_INGEST_CAPTURE_PATH = env(
+    "AP_INGEST_CAPTURE_PATH", "/tmp/ap" if AP_INGEST_DEBUG else ""
+)
+AP_INGEST_CAPTURE_SEGMENT_SIZE = int(
+    env("AP_INGEST_CAPTURE_SEGMENT_SIZE", 64 * 1024 * 1024)
+)
+
 GEONAMES_USERNAME = env("GEONAMES_USERNAME", "TheCanadianPress")
 GEONAMES_FEATURE_CLASSES = ["P"]
 GEONAMES_SEARCH_STYLE = "full"
@@ -281,6 +294,9 @@ PUBLISH_QUEUE_EXPIRY_MINUTES = int(
 )  # 7d
 ARCHIVED_EXPIRY_MINUTES = int(env("ARCHIVED_EXPIRY_MINUTES", 60 * 24 * 60))  # 60d
 
+# publish sequence numbers reserved per process at once, see cp.output.formatter.sequences
+PUBLISH_SEQUENCE_BLOCK_SIZE = int(env("PUBLISH_SEQUENCE_BLOCK_SIZE", 0))
+
 # disable use of XMP for photo assignments
 PLANNING_USE_XMP_FOR_PIC_ASSIGNMENTS = False
 
@@ -433,6 +449,52 @@ SEMAPHORE_CREATE_TAG_URL = os.getenv("SEMAPHORE_CREATE_TAG_URL")
 SEMAPHORE_CREATE_TAG_TASK = os.getenv("SEMAPHORE_CREATE_TAG_TASK")
 SEMAPHORE_CREATE_TAG_QUERY = os.getenv("SEMAPHORE_CREATE_TAG_QUERY")
 
+# refresh semaphore access token in background when it expires in less than (seconds)
+SEMAPHORE_TOKEN_REFRESH_MARGIN = int(os.getenv("SEMAPHORE_TOKEN_REFRESH_MARGIN", 60))
+
+# broader terms of topics missing in subject_custom vocabulary are cached
+SEMAPHORE_PARENT_CACHE_SIZE = int(os.getenv("SEMAPHORE_PARENT_CACHE_SIZE", 1000))
+SEMAPHORE_PARENT_CACHE_TTL = int(os.getenv("SEMAPHORE_PARENT_CACHE_TTL", 6 * 3600))
+
+# check if cached vocabularies were updated by other process (seconds)
+SEMAPHORE_VOCABULARY_CHECK_INTERVAL = int(
+    os.getenv("SEMAPHORE_VOCABULARY_CHECK_INTERVAL", 60)
+)
+
+# max concurrent broader terms lookups and how long to wait for them (seconds)
+SEMAPHORE_PARENT_CONCURRENCY = int(os.getenv("SEMAPHORE_PARENT_CONCURRENCY", 8))
+SEMAPHORE_PARENT_TIMEOUT = float(os.getenv("SEMAPHORE_PARENT_TIMEOUT", 5))
+
+# analyze results cache for unchanged content, size and ttl (seconds)
+SEMAPHORE_RESULT_CACHE_SIZE = int(os.getenv("SEMAPHORE_RESULT_CACHE_SIZE", 500))
+SEMAPHORE_RESULT_CACHE_TTL = int(os.getenv("SEMAPHORE_RESULT_CACHE_TTL", 600))
+
+# max concurrent requests when creating tags
+SEMAPHORE_CREATE_TAG_CONCURRENCY = int(os.getenv("SEMAPHORE_CREATE_TAG_CONCURRENCY", 4))
+
+# semaphore circuit breaker opens after number of failed or slow requests
+# and stays open for given time (seconds)
+SEMAPHORE_BREAKER_FAILURES = int(os.getenv("SEMAPHORE_BREAKER_FAILURES", 5))
+SEMAPHORE_BREAKER_RESET_TIMEOUT = int(os.getenv("SEMAPHORE_BREAKER_RESET_TIMEOUT", 30))
+
+# max concurrent requests for batch classification
+SEMAPHORE_BATCH_CONCURRENCY = int(os.getenv("SEMAPHORE_BATCH_CONCURRENCY", 4))
+
+# bearer token for /api/semaphore/metrics scrapers, otherwise it requires login
+SEMAPHORE_METRICS_TOKEN = env("SEMAPHORE_METRICS_TOKEN", "")
+
+# max number of body words sent for classification
+SEMAPHORE_BODY_TOKEN_BUDGET = int(os.getenv("SEMAPHORE_BODY_TOKEN_BUDGET", 3000))
+
+# gzip classification requests, rejected ones are sent again uncompressed
+SEMAPHORE_GZIP_REQUESTS = strtobool(env("SEMAPHORE_GZIP_REQUESTS", "false"))
+
+# classify ingested text items in background, limited to requests per second
+# and max number of items waiting in the queue
+SEMAPHORE_PRECLASSIFY = strtobool(env("SEMAPHORE_PRECLASSIFY", "false"))
+SEMAPHORE_PRECLASSIFY_RATE = int(os.getenv("SEMAPHORE_PRECLASSIFY_RATE", 2))
+SEMAPHORE_PRECLASSIFY_MAX_DEPTH = int(os.getenv("SEMAPHORE_PRECLASSIFY_MAX_DEPTH", 200))
+
 PICTURE_METADATA_MAPPING = {
     "slugline": "Title",
     "extra.filename": "JobId",
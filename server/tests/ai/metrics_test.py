@@ -0,0 +1,63 @@
+import flask
+import unittest
+
+from cp.ai import metrics
+
+
+class MetricsTestCase(unittest.TestCase):
+    def test_stage(self):
+        labels = dict(operation="test", stage="http")
+        count = metrics.stage_seconds.get(**labels).get("count", 0)
+        with metrics.stage("test", "http") as stage:
+            stage.request_bytes = 10
+            stage.response_bytes = 100
+        with self.assertRaises(ValueError):
+            with metrics.stage("test", "http"):
+                raise ValueError()
+        self.assertEqual(count + 2, metrics.stage_seconds.get(**labels)["count"])
+        self.assertEqual(1, metrics.stage_total.get(status="ok", **labels))
+        self.assertEqual(1, metrics.stage_total.get(status="error", **labels))
+        self.assertEqual(10, metrics.request_bytes.get(**labels))
+        self.assertEqual(100, metrics.response_bytes.get(**labels))
+
+    def test_histogram(self):
+        histogram = metrics.Histogram("test_seconds", "Test.", buckets=(0.1, 1))
+        histogram.observe(0.05, stage="foo")
+        histogram.observe(0.1, stage="foo")
+        histogram.observe(5, stage="foo")
+        self.assertEqual(
+            [
+                "# HELP test_seconds Test.",
+                "# TYPE test_seconds histogram",
+                'test_seconds_bucket{stage="foo",le="0.1"} 2',
+                'test_seconds_bucket{stage="foo",le="1"} 2',
+                'test_seconds_bucket{stage="foo",le="+Inf"} 3',
+                'test_seconds_sum{stage="foo"} 5.15',
+                'test_seconds_count{stage="foo"} 3',
+            ],
+            histogram.render(),
+        )
+
+    def test_endpoint(self):
+        app = flask.Flask(__name__)
+        app.api_prefix = "/api"
+        app.config["SEMAPHORE_METRICS_TOKEN"] = "secret"
+        metrics.init_app(app)
+        with metrics.stage("test", "transform"):
+            pass
+        client = app.test_client()
+        self.assertEqual(401, client.get("/api/semaphore/metrics").status_code)
+        self.assertEqual(
+            401,
+            client.get(
+                "/api/semaphore/metrics", headers={"Authorization": "Bearer foo"}
+            ).status_code,
+        )
+        response = client.get(
+            "/api/semaphore/metrics", headers={"Authorization": "Bearer secret"}
+        )
+        self.assertEqual(200, response.status_code)
+        self.assertIn(
+            'semaphore_stage_total{operation="test",stage="transform",status="ok"}',
+            response.get_data(as_text=True),
+        )
@@ -0,0 +1,74 @@
+import gzip
+import unittest
+import lxml.etree as etree
+
+from urllib.parse import parse_qs
+
+from cp.ai.payload import build_classify_xml, encode_form, extract_text
+
+
+class ExtractTextTestCase(unittest.TestCase):
+    def test_extract_text(self):
+        html = (
+            "<p>OTTAWA &mdash; <b>Health</b>  Canada<br>approved</p>"
+            "<!-- EMBED START --><script>var x = 1;</script><!-- EMBED END -->"
+            "<p>AT&amp;T &lt;said&gt;</p><ul><li>one</li><li>two</li></ul>"
+        )
+        text, truncated = extract_text(html)
+        self.assertEqual(
+            "OTTAWA — Health Canada\napproved\nAT&T <said>\none\ntwo", text
+        )
+        self.assertFalse(truncated)
+
+    def test_plain_text(self):
+        self.assertEqual(("foo bar", False), extract_text(" foo\n bar "))
+        self.assertEqual(("", False), extract_text(""))
+
+    def test_token_budget(self):
+        html = "<p>one two three</p><p>four five</p><p>six</p>"
+        self.assertEqual(("one two three\nfour", True), extract_text(html, 4))
+        self.assertEqual(
+            ("one two three\nfour five\nsix", False), extract_text(html, 6)
+        )
+
+
+class BuildClassifyXmlTestCase(unittest.TestCase):
+    def test_payload(self):
+        item = {
+            "guid": "foo",
+            "headline": "Rock & roll <live>",
+            "abstract": "<p>Short</p>",
+            "body_html": "<p>" + " ".join(["word"] * 10) + "</p>",
+            "slugline": "music",
+        }
+        xml = build_classify_xml(item, "test", token_budget=5)
+        request = etree.fromstring(xml.encode("utf-8"))
+        self.assertEqual("CLASSIFY", request.get("op"))
+        story = etree.fromstring(request.findtext("document/body").encode("utf-8"))
+        self.assertEqual("Rock & roll <live>", story.findtext("headline"))
+        self.assertEqual("Short", story.findtext("headline_extended"))
+        self.assertEqual("word word word word word", story.findtext("body_html"))
+        self.assertEqual("music", story.findtext("slugline"))
+        self.assertEqual("foo", story.findtext("guid"))
+        self.assertEqual("test", story.findtext("env"))
+
+    def test_missing_fields(self):
+        xml = build_classify_xml({"guid": "foo", "headline": "Test"}, "test")
+        story = etree.fromstring(
+            etree.fromstring(xml.encode("utf-8")).findtext("document/body").encode()
+        )
+        self.assertEqual("", story.findtext("body_html"))
+
+
+class EncodeFormTestCase(unittest.TestCase):
+    def test_gzip(self):
+        data = {"XML_INPUT": "<request>" + "text " * 1000 + "</request>"}
+        plain, headers = encode_form(data)
+        self.assertNotIn("Content-Encoding", headers)
+        body, headers = encode_form(data, compress=True)
+        self.assertEqual("gzip", headers["Content-Encoding"])
+        self.assertLess(len(body), len(plain))
+        self.assertEqual(
+            data["XML_INPUT"],
+            parse_qs(gzip.decompress(body).decode("utf-8"))["XML_INPUT"][0],
+        )
@@ -0,0 +1,169 @@
+import flask
+import unittest
+
+from unittest.mock import patch
+from collections import defaultdict
+
+from cp.ai import preclassify
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = defaultdict(int)
+        self.hashes = defaultdict(dict)
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def incr(self, key):
+        self.data[key] += 1
+        return self.data[key]
+
+    def decr(self, key):
+        self.data[key] -= 1
+        return self.data[key]
+
+    def expire(self, key, ttl):
+        return True
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def hincrby(self, key, field, amount):
+        hash = self.hashes[key]
+        field = field.encode()
+        hash[field] = hash.get(field, 0) + amount
+
+    def hgetall(self, key):
+        return self.hashes.get(key)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def incr(self, key):
+        self.calls.append(lambda: self.redis.incr(key))
+
+    def expire(self, key, ttl):
+        self.calls.append(lambda: self.redis.expire(key, ttl))
+
+    def execute(self):
+        return [call() for call in self.calls]
+
+
+def get_item(guid, **kwargs):
+    item = {
+        "guid": guid,
+        "type": "text",
+        "headline": "Health Canada approves new medication",
+        "body_html": "<p>OTTAWA - Health Canada approved a new medication.</p>",
+        "language": "en-CA",
+    }
+    item.update(kwargs)
+    return item
+
+
+class PreclassifyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = flask.Flask(__name__)
+        self.app.redis = FakeRedis()
+        self.app.config.update(
+            {
+                "SEMAPHORE_PRECLASSIFY": True,
+                "SEMAPHORE_PRECLASSIFY_RATE": 2,
+                "SEMAPHORE_PRECLASSIFY_MAX_DEPTH": 3,
+            }
+        )
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+
+    def tearDown(self):
+        self.ctx.pop()
+
+    @patch("cp.ai.preclassify.preclassify_item")
+    def test_queue_text_items(self, task):
+        self.assertTrue(preclassify.queue_item(get_item("foo")))
+        self.assertFalse(preclassify.queue_item(get_item("pic", type="picture")))
+        self.assertFalse(
+            preclassify.queue_item(get_item("empty", headline="", body_html=""))
+        )
+        task.apply_async.assert_called_once()
+        data = task.apply_async.call_args[1]["args"][0]
+        self.assertEqual("foo", data["guid"])
+        self.assertEqual("Health Canada approves new medication", data["headline"])
+        self.assertNotIn("type", data)
+
+    @patch("cp.ai.preclassify.preclassify_item")
+    def test_queue_disabled(self, task):
+        self.app.config["SEMAPHORE_PRECLASSIFY"] = False
+        self.assertFalse(preclassify.queue_item(get_item("foo")))
+        task.apply_async.assert_not_called()
+
+    @patch("cp.ai.preclassify.preclassify_item")
+    def test_queue_max_depth(self, task):
+        for i in range(5):
+            preclassify.queue_item(get_item("item-{}".format(i)))
+        self.assertEqual(3, task.apply_async.call_count)
+        stats = preclassify.get_stats()
+        self.assertEqual(3, stats["queued"])
+        self.assertEqual(2, stats["dropped"])
+        self.assertEqual(3, stats["depth"])
+
+    def test_rate_limit(self):
+        with patch("cp.ai.preclassify.time.time", return_value=100):
+            self.assertTrue(preclassify.acquire_rate_slot())
+            self.assertTrue(preclassify.acquire_rate_slot())
+            self.assertFalse(preclassify.acquire_rate_slot())
+        with patch("cp.ai.preclassify.time.time", return_value=101):
+            self.assertTrue(preclassify.acquire_rate_slot())
+
+    @patch("cp.ai.preclassify.store_tags")
+    @patch("cp.ai.preclassify.get_stored_tags", return_value=None)
+    @patch("cp.ai.preclassify.registered_ai_services")
+    def test_classify(self, services, get_stored_tags, store_tags):
+        tags = {"subject": [{"name": "health", "qcode": "07000000"}]}
+        services["semaphore"].analyze.return_value = tags
+        item = get_item("foo")
+        self.assertTrue(preclassify.classify(item))
+        store_tags.assert_called_once_with(
+            "foo", preclassify.get_content_hash(item), tags
+        )
+
+        store_tags.reset_mock()
+        services["semaphore"].analyze.return_value = {}
+        self.assertFalse(preclassify.classify(item))
+        store_tags.assert_not_called()
+
+        get_stored_tags.return_value = tags
+        services["semaphore"].analyze.reset_mock()
+        self.assertTrue(preclassify.classify(item))
+        services["semaphore"].analyze.assert_not_called()
+
+    @patch("cp.ai.preclassify.acquire_rate_slot", return_value=False)
+    def test_drop_throttled_after_max_retries(self, acquire_rate_slot):
+        self.app.redis.data[preclassify.DEPTH_KEY] = 1
+        preclassify.preclassify_item.push_request(retries=preclassify.MAX_RETRIES)
+        try:
+            preclassify.preclassify_item.run(get_item("foo"))
+        finally:
+            preclassify.preclassify_item.pop_request()
+        stats = preclassify.get_stats()
+        self.assertEqual(1, stats["dropped"])
+        self.assertEqual(0, stats["depth"])
+
+    @patch("cp.ai.preclassify.queue_item")
+    @patch("cp.ai.preclassify.AppIngestService.on_created")
+    def test_queue_stored_ingest_items(self, on_created, queue_item):
+        service = preclassify.PreclassifyIngestService("ingest", backend=None)
+        item = get_item("foo")
+        service.on_created([item])
+        on_created.assert_called_once_with([item])
+        queue_item.assert_called_once_with(item)
@@ -0,0 +1,493 @@
+import os
+import time
+import flask
+import unittest
+import requests_mock
+
+from unittest.mock import MagicMock, patch
+from superdesk.text_checkers.ai.base import registered_ai_services
+
+from cp.ai import metrics
+from cp.ai.semaphore import Semaphore, iter_article_elements
+from cp.ai.vocabulary import subjects
+
+
+TOKEN_URL = "https://semaphore.example.com/token"
+ANALYZE_URL = "https://semaphore.example.com/classify"
+CREATE_URL = "https://semaphore.example.com/kmm/create"
+SEARCH_URL = "https://semaphore.example.com/en/search/"
+PARENT_URL = "https://semaphore.example.com/en/parent/"
+
+SUBJECT_CV = {
+    "_id": "subject_custom",
+    "_etag": "1",
+    "items": [
+        {
+            "name": "health",
+            "qcode": "07000000",
+            "parent": None,
+            "semaphore_id": "sem-health",
+            "translations": {"name": {"fr-CA": "Santé"}},
+        },
+        {
+            "name": "health treatment and procedure",
+            "qcode": "20000480",
+            "parent": "07000000",
+            "semaphore_id": "sem-treatment",
+            "translations": {"name": {"fr-CA": "Traitement"}},
+        },
+        {
+            "name": "medication",
+            "qcode": "20000487",
+            "parent": "20000480",
+            "semaphore_id": "sem-medication",
+            "translations": {"name": {"fr-CA": "Médicament"}},
+        },
+    ],
+}
+
+PARENT_RESPONSE = """<?xml version="1.0" encoding="UTF-8"?>
+<TERM>
+  <PATH TYPE="Narrower Term">
+    <FIELD NAME="economy, business and finance" ID="sem-economy">
+      <CLASS NAME="Topic" />
+    </FIELD>
+  </PATH>
+</TERM>
+"""
+
+
+def read_fixture(filename):
+    with open(os.path.join(os.path.dirname(__file__), "fixtures", filename)) as f:
+        return f.read()
+
+
+def get_item(guid, **kwargs):
+    item = {
+        "guid": guid,
+        "headline": "Health Canada approves new medication",
+        "abstract": "<p>Approval comes before election</p>",
+        "body_html": "<p>OTTAWA - Health Canada approved a new medication.</p>",
+        "slugline": "health-medication",
+        "language": "en-CA",
+    }
+    item.update(kwargs)
+    return item
+
+
+def get_vocabularies_service():
+    service = MagicMock()
+    service.find_one.return_value = SUBJECT_CV
+    return service
+
+
+class SemaphoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = flask.Flask(__name__)
+        self.app.cache = None
+        self.app.config.update(
+            {
+                "CACHE_URL": "",
+                "SEMAPHORE_BASE_URL": TOKEN_URL,
+                "SEMAPHORE_API_KEY": "secret-key",
+                "SEMAPHORE_ANALYZE_URL": ANALYZE_URL,
+                "SEMAPHORE_SEARCH_URL": SEARCH_URL,
+                "SEMAPHORE_GET_PARENT_URL": PARENT_URL,
+                "SEMAPHORE_CREATE_TAG_URL": CREATE_URL,
+                "SEMAPHORE_CREATE_TAG_TASK": "",
+                "SEMAPHORE_CREATE_TAG_QUERY": "",
+            }
+        )
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        registered_ai_services.pop(Semaphore.name, None)
+        self.service = Semaphore(self.app)
+        subjects.invalidate()
+
+    def tearDown(self):
+        self.ctx.pop()
+        registered_ai_services.pop(Semaphore.name, None)
+
+
+class TokenCacheTestCase(SemaphoreTestCase):
+    def test_token_is_reused(self):
+        with requests_mock.Mocker() as mock:
+            mock.post(TOKEN_URL, json={"access_token": "foo", "expires_in": 3600})
+            self.assertEqual("foo", self.service.get_access_token())
+            self.assertEqual("foo", self.service.get_access_token())
+            self.assertEqual(1, mock.call_count)
+
+    def test_token_is_shared_via_cache(self):
+        with requests_mock.Mocker() as mock:
+            mock.post(TOKEN_URL, json={"access_token": "foo", "expires_in": 3600})
+            self.service.get_access_token()
+            self.service.token_cache._token = None  # simulate other worker
+            self.assertEqual("foo", self.service.get_access_token())
+            self.assertEqual(1, mock.call_count)
+
+    def test_expired_token_is_fetched_again(self):
+        with requests_mock.Mocker() as mock:
+            mock.post(
+                TOKEN_URL,
+                [
+                    {"json": {"access_token": "foo", "expires_in": 3600}},
+                    {"json": {"access_token": "bar", "expires_in": 3600}},
+                ],
+            )
+            self.assertEqual("foo", self.service.get_access_token())
+            with patch("cp.ai.token_cache.time.time", return_value=time.time() + 4000):
+                self.assertEqual("bar", self.service.get_access_token())
+            self.assertEqual(2, mock.call_count)
+
+    def test_token_is_refreshed_in_background(self):
+        with requests_mock.Mocker() as mock:
+            mock.post(
+                TOKEN_URL,
+                [
+                    {"json": {"access_token": "foo", "expires_in": 3600}},
+                    {"json": {"access_token": "bar", "expires_in": 3600}},
+                ],
+            )
+            self.assertEqual("foo", self.service.get_access_token())
+            with patch("cp.ai.token_cache.time.time", return_value=time.time() + 3590):
+                # still valid token is returned while refreshing
+                self.assertEqual("foo", self.service.get_access_token())
+                for _ in range(50):
+                    if not self.service.token_cache._refreshing.is_set():
+                        break
+                    time.sleep(0.01)
+                self.assertEqual("bar", self.service.get_access_token())
+            self.assertEqual(2, mock.call_count)
+
+
+@patch("superdesk.get_resource_service", return_value=get_vocabularies_service())
+class SearchTestCase(SemaphoreTestCase):
+    def search(self, term_hints, language="en-CA"):
+        with requests_mock.Mocker() as mock:
+            mock.post(TOKEN_URL, json={"access_token": "foo", "expires_in": 3600})
+            for url in (SEARCH_URL, SEARCH_URL.replace("/en/", "/fr/")):
+                mock.get(url + "med.json", json={"termHints": term_hints})
+            mock.get(PARENT_URL + "sem-market", text=PARENT_RESPONSE)
+            mock.get(PARENT_URL + "sem-medication", text=PARENT_RESPONSE)
+            mock.get(
+                PARENT_URL + "sem-crime",
+                text=PARENT_RESPONSE.replace(
+                    "economy, business and finance", "crime"
+                ).replace("sem-economy", "sem-crime-parent"),
+            )
+            result = self.service.search({"searchString": "med", "language": language})
+            requests = [req.url.split("?")[0] for req in mock.request_history]
+        return result, requests
+
+    def test_broader_from_vocabulary(self, get_service):
+        result, requests = self.search(
+            [{"id": "sem-medication", "name": "medication", "classes": ["Topic"]}]
+        )
+        self.assertNotIn(PARENT_URL + "sem-medication", requests)
+        subject = result["tags"]["subject"][0]
+        self.assertEqual("20000487", subject["qcode"])
+        self.assertEqual("20000480", subject["parent"])
+        broader = result["broader"]["subject"]
+        self.assertEqual(["20000480", "07000000"], [b["qcode"] for b in broader])
+        self.assertEqual(["07000000", None], [b["parent"] for b in broader])
+        self.assertEqual("Health", broader[1]["name"])
+
+    def test_broader_fetched_when_parent_not_mapped(self, get_service):
+        cv = dict(SUBJECT_CV, _etag="2", items=[dict(i) for i in SUBJECT_CV["items"]])
+        cv["items"][1].pop("semaphore_id")
+        get_service.return_value.find_one.return_value = cv
+        try:
+            result, requests = self.search(
+                [{"id": "sem-medication", "name": "medication", "classes": ["Topic"]}]
+            )
+        finally:
+            get_service.return_value.find_one.return_value = SUBJECT_CV
+        self.assertIn(PARENT_URL + "sem-medication", requests)
+        self.assertEqual(
+            ["sem-economy"], [b["qcode"] for b in result["broader"]["subject"]]
+        )
+
+    def test_broader_french_names(self, get_service):
+        result, requests = self.search(
+            [{"id": "sem-medication", "name": "médicament", "classes": ["Topic"]}],
+            language="fr-CA",
+        )
+        broader = result["broader"]["subject"]
+        self.assertEqual(["Traitement", "Santé"], [b["name"] for b in broader])
+        self.assertIn(SEARCH_URL.replace("/en/", "/fr/") + "med.json", requests)
+        self.assertEqual(SEARCH_URL, self.service.search_url)
+
+    def test_broader_fetched_once_when_missing_in_vocabulary(self, get_service):
+        hints = [{"id": "sem-market", "name": "market", "classes": ["Topic"]}]
+        for i in range(2):
+            result, requests = self.search(hints)
+            self.assertEqual(
+                1 if i == 0 else 0, requests.count(PARENT_URL + "sem-market")
+            )
+            subject = result["tags"]["subject"][0]
+            self.assertEqual("sem-economy", subject["parent"])
+            self.assertEqual(
+                "Economy, Business And Finance", result["broader"]["subject"][0]["name"]
+            )
+
+    def test_broader_keeps_hints_order(self, get_service):
+        result, requests = self.search(
+            [
+                {"id": "sem-crime", "name": "crime", "classes": ["Topic"]},
+                {"id": "sem-medication", "name": "medication", "classes": ["Topic"]},
+                {"id": "sem-market", "name": "market", "classes": ["Topic"]},
+            ]
+        )
+        self.assertEqual(
+            ["sem-crime-parent", "20000480", "sem-economy"],
+            [s["parent"] for s in result["tags"]["subject"]],
+        )
+        self.assertEqual(
+            ["sem-crime-parent", "20000480", "07000000", "sem-economy"],
+            [b["qcode"] for b in result["broader"]["subject"]],
+        )
+
+
+@patch("superdesk.get_resource_service", return_value=get_vocabularies_service())
+class AnalyzeTestCase(SemaphoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.mock = requests_mock.Mocker()
+        self.mock.start()
+        self.mock.post(TOKEN_URL, json={"access_token": "foo", "expires_in": 3600})
+        self.mock.post(ANALYZE_URL, text=read_fixture("classify.xml"))
+
+    def tearDown(self):
+        self.mock.stop()
+        super().tearDown()
+
+    def analyze_calls(self):
+        return len([r for r in self.mock.request_history if r.url == ANALYZE_URL])
+
+    def test_analyze(self, get_service):
+        tags = self.service.analyze(get_item("foo"))
+        self.assertEqual(
+            ["07000000", "20000487", "sem-election", "20000480", "sem-politics"],
+            [s["qcode"] for s in tags["subject"]],
+        )
+        self.assertEqual(
+            [None, "20000480", "sem-politics", "07000000", None],
+            [s["parent"] for s in tags["subject"]],
+        )
+        self.assertEqual(
+            [72, 68, 91, 68, 91], [s["relevance"] for s in tags["subject"]]
+        )
+        self.assertEqual(["Health Canada"], [o["name"] for o in tags["organisation"]])
+        self.assertEqual(["Justin Trudeau"], [p["name"] for p in tags["person"]])
+        self.assertEqual(["Ottawa"], [p["name"] for p in tags["place"]])
+        self.assertEqual(["Federal Election"], [e["name"] for e in tags["event"]])
+
+    def test_analyze_loads_vocabulary_once(self, get_service):
+        get_service.return_value.find_one.reset_mock()
+        for i in range(3):
+            tags = self.service.analyze(get_item("foo", headline=str(i)))
+            self.assertEqual("07000000", tags["subject"][0]["qcode"])
+        self.assertEqual(1, get_service.return_value.find_one.call_count)
+
+    def test_analyze_gzip_request(self, get_service):
+        self.service.gzip_requests = True
+        self.assertTrue(self.service.analyze(get_item("foo"))["subject"])
+        request = self.mock.request_history[-1]
+        self.assertEqual("gzip", request.headers["Content-Encoding"])
+
+    def test_analyze_gzip_not_accepted(self, get_service):
+        def classify(request, context):
+            if request.headers.get("Content-Encoding"):
+                context.status_code = 415
+                return ""
+            return read_fixture("classify.xml")
+
+        self.mock.post(ANALYZE_URL, text=classify)
+        self.service.gzip_requests = True
+        self.assertTrue(self.service.analyze(get_item("foo"))["subject"])
+        self.assertEqual(2, self.analyze_calls())
+        self.assertTrue(self.service.gzip_requests)
+
+    def test_analyze_gzip_bad_request(self, get_service):
+        self.mock.post(ANALYZE_URL, status_code=400, text="Invalid XML_INPUT")
+        self.service.gzip_requests = True
+        self.assertEqual({}, self.service.analyze(get_item("foo")))
+        self.assertEqual(1, self.analyze_calls())
+        self.assertTrue(self.service.gzip_requests)
+
+    def test_analyze_rejected_token(self, get_service):
+        self.mock.post(
+            TOKEN_URL,
+            [
+                {"json": {"access_token": "foo", "expires_in": 3600}},
+                {"json": {"access_token": "bar", "expires_in": 3600}},
+            ],
+        )
+
+        def classify(request, context):
+            if request.headers["Authorization"] != "bearer bar":
+                context.status_code = 401
+                return ""
+            return read_fixture("classify.xml")
+
+        self.mock.post(ANALYZE_URL, text=classify)
+        self.assertTrue(self.service.analyze(get_item("foo"))["subject"])
+        self.assertEqual(2, self.analyze_calls())
+        self.assertEqual("bar", self.service.get_access_token())
+
+    def test_analyze_metrics(self, get_service):
+        stages = ("payload", "token", "http", "transform", "replace_qcodes")
+        counts = [
+            metrics.stage_total.get(operation="analyze", stage=stage, status="ok")
+            for stage in stages
+        ]
+        received = metrics.response_bytes.get(operation="analyze", stage="http")
+        self.service.analyze(get_item("foo"))
+        for stage, count in zip(stages, counts):
+            self.assertEqual(
+                count + 1,
+                metrics.stage_total.get(operation="analyze", stage=stage, status="ok"),
+                stage,
+            )
+        self.assertEqual(
+            received + len(read_fixture("classify.xml")),
+            metrics.response_bytes.get(operation="analyze", stage="http"),
+        )
+
+    def test_analyze_many(self, get_service):
+        items = [get_item("item-{}".format(i)) for i in range(10)]
+        results = dict(self.service.analyze_many(items, concurrency=3))
+        self.assertEqual(set(item["guid"] for item in items), set(results))
+        expected = self.service.analyze(get_item("single"))
+        for tags in results.values():
+            self.assertEqual(expected, tags)
+
+    def test_analyze_many_isolates_failures(self, get_service):
+        def classify(request, context):
+            if "broken" in request.text:
+                context.status_code = 500
+                return ""
+            return read_fixture("classify.xml")
+
+        self.mock.post(ANALYZE_URL, text=classify)
+        items = [get_item("ok"), get_item("broken", headline="broken")]
+        results = dict(self.service.analyze_many(items))
+        self.assertEqual({}, results["broken"])
+        self.assertTrue(results["ok"]["subject"])
+
+    def test_analyze_result_is_cached(self, get_service):
+        tags = self.service.analyze(get_item("foo"))
+        self.assertEqual(tags, self.service.analyze(get_item("bar")))
+        self.service.analyze(
+            get_item("foo", headline="  Health Canada approves new \n medication ")
+        )
+        self.assertEqual(1, self.analyze_calls())
+        self.service.analyze(get_item("foo", body_html="<p>Changed</p>"))
+        self.assertEqual(2, self.analyze_calls())
+        self.assertEqual(2, self.service.result_cache.info()["hits"])
+        self.assertEqual(2, self.service.result_cache.info()["misses"])
+
+        # cached result can't be modified by caller
+        tags["subject"].clear()
+        self.assertTrue(self.service.analyze(get_item("foo"))["subject"])
+
+    def test_analyze_uses_preclassified_tags(self, get_service):
+        stored = {"subject": [{"name": "health", "qcode": "07000000"}]}
+        with patch("cp.ai.preclassify.get_stored_tags", return_value=stored):
+            self.assertTrue(self.service.analyze(get_item("foo"))["subject"])
+            self.assertEqual(1, self.analyze_calls())
+            self.app.config["SEMAPHORE_PRECLASSIFY"] = True
+            self.assertEqual(stored, self.service.analyze(get_item("bar", slugline="")))
+            self.assertEqual(1, self.analyze_calls())
+
+    def test_circuit_breaker(self, get_service):
+        self.mock.post(ANALYZE_URL, status_code=500)
+        for i in range(5):
+            self.assertEqual({}, self.service.analyze(get_item("foo", headline=str(i))))
+        self.assertEqual(5, self.analyze_calls())
+        self.assertEqual("open", self.service.breaker.info()["state"])
+        self.assertEqual(1, self.service.breaker.info()["trips"])
+
+        self.assertEqual({}, self.service.analyze(get_item("foo")))
+        self.assertEqual(5, self.analyze_calls())
+
+        # probe after reset timeout
+        self.mock.post(ANALYZE_URL, text=read_fixture("classify.xml"))
+        with patch(
+            "cp.ai.circuit_breaker.time.monotonic", return_value=time.monotonic() + 60
+        ):
+            self.assertTrue(self.service.analyze(get_item("foo"))["subject"])
+        self.assertEqual(6, self.analyze_calls())
+        self.assertEqual("closed", self.service.breaker.info()["state"])
+
+    def test_slow_response_counts_as_failure(self, get_service):
+        self.service.latency_budgets["analyze"] = -1
+        for i in range(5):
+            self.service.analyze(get_item("foo", headline=str(i)))
+        self.assertEqual("open", self.service.breaker.info()["state"])
+
+
+@patch("superdesk.get_resource_service", return_value=get_vocabularies_service())
+class FeedbackTestCase(SemaphoreTestCase):
+    def feedback(self, tags):
+        data = {"item": get_item("foo"), "tags": tags}
+        return self.service.data_operation("POST", "feedback", None, data)
+
+    def test_create_tags(self, get_service):
+        def create(request, context):
+            name = request.json()["skosxl:prefLabel"][0]["skosxl:literalForm"][0]
+            if name["@value"] == "Existing":
+                context.status_code = 409
+            elif name["@value"] == "Broken":
+                context.status_code = 500
+            else:
+                context.status_code = 201
+            return ""
+
+        with requests_mock.Mocker() as mock:
+            mock.post(TOKEN_URL, json={"access_token": "foo", "expires_in": 3600})
+            mock.post(CREATE_URL, text=create)
+            tags = {
+                "subject": [
+                    {"name": "New topic", "scheme": "subject", "source": "manual"},
+                    {"name": "Medication", "scheme": "subject", "source": "manual"},
+                    {"name": "Auto", "scheme": "subject", "source": "Semaphore"},
+                ],
+                "organisation": [
+                    {"name": "Existing", "scheme": "organisation", "source": "manual"},
+                    {"name": "Broken", "scheme": "organisation", "source": "manual"},
+                    {"name": "broken", "scheme": "organisation", "source": "manual"},
+                    {"name": "New org", "scheme": "organisation", "source": "manual"},
+                    {"name": "new  org", "scheme": "organisation", "source": "manual"},
+                    {"name": "Foo", "scheme": "unknown", "source": "manual"},
+                ],
+            }
+            result = self.feedback(tags)
+            self.assertEqual(
+                ["New topic", "New org", "new  org"], result["created_tags"]
+            )
+            self.assertEqual(["Medication", "Existing"], result["existing_tags"])
+            self.assertEqual(["Broken", "broken", "Foo"], result["failed_tags"])
+            self.assertEqual(0, result["timings"]["Medication"])
+            self.assertEqual(0, result["timings"]["new  org"])
+            self.assertIn("New topic", result["timings"])
+            self.assertEqual(5, mock.call_count)  # token + 4 tags
+
+            # existing and created tags are not sent again
+            result = self.feedback(tags)
+            self.assertEqual(["Broken", "broken", "Foo"], result["failed_tags"])
+            self.assertEqual([], result["created_tags"])
+            self.assertEqual(6, mock.call_count)
+
+
+class IterArticleElementsTestCase(unittest.TestCase):
+    def test_skip_system_elements(self):
+        xml = read_fixture("classify.xml").encode("utf-8")
+        names = [elem.get("name") for elem in iter_article_elements(xml)]
+        self.assertEqual(15, len(names))
+        self.assertNotIn("HASH", names)
+        self.assertNotIn("Language", names)
+
+    def test_missing_article(self):
+        with self.assertRaises(ValueError):
+            list(iter_article_elements(b"<response><STRUCTUREDDOCUMENT/></response>"))
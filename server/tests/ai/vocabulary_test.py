@@ -0,0 +1,87 @@
+import time
+import flask
+import unittest
+
+from unittest.mock import MagicMock, patch
+
+from cp.ai import vocabulary
+from cp.ai.vocabulary import SubjectIndex
+
+
+def get_cv(etag, name="health"):
+    return {
+        "_id": "subject_custom",
+        "_etag": etag,
+        "items": [
+            {"name": name, "qcode": "07000000", "semaphore_id": "sem-health"},
+            {"name": "medication", "qcode": "20000487", "parent": "07000000"},
+        ],
+    }
+
+
+class SubjectIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.service = MagicMock()
+        self.service.find_one.return_value = get_cv("1")
+        patcher = patch("superdesk.get_resource_service", return_value=self.service)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.index = SubjectIndex(check_interval=60)
+
+    def test_lookups(self):
+        self.index.refresh()
+        self.assertEqual("07000000", self.index.get_qcode("sem-health"))
+        self.assertIsNone(self.index.get_qcode("sem-unknown"))
+        self.assertEqual("medication", self.index.get_item("20000487")["name"])
+        self.assertEqual({"sem-health": "07000000"}, self.index.semaphore_to_qcode)
+
+    def test_rebuilt_only_when_updated(self):
+        self.index.refresh()
+        by_qcode = self.index.by_qcode
+        self.index.refresh()
+        self.assertEqual(1, self.service.find_one.call_count)
+
+        # same version after interval
+        with patch(
+            "cp.ai.vocabulary.time.monotonic", return_value=time.monotonic() + 61
+        ):
+            self.index.refresh()
+        self.assertEqual(2, self.service.find_one.call_count)
+        self.assertIs(by_qcode, self.index.by_qcode)
+
+        # updated version
+        self.service.find_one.return_value = get_cv("2", "Health")
+        self.index.invalidate()
+        self.index.refresh()
+        self.assertEqual(3, self.service.find_one.call_count)
+        self.assertEqual("Health", self.index.get_item("07000000")["name"])
+
+    def test_invalidated_on_vocabulary_update(self):
+        app = flask.Flask(__name__)
+        app.on_updated_vocabularies = MagicMock()
+        app.on_replaced_vocabularies = MagicMock()
+        vocabulary.init_app(app)
+        vocabulary.subjects.refresh()
+        vocabulary.on_vocabulary_updated({}, {"_id": "categories"})
+        self.assertIsNotNone(vocabulary.subjects.checked_at)
+        vocabulary.on_vocabulary_updated({}, {"_id": "subject_custom"})
+        self.assertIsNone(vocabulary.subjects.checked_at)
+
+    def test_derived_index_shared_until_updated(self):
+        self.service.find_one.return_value = {
+            "_id": "categories",
+            "_etag": "1",
+            "items": [{"qcode": "i"}],
+        }
+        vocabulary.invalidate_all()
+        cv = vocabulary.get_vocabulary("categories")
+        self.assertIs(cv, vocabulary.get_vocabulary("categories"))
+
+        index = cv.get_derived(list)
+        self.assertEqual([{"qcode": "i"}], index)
+        self.assertIs(index, cv.get_derived(list))
+        self.assertEqual(1, self.service.find_one.call_count)
+
+        vocabulary.on_vocabulary_updated({}, {"_id": "categories"})
+        self.assertIsNot(index, cv.get_derived(list))
+        self.assertEqual(2, self.service.find_one.call_count)
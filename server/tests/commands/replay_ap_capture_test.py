@@ -0,0 +1,44 @@
+import os
+import json
+import flask
+import tempfile
+import unittest
+import superdesk
+import settings
+
+from unittest.mock import MagicMock, patch
+
+from tests.mock import resources
+from tests.ingest.parser import get_fixture_path
+
+from cp.ingest import capture
+from cp.commands.replay_ap_capture import STAGES, ReplayAPCaptureCommand
+
+
+class ReplayAPCaptureTestCase(unittest.TestCase):
+    app = flask.Flask(__name__)
+    app.locators = MagicMock()
+    app.config.update({"AP_TAGS_MAPPING": settings.AP_TAGS_MAPPING})
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "ap")
+        with open(get_fixture_path("item.json", "ap")) as fp:
+            data = json.load(fp)
+        recorder = capture.Recorder(self.path)
+        for i in range(3):
+            recorder.record(data)
+        recorder.close()
+
+    def test_replay(self):
+        sequences = resources["sequences"].service.find_and_modify
+        sequences.reset_mock()
+        with self.app.app_context():
+            with patch.dict(superdesk.resources, resources):
+                stats = ReplayAPCaptureCommand().replay(self.path, page_size=2)
+        self.assertEqual(3, stats["items"])
+        self.assertEqual(0, stats["errors"])
+        for stage in STAGES:
+            self.assertGreater(stats["timings"][stage], 0, stage)
+        sequences.assert_not_called()
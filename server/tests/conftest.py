@@ -1,6 +1,8 @@
 import flask
 import pytest
 
+from cp.ai import vocabulary
+
 
 @pytest.fixture(autouse=True)
 def app():
@@ -13,5 +15,7 @@ def app():
     )
     ctx = app.app_context()
     ctx.push()
+    # mocked vocabularies differ between tests
+    vocabulary.invalidate_all()
     yield app
     ctx.pop()
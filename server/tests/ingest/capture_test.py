@@ -0,0 +1,74 @@
+import os
+import gzip
+import tempfile
+import unittest
+
+from unittest.mock import patch
+
+from cp.ingest import capture
+
+
+class CaptureTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "ap")
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_record(self):
+        recorder = capture.Recorder(self.path, segment_size=1)
+        for i in range(3):
+            recorder.record({"data": {"item": {"altids": {"itemid": str(i)}}}})
+        with recorder.paused():
+            recorder.record({"data": {"item": {"altids": {"itemid": "assoc"}}}})
+        recorder.close()
+
+        segments = capture.get_segments(self.path)
+        self.assertEqual(3, len(segments))
+        self.assertTrue(all(path.endswith(capture.SUFFIX) for path in segments))
+        payloads = list(capture.read_capture(self.path))
+        self.assertEqual(
+            ["0", "1", "2"],
+            [payload["data"]["item"]["altids"]["itemid"] for payload in payloads],
+        )
+
+    def test_record_payload_when_recorded(self):
+        recorder = capture.Recorder(self.path)
+        payload = {"data": {"item": {"headline": "foo"}}}
+        recorder.record(payload)
+        payload["data"]["item"]["headline"] = "bar"
+        recorder.close()
+        self.assertEqual(
+            "foo", list(capture.read_capture(self.path))[0]["data"]["item"]["headline"]
+        )
+
+    def test_record_invalid_path(self):
+        with open(self.path, "w") as f:
+            f.write("not a directory")
+        recorder = capture.Recorder(self.path)
+        recorder.record({"data": {}})
+        recorder.close()
+        self.assertTrue(recorder.disabled)
+        queued = recorder._queue.qsize()
+        recorder.record({"data": {}})
+        self.assertEqual(queued, recorder._queue.qsize())
+
+    def test_record_disabled(self):
+        recorder = capture.Recorder("")
+        recorder.record({"data": {}})
+        recorder.close()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_record_queue_full(self):
+        recorder = capture.Recorder(self.path, queue_size=1)
+        with patch.object(recorder, "_start"):  # not writing
+            recorder.record({"data": {}})
+            recorder.record({"data": {}})
+        self.assertEqual(1, recorder.dropped)
+
+    def test_read_incomplete_segment(self):
+        os.makedirs(self.path)
+        filename = os.path.join(self.path, "segment" + capture.SUFFIX)
+        data = gzip.compress(b'{"data": {"item": {}}}\n{"data": {"item"')
+        with open(filename, "wb") as f:
+            f.write(data[:-10])
+        self.assertEqual([{"data": {"item": {}}}], list(capture.read_capture(filename)))
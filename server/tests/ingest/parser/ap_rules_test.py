@@ -0,0 +1,36 @@
+import cp
+import unittest
+
+from cp.ingest.parser import ap_rules
+
+
+class APRulesTestCase(unittest.TestCase):
+    def test_get_sports(self):
+        self.assertEqual(
+            {"bkn", "oly", "ski"}, ap_rules.get_sports("BKN-oly-SKI-Results")
+        )
+        self.assertNotIn("ten", ap_rules.get_sports("Tennis-TEN"))
+
+    def test_ranking_rules(self):
+        facts = ap_rules.Facts(
+            slugline="OLY-Scores",
+            products=[32607],
+            categories=["s"],
+            sports=ap_rules.get_sports("OLY-Scores"),
+        )
+        self.assertEqual(
+            cp.NEWS_GOOD_TO_KNOW, ap_rules.first_match(ap_rules.RANKING_RULES, facts)
+        )
+        facts = ap_rules.Facts(content_type="spot development", priority="u")
+        self.assertEqual(
+            cp.NEWS_NEED_TO_KNOW, ap_rules.first_match(ap_rules.RANKING_RULES, facts)
+        )
+        self.assertIsNone(
+            ap_rules.first_match(ap_rules.RANKING_RULES, ap_rules.Facts())
+        )
+
+    def test_index_rules(self):
+        facts = ap_rules.Facts(slugline="BBN-Standings", textformat="bx")
+        self.assertEqual("Agate", ap_rules.first_match(ap_rules.INDEX_RULES, facts))
+        facts = ap_rules.Facts(slugline="Health-MED-Vaccine", textformat="at")
+        self.assertEqual("Lifestyle", ap_rules.first_match(ap_rules.INDEX_RULES, facts))
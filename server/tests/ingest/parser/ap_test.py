@@ -18,7 +18,12 @@ from superdesk.io.feed_parsers import nitf
 from tests.mock import resources
 
 from cp.ingest import CP_APMediaFeedParser
-from cp.ingest.parser.ap import AP_SUBJECT_CV, CATEGORY_SCHEME
+from cp.ingest.parser.ap import (
+    AP_SUBJECT_CV,
+    CATEGORY_SCHEME,
+    APSubjectIndex,
+    prefetch,
+)
 from cp.output.formatter.jimi import JimiFormatter
 
 
@@ -398,3 +403,66 @@ class CP_AP_ParseTestCase(unittest.TestCase):
         item = {"language": "fr"}
         data = {"item": {"urgency": 1}}
         self.assertEqual(cp.NEWS_URGENT, parser._parse_ranking(data, item))
+
+    def test_ap_subject_index(self):
+        items = [
+            {"qcode": "a", "name": "A", "ap_subject": "f25af2d0, "},
+            {"qcode": "b", "name": "B"},
+            {"qcode": "c", "name": "C", "ap_subject": "86aad520, f25af2d07e4e"},
+            {"qcode": "d", "name": "D", "ap_subject": "c8e409f8"},
+        ]
+        index = APSubjectIndex(items)
+        self.assertEqual(
+            ["a", "c"],
+            [
+                subj["qcode"]
+                for subj in index.match(["f25af2d07e4e100484f5df092526b43e"])
+            ],
+        )
+        self.assertEqual(
+            ["c", "d"],
+            [
+                subj["qcode"]
+                for subj in index.match(
+                    ["c8e409f8858510048872ff2260dd383e", "86aad520", "86aad5"]
+                )
+            ],
+        )
+        self.assertEqual([], index.match(["", "5b4319707dd310048b23df092526b43e"]))
+
+    def test_parse_prefetch(self):
+        guid = "ba7d03f0cd24a17faa81bebc724bcf3f"
+        guids = [
+            "80bc4c5694394e23b3d1d5f24a726571",
+            "9d878f94b2c3477193a0f84a61c11484",
+            guid,
+        ]
+        ingest_service = resources["ingest"].service
+        archive_service = resources["archive"].service
+        ingest_service.find.return_value = [{"guid": guid, "slugline": "prev-slug"}]
+        archive_service.find.return_value = [
+            {"ingest_id": guids[0], "uri": "foo"},
+            {"ingest_id": guid, "guid": "bar", "extra": {"ap_version": 999}},
+        ]
+        ingest_service.find_one.reset_mock()
+        archive_service.find_one.reset_mock()
+        try:
+            with self.app.app_context():
+                with patch.dict(superdesk.resources, resources):
+                    with prefetch([data["data"]["item"]]):
+                        item = parser.parse(data, provider)
+
+            ingest_service.find.assert_called_once_with({"guid": {"$in": guids}})
+            archive_service.find.assert_called_once_with({"ingest_id": {"$in": guids}})
+            ingest_service.find_one.assert_not_called()
+            archive_service.find_one.assert_not_called()
+        finally:
+            ingest_service.find.reset_mock(return_value=True)
+            archive_service.find.reset_mock(return_value=True)
+
+        self.assertEqual("prev-slug", item["slugline"])
+        self.assertEqual("bar", item["rewrite_of"])
+        self.assertEqual(
+            {"residRef": "foo", "guid": ""}, item["associations"]["media-gallery--1"]
+        )
+        self.assertNotIn("media-gallery--2", item["associations"])
@@ -0,0 +1,87 @@
+import io
+import re
+import unittest
+import threading
+import requests
+import requests_mock
+
+from unittest.mock import patch
+from superdesk.media.image import get_meta_iptc
+from tests.ingest.parser import get_fixture_path
+
+from cp.ingest.parser import image_metadata
+
+
+URL = "https://example.com/preview.jpg"
+
+with open(get_fixture_path("preview-keywords.jpg", "ap"), "rb") as f:
+    image = f.read()
+
+
+def get_range(request, context):
+    match = re.match(r"bytes=(\d+)-(\d+)", request.headers.get("Range") or "")
+    if not match:
+        return image
+    start, end = int(match.group(1)), int(match.group(2))
+    if start >= len(image):
+        context.status_code = 416
+        return b""
+    context.status_code = 206
+    return image[start : end + 1]  # noqa: E203
+
+
+class ImageMetadataTestCase(unittest.TestCase):
+    def setUp(self):
+        image_metadata.cache.clear()
+        image_metadata.pending.clear()
+
+    def test_fetch_header_range(self):
+        with requests_mock.mock() as mock:
+            mock.get(URL, content=get_range)
+            data = image_metadata.fetch_header(URL, requests.Session())
+        self.assertTrue(image_metadata.scan_header(data)[0])
+        self.assertLess(len(data), len(image))
+        self.assertEqual(1, mock.call_count)
+
+    def test_fetch_header_extends_range(self):
+        with requests_mock.mock() as mock:
+            mock.get(URL, content=get_range)
+            with patch.object(image_metadata, "RANGE_SIZE", 1000):
+                data = image_metadata.fetch_header(URL, requests.Session())
+        self.assertTrue(image_metadata.scan_header(data)[0])
+        self.assertLess(len(data), len(image))
+        self.assertGreater(mock.call_count, 1)
+
+    def test_fetch_header_range_not_supported(self):
+        with requests_mock.mock() as mock:
+            mock.get(URL, content=image)
+            data = image_metadata.fetch_header(URL, requests.Session())
+        self.assertTrue(image_metadata.scan_header(data)[0])
+
+    def test_get_iptc(self):
+        with requests_mock.mock() as mock:
+            mock.get(URL, content=get_range)
+            metadata = image_metadata.get_iptc(URL, requests.Session())
+            self.assertEqual(metadata, image_metadata.get_iptc(URL))
+        self.assertEqual(1, mock.call_count)
+        self.assertEqual(get_meta_iptc(io.BytesIO(image)), metadata)
+        self.assertTrue(metadata["Keywords"])
+
+    def test_prefetch(self):
+        urls = ["{}?{}".format(URL, i) for i in range(4)]
+
+        # fails unless all fetches are running at the same time
+        barrier = threading.Barrier(len(urls), timeout=5)
+
+        def fetch_iptc(url, session, timeout):
+            barrier.wait()
+            return {"Keywords": [url]}
+
+        with patch.object(
+            image_metadata, "fetch_iptc", side_effect=fetch_iptc
+        ) as fetch:
+            image_metadata.prefetch(urls + urls[:1])
+            results = [image_metadata.get_iptc(url) for url in urls]
+        self.assertFalse(barrier.broken)
+        self.assertEqual(4, fetch.call_count)
+        self.assertEqual([[url] for url in urls], [r["Keywords"] for r in results])
@@ -5,6 +5,7 @@ import json
 from unittest.mock import create_autospec
 
 from superdesk.publish.subscribers import SubscribersService
+from superdesk.sequences import SequencesService
 from superdesk.vocabularies import VocabulariesService
 from superdesk.storage.desk_media_storage import SuperdeskGridFSMediaStorage
 from apps.archive.news import NewsService
@@ -16,6 +17,7 @@ from superdesk.geonames import geonames_request, format_geoname_item
 from flask import current_app as app
 from planning.events.events import EventsService
 from apps.contacts import ContactsService
+from cp.picture_containers import PictureContainersService
 
 SEQUENCE_NUMBER = 100
 
@@ -69,6 +71,9 @@ class Resource:
 subscriber_service = create_autospec(SubscribersService)
 subscriber_service.generate_sequence_number.return_value = SEQUENCE_NUMBER
 
+sequences_service = create_autospec(SequencesService)
+sequences_service.find_and_modify.return_value = {"sequence_number": SEQUENCE_NUMBER}
+
 vocabularies_service = create_autospec(VocabulariesService)
 vocabularies_service.find_one.side_effect = get_cv
 vocabularies_service.get_rightsinfo.side_effect = get_rightsinfo
@@ -79,6 +84,9 @@ ingest_service = create_autospec(IngestService)
 archive_service = create_autospec(ArchiveService)
 published_service = create_autospec(PublishedItemService)
 
+picture_containers_service = create_autospec(PictureContainersService)
+picture_containers_service.find.return_value = []
+
 media_storage = create_autospec(SuperdeskGridFSMediaStorage)
 
 ingest_service.find_one.return_value = None
@@ -99,6 +107,8 @@ resources = {
     "archive": Resource(archive_service),
     "published": Resource(published_service),
     "subscribers": Resource(subscriber_service),
+    "sequences": Resource(sequences_service),
+    "picture_containers": Resource(picture_containers_service),
     "vocabularies": Resource(vocabularies_service),
     "places_autocomplete": Resource(places_autocomplete_service),
     "events": Resource(event_service),
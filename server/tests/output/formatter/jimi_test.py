@@ -1,10 +1,14 @@
 import os
 import cp
+import superdesk
+import lxml.etree as etree
 import cp.ingest.parser.globenewswire as globenewswire
 
 from pytz import UTC
 from datetime import datetime, timedelta
+from unittest.mock import patch
 
+from cp.output.formatter import original_item
 from cp.output.formatter.jimi import JimiFormatter
 from superdesk.metadata.item import SCHEDULE_SETTINGS
 
@@ -56,6 +60,10 @@ class JimiFormatterTestCase(BaseXmlFormatterTestCase):
         },
     }
 
+    def setUp(self):
+        super().setUp()
+        original_item.cache.clear()
+
     def format_item(self, updates=None, return_root=False):
         xml = self.format(updates)
         root = self.parse(xml)
@@ -219,6 +227,37 @@ class JimiFormatterTestCase(BaseXmlFormatterTestCase):
         self.assertEqual("Foo", item.find("Headline").text)
         self.assertEqual("Foo", item.find("Headline2").text)
 
+    def test_format_services_patched(self):
+        updates = {
+            "source": globenewswire.SOURCE,
+            "subject": [
+                {"name": "FOO", "qcode": "FOO", "scheme": cp.SERVICE},
+                {"name": "BAR", "qcode": "BAR", "scheme": cp.SERVICE},
+            ],
+        }
+        sequences = resources["sequences"].service
+        sequences.find_and_modify.return_value = {"sequence_number": 101}
+        output = self.format(updates, _all=True)
+        sequences.find_and_modify.return_value = {"sequence_number": SEQUENCE_NUMBER}
+
+        self.assertEqual([100, 101], [seq for seq, xml in output])
+        sequences.find_and_modify.assert_called_with(
+            query={"key": "subscribers_None)"},
+            update={"$inc": {"sequence_number": 2}},
+            upsert=True,
+            new=True,
+        )
+
+        article = self.article.copy()
+        article.update(updates)
+        root = etree.Element("Publish")
+        with patch.dict(superdesk.resources, resources):
+            self.formatter._format_item(root, article, 101, "BAR", ["FOO", "BAR"])
+        expected = etree.tostring(
+            root, pretty_print=True, encoding="utf-8", xml_declaration=True
+        ).decode("utf-8")
+        self.assertEqual(expected, output[1][1])
+
     def test_limits(self):
         long = "foo bar {}".format("x" * 200)
         item = self.format_item(
@@ -468,6 +507,30 @@ class JimiFormatterTestCase(BaseXmlFormatterTestCase):
 
         self.assertEqual("00000001", item.find("NewsCompID").text)
 
+    def test_writethru_original_item_cached(self):
+        resources["archive"].service.find_one.side_effect = [
+            {
+                "guid": "same-cycle",
+                "rewrite_of": "prev-cycle",
+                "unique_id": 2,
+                "type": "text",
+            },
+            {"guid": "prev-cycle", "unique_id": 1, "type": "text"},
+        ]
+
+        for unique_id in (3, 4):
+            item = self.format_item(
+                {
+                    "type": "text",
+                    "rewrite_of": "same-cycle",
+                    "unique_id": unique_id,
+                }
+            )
+            self.assertEqual("00000001", item.find("NewsCompID").text)
+            self.assertEqual("prev-cycle", item.find("SystemSlug").text)
+
+        resources["archive"].service.find_one.side_effect = None
+
     def test_ap_update_keeps_newscomip(self):
         resources["ingest"].service.find_one.side_effect = [
             {
@@ -487,30 +550,26 @@ class JimiFormatterTestCase(BaseXmlFormatterTestCase):
         self.assertEqual("00000001", item.find("NewsCompID").text)
 
     def test_picture_container_ids(self):
-        resources["news"].service.search.side_effect = [
-            [
-                {"guid": "usable", "pubstatus": "usable", "type": "text"},
-                {
-                    "guid": "usable2",
-                    "pubstatus": "usable",
-                    "type": "text",
-                    "extra": {
-                        cp.ORIG_ID: 32 * "a",  # slug constraints
-                    },
-                },
-            ]
+        service = resources["picture_containers"].service
+        service.find.return_value = [
+            {"guid": "urn:picture", "story": "usable", "slug": "usable"},
+            {"guid": "urn:picture", "story": "usable2", "slug": 32 * "a"},
         ]
 
         item = self.format_item(
             {
                 "type": "picture",
                 "unique_id": 3,
+                "guid": "urn:picture",
             }
         )
 
-        resources["news"].service.search.side_effect = None
+        service.find.return_value = []
 
         self.assertEqual("{}, usable".format(32 * "a"), item.find("ContainerIDs").text)
+        service.find.assert_called_with(
+            {"guid": "urn:picture", "state": {"$in": ["published", "scheduled"]}}
+        )
 
     def test_placeline_washington(self):
         item = self.format_item(
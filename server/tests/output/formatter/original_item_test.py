@@ -0,0 +1,52 @@
+import unittest
+
+from unittest.mock import MagicMock, patch
+
+from cp.output.formatter import original_item
+from cp.output.formatter.original_item import get_original_item
+
+
+class OriginalItemTestCase(unittest.TestCase):
+    def setUp(self):
+        original_item.cache.clear()
+        self.items = {
+            "update": {"_id": "update", "rewrite_of": "story"},
+            "story": {"_id": "story", "slugline": "foo"},
+        }
+        self.service = MagicMock()
+        self.service.find_one.side_effect = lambda req, _id: self.items.get(_id)
+        patcher = patch("superdesk.get_resource_service", return_value=self.service)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_get_original_item(self):
+        item = {"_id": "new", "rewrite_of": "update"}
+        self.assertEqual("story", get_original_item(item)["_id"])
+        self.assertEqual("story", get_original_item(item)["_id"])
+        self.assertEqual(2, self.service.find_one.call_count)
+
+        story = self.items["story"]
+        self.assertIs(story, get_original_item(story))
+
+    def test_returns_copy(self):
+        item = {"_id": "new", "rewrite_of": "update"}
+        get_original_item(item)["slugline"] = "bar"
+        self.assertEqual("foo", get_original_item(item)["slugline"])
+
+    def test_invalidated_on_update(self):
+        item = {"_id": "new", "rewrite_of": "update"}
+        get_original_item(item)
+        original_item.on_item_changed(None, item={"_id": "other"})
+        get_original_item(item)
+        self.assertEqual(2, self.service.find_one.call_count)
+
+        self.items["story"] = {"_id": "story", "slugline": "bar"}
+        original_item.on_item_changed(None, item=self.items["story"])
+        self.assertEqual("bar", get_original_item(item)["slugline"])
+        self.assertEqual(4, self.service.find_one.call_count)
+
+        # update linked to other story
+        self.items["update"] = {"_id": "update", "rewrite_of": "other"}
+        self.items["other"] = {"_id": "other", "slugline": "baz"}
+        original_item.on_item_changed(None, item=self.items["update"])
+        self.assertEqual("baz", get_original_item(item)["slugline"])
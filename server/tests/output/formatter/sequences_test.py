@@ -0,0 +1,73 @@
+import flask
+import unittest
+
+from unittest.mock import MagicMock, patch
+
+from cp.output.formatter import sequences
+
+
+class SequencesService:
+    def __init__(self, sequence_number=0):
+        self.sequence_number = sequence_number
+        self.find_and_modify = MagicMock(side_effect=self._find_and_modify)
+
+    def _find_and_modify(self, query, update, **kwargs):
+        if "$inc" in update:
+            self.sequence_number += update["$inc"]["sequence_number"]
+        else:
+            self.sequence_number = update["$set"]["sequence_number"]
+        return {"key": query["key"], "sequence_number": self.sequence_number}
+
+
+class SequencesTestCase(unittest.TestCase):
+    subscriber = {"_id": "foo"}
+
+    def setUp(self):
+        self.app = flask.Flask(__name__)
+        self.app.config["MAX_VALUE_OF_PUBLISH_SEQUENCE"] = 10
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        self.addCleanup(self.ctx.pop)
+        self.service = SequencesService()
+        patcher = patch("superdesk.get_resource_service", return_value=self.service)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        sequences.blocks.clear()
+
+    def test_reserve_none(self):
+        self.assertEqual([], sequences.reserve_sequence_numbers(self.subscriber, 0))
+        self.assertEqual([], sequences.get_sequence_numbers(self.subscriber, 0))
+        self.service.find_and_modify.assert_not_called()
+
+    def test_reserve(self):
+        self.assertEqual(
+            [1, 2, 3], sequences.reserve_sequence_numbers(self.subscriber, 3)
+        )
+        self.assertEqual([4], sequences.reserve_sequence_numbers(self.subscriber, 1))
+        self.assertEqual(2, self.service.find_and_modify.call_count)
+        self.service.find_and_modify.assert_called_with(
+            query={"key": "subscribers_foo)"},
+            update={"$inc": {"sequence_number": 1}},
+            upsert=True,
+            new=True,
+        )
+
+    def test_reserve_wraps(self):
+        self.service.sequence_number = 8
+        self.assertEqual(
+            [9, 10, 1, 2], sequences.reserve_sequence_numbers(self.subscriber, 4)
+        )
+        self.assertEqual([3], sequences.reserve_sequence_numbers(self.subscriber, 1))
+
+        subscriber = {"_id": "foo", "sequence_num_settings": {"min": 5, "max": 20}}
+        self.service.sequence_number = 20
+        self.assertEqual([5, 6], sequences.reserve_sequence_numbers(subscriber, 2))
+
+    def test_get_sequence_numbers_block(self):
+        self.app.config["PUBLISH_SEQUENCE_BLOCK_SIZE"] = 5
+        self.assertEqual([1], sequences.get_sequence_numbers(self.subscriber))
+        self.assertEqual([2, 3], sequences.get_sequence_numbers(self.subscriber, 2))
+        self.assertEqual(
+            [4, 5, 6, 7], sequences.get_sequence_numbers(self.subscriber, 4)
+        )
+        self.assertEqual(2, self.service.find_and_modify.call_count)
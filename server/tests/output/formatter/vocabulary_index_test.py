@@ -0,0 +1,70 @@
+import unittest
+
+from unittest.mock import MagicMock, patch
+
+from cp.ai import vocabulary
+from cp.output.formatter.vocabulary_index import VocabularyIndex, get_vocabulary_index
+
+
+ITEMS = [
+    {"qcode": "01000000", "name": "Arts", "in_jimi": True},
+    {"qcode": "01001000", "name": "Music", "parent": "01000000"},
+    {
+        "qcode": "01001001",
+        "name": "Jazz",
+        "parent": "01001000",
+        "semaphore_id": "jazz",
+    },
+    {"qcode": "02000000", "name": "Crime", "parent": "missing"},
+    {"qcode": "03000000", "name": "Loop", "parent": "03000001"},
+    {"qcode": "03000001", "name": "Loop", "parent": "03000000"},
+    {"qcode": "01001001", "name": "Duplicate", "in_jimi": True},
+]
+
+
+class VocabularyIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        vocabulary.invalidate_all()
+
+    def test_index(self):
+        index = VocabularyIndex(ITEMS)
+        self.assertEqual("Jazz", index.by_qcode["01001001"]["name"])
+        self.assertEqual("Jazz", index.by_code["jazz"]["name"])
+        self.assertEqual("Duplicate", index.in_jimi_by_code["01001001"]["name"])
+        self.assertNotIn("jazz", index.in_jimi_by_code)
+
+    def test_nearest_jimi(self):
+        index = VocabularyIndex(ITEMS)
+        for code in ("01000000", "01001000", "01001001", "jazz"):
+            self.assertEqual("Arts", index.jimi_by_code[code]["name"])
+        self.assertNotIn("jazz", index.jimi_by_qcode)
+        self.assertNotIn("02000000", index.jimi_by_qcode)
+        self.assertNotIn("03000000", index.jimi_by_qcode)
+
+    @patch("superdesk.get_resource_service")
+    def test_get_vocabulary_index(self, get_resource_service):
+        service = MagicMock()
+        service.find_one.return_value = {
+            "_id": "subject_custom",
+            "_etag": "1",
+            "items": ITEMS,
+        }
+        get_resource_service.return_value = service
+
+        index = get_vocabulary_index("subject_custom")
+        self.assertIs(index, get_vocabulary_index("subject_custom"))
+        self.assertEqual(1, service.find_one.call_count)
+
+        service.find_one.return_value = {
+            "_id": "subject_custom",
+            "_etag": "2",
+            "items": ITEMS[:1],
+        }
+        vocabulary.on_vocabulary_updated({}, {"_id": "subject_custom"})
+        updated = get_vocabulary_index("subject_custom")
+        self.assertIsNot(index, updated)
+        self.assertEqual(1, len(updated.by_qcode))
+
+        service.find_one.return_value = None
+        vocabulary.invalidate_all()
+        self.assertIsNone(get_vocabulary_index("subject_custom"))
@@ -0,0 +1,106 @@
+import unittest
+
+from unittest.mock import MagicMock, patch
+
+from cp import picture_containers
+
+
+class PictureContainersTestCase(unittest.TestCase):
+    def setUp(self):
+        self.service = MagicMock()
+        patcher = patch("superdesk.get_resource_service", return_value=self.service)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_get_picture_guids(self):
+        item = {
+            "pubstatus": "usable",
+            "state": "published",
+            "refs": [{"guid": "foo"}, {"guid": "bar"}, {"key": "baz"}],
+        }
+        self.assertEqual({"foo", "bar"}, picture_containers.get_picture_guids(item))
+        item["pubstatus"] = "canceled"
+        self.assertEqual(set(), picture_containers.get_picture_guids(item))
+        self.assertEqual(
+            set(), picture_containers.get_picture_guids({"pubstatus": "usable"})
+        )
+
+    def test_update_picture_containers(self):
+        item = {
+            "_id": "story",
+            "type": "text",
+            "pubstatus": "usable",
+            "state": "published",
+            "slugline": "foo",
+            "refs": [{"guid": "picture"}],
+        }
+        with patch.object(
+            picture_containers, "get_original_item", return_value=item
+        ), patch.object(picture_containers, "slug", return_value="foo") as slug:
+            picture_containers.on_item_changed(None, item=item)
+        slug.assert_called_once_with(item)
+        self.service.find_and_modify.assert_called_once_with(
+            query={"guid": "picture", "story": "story"},
+            update={"$set": {"slug": "foo", "state": "published"}},
+            upsert=True,
+        )
+        self.service.delete.assert_called_once_with(
+            {"story": "story", "guid": {"$nin": ["picture"]}}
+        )
+
+    def test_update_picture_containers_killed(self):
+        item = {
+            "_id": "story",
+            "pubstatus": "canceled",
+            "state": "killed",
+            "refs": [{"guid": "picture"}],
+        }
+        picture_containers.on_item_changed(None, item=item)
+        self.service.delete.assert_called_once_with(
+            {"story": "story", "guid": {"$nin": []}}
+        )
+        self.service.find_and_modify.assert_not_called()
+
+    def test_update_error_is_logged(self):
+        item = {"_id": "story", "pubstatus": "usable", "refs": [{"guid": "picture"}]}
+        with patch.object(
+            picture_containers, "get_original_item", side_effect=ValueError
+        ), self.assertLogs(picture_containers.logger, "ERROR"):
+            picture_containers.on_item_changed(None, item=item)
+
+    def test_skip_pictures(self):
+        picture_containers.on_item_changed(None, item={"_id": "pic", "type": "picture"})
+        self.service.delete.assert_not_called()
+
+    def test_skip_unchanged(self):
+        original = {
+            "_id": "story",
+            "type": "text",
+            "pubstatus": "usable",
+            "state": "in_progress",
+            "refs": [{"guid": "picture"}],
+        }
+        item = dict(original, headline="updated")
+        picture_containers.on_item_changed(None, item=item, original=original)
+        self.service.find_and_modify.assert_not_called()
+        self.service.delete.assert_not_called()
+
+        # slug is based on original story
+        item["rewrite_of"] = "previous"
+        with patch.object(
+            picture_containers, "get_original_item", return_value=item
+        ), patch.object(picture_containers, "slug", return_value="foo"):
+            picture_containers.on_item_changed(None, item=item, original=original)
+        self.service.find_and_modify.assert_called_once()
+
+    def test_index_inserted(self):
+        item = {"_id": "story", "pubstatus": "usable", "refs": [{"guid": "picture"}]}
+        with patch.object(
+            picture_containers, "get_original_item", return_value=item
+        ), patch.object(picture_containers, "slug", return_value="foo"):
+            picture_containers.on_archive_inserted([item])
+        self.service.find_and_modify.assert_called_once_with(
+            query={"guid": "picture", "story": "story"},
+            update={"$set": {"slug": "foo", "state": None}},
+            upsert=True,
+        )